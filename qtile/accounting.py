@@ -0,0 +1,471 @@
+"""Per-group CPU and memory accounting.
+
+Every managed window's process is looked up through the X-Resource
+extension, which gives the host PID even for sandboxed (flatpak) clients,
+falling back to ``_NET_WM_PID``. Everything below that process in the
+process tree is charged to the window's group, so a terminal's shell and
+whatever it runs count with the terminal.
+
+A tick reads the CPU time of the processes that were busy last time from
+``/proc/<pid>/schedstat``, through descriptors kept open; idle ones take
+turns, so each is read every ``idle_every`` ticks. ``smaps_rollup`` makes
+the kernel walk the whole address space, so it is read for at most
+``pss_per_tick`` of the processes read in a tick, busy ones first, and for
+an idle one at most every ``pss_max_age`` seconds. Memory is the
+proportional set size, which splits shared pages instead of counting them
+in every process, or RSS until a process has had its turn. Group totals are
+kept up to date as processes are read, so a tick costs about the same for
+30 idle processes as for 300.
+
+The process tree is walked only every ``rescan`` seconds or after windows
+came, went or moved, and only below the windows' processes, through
+``/proc/<pid>/task/<tid>/children``. Kernels without those files get the
+whole process table listed instead, each process having its parent read
+once.
+
+``qtile cmd-obj -o root -f top_groups`` lists the groups using the most, with
+their biggest processes.
+"""
+
+import collections
+import heapq
+import logging
+import os
+import time
+
+logger = logging.getLogger("libqtile")
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+MIB = 1024 * 1024
+
+
+def parse_stat(data):
+    """(comm, ppid, CPU seconds, RSS bytes) from ``/proc/<pid>/stat``."""
+    # comm may contain spaces and parentheses; it ends at the last ")".
+    end = data.rindex(b")")
+    fields = data[end + 2:].split()
+    return (
+        data[data.index(b"(") + 1:end].decode(errors="replace"),
+        int(fields[1]),
+        (int(fields[11]) + int(fields[12])) / CLK_TCK,
+        int(fields[21]) * PAGE_SIZE,
+    )
+
+
+def parse_rollup(data, key=b"\nPss:"):
+    """One field of ``/proc/<pid>/smaps_rollup``, in bytes."""
+    start = data.find(key)
+    if start < 0:
+        return None
+    return int(data[start + len(key):data.index(b"kB", start)]) * 1024
+
+
+class _Proc:
+    __slots__ = (
+        "pid", "group", "comm", "cpu", "rate", "read_at", "idle", "memory", "pss_at",
+        "cpu_fd", "smaps_fd",
+    )
+
+    def __init__(self, pid, group):
+        self.pid = pid
+        self.group = group
+        self.comm = None
+        self.cpu = None
+        self.rate = 0.0
+        self.read_at = None
+        self.idle = False
+        self.memory = 0
+        self.pss_at = None
+        self.cpu_fd = None
+        self.smaps_fd = None
+
+
+class Accounting:
+    """Keeps CPU and memory totals per group for the processes of its windows.
+
+    At most ``max_fds`` descriptors are kept open; past that, files are
+    opened for each read.
+    """
+
+    def __init__(
+        self, rescan=10.0, pss_per_tick=4, pss_max_age=60.0, idle_every=8, max_fds=512, proc="/proc"
+    ):
+        self.rescan = rescan
+        self.pss_per_tick = pss_per_tick
+        self.pss_max_age = pss_max_age
+        self.idle_every = idle_every
+        self.max_fds = max_fds
+        self.proc = proc
+        self.qtile = None
+        self.totals = ()
+        self.ticks = 0
+        self.scans = 0
+        self.cpu_reads = 0
+        self.stat_reads = 0
+        self.smaps_reads = 0
+        self.latencies = []
+        self._procs = {}
+        self._busy = {}
+        self._idle = [{} for _ in range(idle_every)]
+        self._cpu = collections.Counter()
+        self._memory = collections.Counter()
+        self._count = collections.Counter()
+        self._parents = {}
+        self._roots = {}
+        self._wid_pids = {}
+        # Without CONFIG_SCHED_INFO, CPU time comes from stat.
+        self._schedstat = os.path.exists(os.path.join(proc, "self", "schedstat"))
+        self._fds = 0
+        # Without CONFIG_PROC_CHILDREN, the tree comes from every process's stat.
+        self._children_files = os.path.exists(os.path.join(proc, "thread-self", "children"))
+        self._dirty = True
+        self._last_scan = None
+        self._last_sample = None
+
+    def install(self, qtile):
+        """Hook for ``startup``: add the commands to the root object."""
+        self.qtile = qtile
+        self._dirty = True
+        qtile.cmd_top_groups = self.cmd_top_groups
+        qtile.cmd_accounting_stats = self.cmd_accounting_stats
+
+    def changed(self, *args):
+        """Hook for windows coming, going or changing group."""
+        self._dirty = True
+
+    def sample(self):
+        """Read the processes due and return ``(group, cpu %, MiB)`` totals."""
+        start = time.perf_counter()
+        now = time.monotonic()
+        if self._dirty or self._last_scan is None or now - self._last_scan >= self.rescan:
+            self._scan(now)
+
+        self.ticks += 1
+        due = list(self._busy.values())
+        due.extend(self._idle[self.ticks % self.idle_every].values())
+        read = []
+        for proc in due:
+            if self._read_cpu(proc, now):
+                read.append(proc)
+            else:
+                self._drop(proc.pid)
+
+        stale = [
+            proc for proc in read
+            if not proc.idle or proc.pss_at is None or now - proc.pss_at >= self.pss_max_age
+        ]
+        if len(stale) > self.pss_per_tick:
+            stale = heapq.nsmallest(
+                self.pss_per_tick, stale, key=lambda proc: -1 if proc.pss_at is None else proc.pss_at
+            )
+        for proc in stale:
+            self._read_pss(proc, now)
+
+        self._last_sample = now
+        self.totals = tuple(
+            (group, round(self._cpu[group] * 100), self._memory[group] // MIB)
+            for group in sorted(self._count)
+        )
+        self.latencies.append(time.perf_counter() - start)
+        del self.latencies[:-64]
+        return self.totals
+
+    def _charge(self, proc, sign):
+        self._cpu[proc.group] += sign * proc.rate
+        self._memory[proc.group] += sign * proc.memory
+
+    def _scan(self, now):
+        self.scans += 1
+        self._last_scan = now
+        if self._dirty and self.qtile is not None:
+            self._dirty = False
+            self._roots = self._window_roots()
+
+        # Windows' own processes first, so a terminal started from another
+        # terminal stays in its own group.
+        owner = {pid: group for pid, group in self._roots.items() if self._alive(pid)}
+        if self._children_files:
+            children = self._children_from_tasks
+        else:
+            children = self._children_from_table()
+        stack = list(owner.items())
+        while stack:
+            pid, group = stack.pop()
+            for child in children(pid):
+                if child not in owner:
+                    owner[child] = group
+                    stack.append((child, group))
+
+        for pid in [pid for pid in self._procs if pid not in owner]:
+            self._drop(pid)
+        for pid, group in owner.items():
+            proc = self._procs.get(pid)
+            if proc is None:
+                proc = self._procs[pid] = _Proc(pid, group)
+                self._busy[pid] = proc
+            else:
+                proc.group = group
+        # Start over from the processes, so float rounding can't pile up.
+        self._cpu.clear()
+        self._memory.clear()
+        self._count.clear()
+        for proc in self._procs.values():
+            self._charge(proc, 1)
+            self._count[proc.group] += 1
+
+    def _alive(self, pid):
+        return os.path.exists("{}/{}".format(self.proc, pid))
+
+    def _children_from_tasks(self, pid):
+        """Children of every thread of ``pid``, from ``task/<tid>/children``."""
+        task = "{}/{}/task".format(self.proc, pid)
+        try:
+            tids = os.listdir(task)
+        except OSError:
+            return ()
+        children = []
+        for tid in tids:
+            data = self._read_once("{}/{}/children".format(task, tid), 4096)
+            if data:
+                children.extend(int(child) for child in data.split())
+        return children
+
+    def _children_from_table(self):
+        """Without CONFIG_PROC_CHILDREN: the parent of every process, a pid's
+        parent being read once."""
+        parents = {}
+        try:
+            names = os.listdir(self.proc)
+        except OSError as e:
+            logger.warning("accounting: cannot list %s: %s", self.proc, e)
+            names = ()
+        for name in names:
+            if not name.isdigit():
+                continue
+            pid = int(name)
+            ppid = self._parents.get(pid)
+            if ppid is None:
+                data = self._read_once("{}/{}/stat".format(self.proc, pid), 512)
+                if not data:
+                    continue
+                ppid = parse_stat(data)[1]
+            parents[pid] = ppid
+        self._parents = parents
+        children = collections.defaultdict(list)
+        for pid, ppid in parents.items():
+            children[ppid].append(pid)
+        return lambda pid: children.get(pid, ())
+
+    def _window_roots(self):
+        """Map each window's pid to its group; one with windows on several
+        groups goes to the group holding most of them."""
+        windows = {}
+        for window in self.qtile.windows_map.values():
+            group = getattr(window, "group", None)
+            if group is not None:
+                windows[window.wid] = (window, group.name)
+        missing = [wid for wid in windows if wid not in self._wid_pids]
+        pids = {wid: pid for wid, pid in self._wid_pids.items() if wid in windows}
+        if missing:
+            pids.update(self._query_pids(missing))
+            for wid in missing:
+                if wid not in pids:
+                    try:
+                        pids[wid] = windows[wid][0].get_pid()
+                    except Exception:
+                        pids[wid] = None
+        self._wid_pids = pids
+
+        votes = collections.defaultdict(collections.Counter)
+        for wid, (window, group) in windows.items():
+            if pids.get(wid):
+                votes[pids[wid]][group] += 1
+        return {pid: groups.most_common(1)[0][0] for pid, groups in votes.items()}
+
+    def _query_pids(self, wids):
+        """Client PIDs from X-Resource; the requests go out before any reply is read."""
+        try:
+            import xcffib.res
+
+            res = self.qtile.core.conn.conn(xcffib.res.key)
+            mask = xcffib.res.ClientIdMask.LocalClientPID
+            cookies = [
+                (wid, res.QueryClientIds(1, [xcffib.res.ClientIdSpec.synthetic(wid, mask)]))
+                for wid in wids
+            ]
+            pids = {}
+            for wid, cookie in cookies:
+                for value in cookie.reply().ids:
+                    if value.spec.mask & mask and value.value:
+                        pids[wid] = value.value[0]
+            return pids
+        except Exception as e:
+            logger.debug("accounting: X-Resource lookup failed: %s", e)
+            return {}
+
+    def _read_once(self, path, size):
+        self.stat_reads += 1
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return None
+        try:
+            return os.pread(fd, size, 0)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
+    def _pread(self, proc, attr, name, size):
+        fd = getattr(proc, attr)
+        if fd is None:
+            path = "{}/{}/{}".format(self.proc, proc.pid, name)
+            if self._fds >= self.max_fds:
+                return self._read_once(path, size)
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return None
+            setattr(proc, attr, fd)
+            self._fds += 1
+        try:
+            # Fails with ESRCH once the process is gone, even if its pid
+            # was reused meanwhile.
+            return os.pread(fd, size, 0)
+        except OSError:
+            return None
+
+    def _read_cpu(self, proc, now):
+        if proc.comm is None:
+            # First read: the name, and RSS until smaps_rollup has its turn.
+            data = self._read_once("{}/{}/stat".format(self.proc, proc.pid), 512)
+            if not data:
+                return False
+            self._charge(proc, -1)
+            proc.comm, _, cpu, proc.memory = parse_stat(data)
+            self._charge(proc, 1)
+            if not self._schedstat:
+                proc.cpu, proc.read_at = cpu, now
+                return True
+        self.cpu_reads += 1
+        if self._schedstat:
+            # Nanoseconds on the CPU; cheaper to read and parse than stat.
+            data = self._pread(proc, "cpu_fd", "schedstat", 64)
+            if not data:
+                return False
+            cpu = int(data.split(None, 1)[0]) / 1e9
+        else:
+            data = self._pread(proc, "cpu_fd", "stat", 512)
+            if not data:
+                return False
+            cpu = parse_stat(data)[2]
+        if proc.cpu is not None and now > proc.read_at:
+            rate = (cpu - proc.cpu) / (now - proc.read_at)
+            self._cpu[proc.group] += rate - proc.rate
+            proc.rate = rate
+            idle = cpu == proc.cpu
+            if idle != proc.idle:
+                proc.idle = idle
+                if idle:
+                    del self._busy[proc.pid]
+                    self._idle[proc.pid % self.idle_every][proc.pid] = proc
+                else:
+                    del self._idle[proc.pid % self.idle_every][proc.pid]
+                    self._busy[proc.pid] = proc
+        proc.cpu, proc.read_at = cpu, now
+        return True
+
+    def _read_pss(self, proc, now):
+        self.smaps_reads += 1
+        proc.pss_at = now
+        data = self._pread(proc, "smaps_fd", "smaps_rollup", 1024)
+        pss = parse_rollup(data) if data else None
+        if pss is not None:
+            self._memory[proc.group] += pss - proc.memory
+            proc.memory = pss
+
+    def _drop(self, pid):
+        proc = self._procs.pop(pid, None)
+        self._parents.pop(pid, None)
+        if proc is None:
+            return
+        if proc.idle:
+            self._idle[pid % self.idle_every].pop(pid, None)
+        else:
+            self._busy.pop(pid, None)
+        self._charge(proc, -1)
+        self._count[proc.group] -= 1
+        if not self._count[proc.group]:
+            del self._count[proc.group]
+        for attr in ("cpu_fd", "smaps_fd"):
+            fd = getattr(proc, attr)
+            if fd is not None:
+                os.close(fd)
+                self._fds -= 1
+                setattr(proc, attr, None)
+
+    def top(self, count=3, sort="memory", processes=3):
+        """The ``count`` groups using the most ``sort`` ("memory" or "cpu")."""
+        index = 2 if sort == "memory" else 1
+        groups = sorted(self.totals, key=lambda total: total[index], reverse=True)[:count]
+        by_group = collections.defaultdict(list)
+        for proc in self._procs.values():
+            by_group[proc.group].append(proc)
+        report = []
+        for group, cpu, memory in groups:
+            procs = sorted(by_group[group], key=lambda proc: proc.memory, reverse=True)
+            report.append({
+                "group": group,
+                "cpu_percent": cpu,
+                "memory_mib": memory,
+                "processes": len(procs),
+                "top": [
+                    {"pid": proc.pid, "name": proc.comm, "memory_mib": proc.memory // MIB}
+                    for proc in procs[:processes]
+                ],
+            })
+        return report
+
+    def cmd_top_groups(self, count=3, sort="memory", processes=3):
+        """Groups using the most memory or CPU, with their biggest processes."""
+        if self._last_sample is None or time.monotonic() - self._last_sample > 1:
+            self.sample()
+        return self.top(count, sort, processes)
+
+    def cmd_accounting_stats(self):
+        """Tracked processes, open descriptors, reads and the cost of a tick."""
+        latencies = sorted(self.latencies)
+        return {
+            "processes": len(self._procs),
+            "busy": len(self._busy),
+            "windows": len(self._wid_pids),
+            "fds": self._fds,
+            "ticks": self.ticks,
+            "scans": self.scans,
+            "cpu_reads": self.cpu_reads,
+            "stat_reads": self.stat_reads,
+            "smaps_reads": self.smaps_reads,
+            "tick_p50_us": round(latencies[len(latencies) // 2] * 1e6) if latencies else None,
+            "tick_max_us": round(latencies[-1] * 1e6) if latencies else None,
+        }
+
+    def close(self):
+        for pid in list(self._procs):
+            self._drop(pid)
+
+
+# Kept across importlib.reload() of this module on config reloads, so the
+# open descriptors and CPU counters outlive them.
+try:
+    _accounting
+except NameError:
+    _accounting = None
+
+
+def get_accounting(**config):
+    """Return the session-wide accounting, creating it on first use."""
+    global _accounting
+    if _accounting is None:
+        _accounting = Accounting(**config)
+    return _accounting
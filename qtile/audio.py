@@ -0,0 +1,314 @@
+"""Volume control over one long-lived sound server connection.
+
+Key repeats only adjust a pending delta; the net change is applied once per
+``coalesce_delay`` and the new level is pushed to subscribers (the bar
+widget) straight away. With ``pulsectl`` installed the controller talks to
+PulseAudio/PipeWire over a single persistent connection and hears about
+changes made elsewhere (pavucontrol, headphones) from server events. Without
+it, it falls back to one ``pactl`` call per burst rather than per key press,
+and hears about outside changes from ``pactl subscribe``.
+"""
+
+import asyncio
+import logging
+import subprocess
+import threading
+
+logger = logging.getLogger("libqtile")
+
+try:
+    import pulsectl
+except ImportError:
+    pulsectl = None
+
+
+class PulseBackend:
+    """Persistent ``pulsectl`` connection to the default (or named) sink."""
+
+    def __init__(self, sink=None, client_name="qtile-volume"):
+        self.sink_name = sink
+        self.client_name = client_name
+        self.pulse = pulsectl.Pulse(client_name)
+        self._listener = None
+
+    def _sink(self):
+        name = self.sink_name or self.pulse.server_info().default_sink_name
+        return self.pulse.get_sink_by_name(name)
+
+    def get(self):
+        sink = self._sink()
+        return round(self.pulse.volume_get_all_chans(sink) * 100), bool(sink.mute)
+
+    def set(self, volume, mute):
+        sink = self._sink()
+        self.pulse.volume_set_all_chans(sink, volume / 100)
+        if bool(sink.mute) != mute:
+            self.pulse.mute(sink, mute)
+
+    def listen(self, on_change):
+        """Call ``on_change()`` from a helper thread on every sink/server event."""
+
+        def callback(ev):
+            raise pulsectl.PulseLoopStop
+
+        def run():
+            try:
+                with pulsectl.Pulse(self.client_name + "-events") as events:
+                    events.event_mask_set("sink", "server")
+                    events.event_callback_set(callback)
+                    while True:
+                        events.event_listen()
+                        on_change()
+            except Exception:
+                logger.exception("volume: lost the sound server event connection")
+
+        self._listener = threading.Thread(target=run, name="volume-events", daemon=True)
+        self._listener.start()
+
+    def close(self):
+        self.pulse.close()
+
+
+class PactlBackend:
+    """Fallback that forks ``pactl``, but only once per coalesced change.
+
+    ``get`` and ``set`` are coroutines so the event loop keeps running while
+    ``pactl`` talks to the server. Changes made elsewhere are heard from one
+    long-running ``pactl subscribe``.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink or "@DEFAULT_SINK@"
+        self.volume = None
+        self.mute = None
+        self._subscribe = None
+        self._listener = None
+
+    async def _pactl(self, *args):
+        proc = await asyncio.create_subprocess_exec(
+            "pactl", *args, stdout=asyncio.subprocess.PIPE
+        )
+        out, _ = await proc.communicate()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, ["pactl", *args])
+        return out.decode("utf-8")
+
+    async def get(self):
+        volume, mute = await asyncio.gather(
+            self._pactl("get-sink-volume", self.sink),
+            self._pactl("get-sink-mute", self.sink),
+        )
+        self.volume = int(volume.split("/")[1].strip().rstrip("%"))
+        self.mute = mute.strip().endswith("yes")
+        return self.volume, self.mute
+
+    async def set(self, volume, mute):
+        # Only fork for what changed: a volume step leaves mute alone.
+        if volume != self.volume:
+            await self._pactl("set-sink-volume", self.sink, "{}%".format(volume))
+            self.volume = volume
+        if mute != self.mute:
+            await self._pactl("set-sink-mute", self.sink, "1" if mute else "0")
+            self.mute = mute
+
+    def listen(self, on_change):
+        """Call ``on_change()`` from a helper thread on every sink/server event."""
+
+        def run():
+            try:
+                self._subscribe = subprocess.Popen(
+                    ["pactl", "subscribe"], stdout=subprocess.PIPE, encoding="utf-8"
+                )
+            except OSError:
+                logger.exception("volume: cannot run pactl subscribe")
+                return
+            # Lines look like: Event 'change' on sink #0
+            for line in self._subscribe.stdout:
+                if " on sink " in line or " on server" in line:
+                    on_change()
+            if self._subscribe is not None:
+                logger.warning("volume: pactl subscribe exited")
+
+        self._listener = threading.Thread(target=run, name="volume-events", daemon=True)
+        self._listener.start()
+
+    def close(self):
+        subscribe, self._subscribe = self._subscribe, None
+        if subscribe is not None:
+            subscribe.terminate()
+            subscribe.wait()
+
+
+def default_backend(sink=None):
+    if pulsectl is not None:
+        try:
+            return PulseBackend(sink)
+        except Exception:
+            logger.exception("volume: cannot connect to the sound server")
+    return PactlBackend(sink)
+
+
+class VolumeController:
+    """Coalesces volume key presses and pushes the result to subscribers.
+
+    Backend calls may be plain functions (``pulsectl``) or coroutines
+    (``pactl``); either way they run in a task, one write at a time. Server
+    events that arrive while our own write is in flight, or within
+    ``echo_window`` seconds of it, are its echo and are not read back.
+    """
+
+    def __init__(
+        self, backend=None, sink=None, coalesce_delay=0.03, max_volume=100, echo_window=0.2
+    ):
+        self._backend = backend
+        self.sink = sink
+        self.coalesce_delay = coalesce_delay
+        self.max_volume = max_volume
+        self.echo_window = echo_window
+        self.volume = None
+        self.mute = False
+        self.presses = 0
+        self.applied = 0
+        self.echoes = 0
+        self._pending = 0
+        self._toggle_mute = False
+        self._flush_handle = None
+        self._write = None
+        self._echo_until = 0
+        self._refresh_pending = False
+        self._loop = None
+        self._subscribers = []
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._loop = self._loop or asyncio.get_event_loop()
+            self._backend = default_backend(self.sink)
+            self._backend.listen(self._on_server_event)
+        return self._backend
+
+    def subscribe(self, callback):
+        if self.volume is None:
+            self.refresh()
+        self._subscribers.append(callback)
+        if self.volume is not None:
+            callback(self.volume, self.mute)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def change(self, delta):
+        """Queue a relative change in percent, applied with its burst."""
+        self.presses += 1
+        self._pending += delta
+        self._schedule()
+
+    def toggle_mute(self):
+        self.presses += 1
+        self._toggle_mute = not self._toggle_mute
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_handle is None:
+            self._loop = self._loop or asyncio.get_event_loop()
+            self._flush_handle = self._loop.call_later(self.coalesce_delay, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        if self._write is not None:
+            # Picked up when the write in flight is done.
+            return
+        self._loop = self._loop or asyncio.get_event_loop()
+        self._write = self._loop.create_task(self._apply())
+
+    async def _apply(self):
+        try:
+            if self.volume is None:
+                await self._refresh()
+            if self.volume is None:
+                return
+            delta, self._pending = self._pending, 0
+            toggle, self._toggle_mute = self._toggle_mute, False
+            volume = min(max(self.volume + delta, 0), self.max_volume)
+            mute = not self.mute if toggle else self.mute
+            if (volume, mute) == (self.volume, self.mute):
+                return
+            try:
+                await self._call(self.backend.set, volume, mute)
+            except Exception:
+                logger.exception("volume: setting the volume failed")
+                return
+            self.applied += 1
+            self._echo_until = self._loop.time() + self.echo_window
+            self._publish(volume, mute)
+        finally:
+            self._write = None
+            if self._pending or self._toggle_mute:
+                self._schedule()
+
+    async def _call(self, method, *args):
+        result = method(*args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    def refresh(self):
+        """Read the level from the server in a task and publish it."""
+        self._loop = self._loop or asyncio.get_event_loop()
+        return self._loop.create_task(self._refresh())
+
+    async def _refresh(self):
+        try:
+            volume, mute = await self._call(self.backend.get)
+        except Exception:
+            logger.exception("volume: reading the volume failed")
+            return
+        self._publish(volume, mute)
+
+    def _on_server_event(self):
+        # Called from the listener thread. One change comes as several
+        # events; read the volume once for all of them.
+        if self._loop is None or self._refresh_pending:
+            return
+        self._refresh_pending = True
+        self._loop.call_soon_threadsafe(self._refresh_event)
+
+    def _refresh_event(self):
+        self._refresh_pending = False
+        if self._write is not None or self._loop.time() < self._echo_until:
+            # The server telling us about our own write; we already know.
+            self.echoes += 1
+            return
+        self.refresh()
+
+    def _publish(self, volume, mute):
+        if (volume, mute) == (self.volume, self.mute):
+            return
+        self.volume, self.mute = volume, mute
+        for callback in list(self._subscribers):
+            try:
+                callback(volume, mute)
+            except Exception:
+                logger.exception("volume: subscriber failed")
+
+    def stats(self):
+        return {"presses": self.presses, "applied": self.applied, "echoes": self.echoes}
+
+
+# Kept across importlib.reload() of this module on config reloads so the
+# session keeps one sound server connection.
+try:
+    _controller
+except NameError:
+    _controller = None
+
+
+def get_controller(**config):
+    """Return the session-wide controller, creating it on first use."""
+    global _controller
+    if _controller is None:
+        _controller = VolumeController(**config)
+    return _controller
@@ -1,6 +0,0 @@
-#! /bin/bash
-nitrogen --restore &
-picom &
-lxpolkit &
-dunst &
-setxkbmap -option caps:escape
@@ -0,0 +1,269 @@
+"""Event-driven battery monitor.
+
+A single monitor per session listens for power_supply uevents on the kernel
+netlink socket and keeps the parsed battery state cached. The bar widget and
+the low/full notifications both read from that cache, so nothing polls sysfs
+or forks ``acpi``/``cat``/``upower`` any more.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from collections import namedtuple
+
+import notify
+
+logger = logging.getLogger("libqtile")
+
+POWER_SUPPLY = "/sys/class/power_supply"
+NETLINK_KOBJECT_UEVENT = 15
+
+BatteryState = namedtuple("BatteryState", "name percent status ac_online")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path):
+    try:
+        return int(_read(path))
+    except (TypeError, ValueError):
+        return None
+
+
+def find_battery(root=POWER_SUPPLY):
+    """Return the name of the first supply of type Battery (BAT0, BAT1...)."""
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+    for name in names:
+        if _read(os.path.join(root, name, "type")) == "Battery":
+            return name
+    return None
+
+
+def read_state(root=POWER_SUPPLY, name=None):
+    """Read the battery state from sysfs, or return None without a battery."""
+    name = name or find_battery(root)
+    if name is None:
+        return None
+    path = os.path.join(root, name)
+
+    capacity = _read_int(os.path.join(path, "capacity"))
+    if capacity is not None:
+        percent = capacity / 100
+    else:
+        percent = None
+        for prefix in ("energy", "charge"):
+            now = _read_int(os.path.join(path, prefix + "_now"))
+            full = _read_int(os.path.join(path, prefix + "_full"))
+            if now is not None and full:
+                percent = min(now / full, 1.0)
+                break
+        if percent is None:
+            return None
+
+    status = _read(os.path.join(path, "status")) or "Unknown"
+    return BatteryState(name, percent, status, _ac_online(root))
+
+
+def _ac_online(root):
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return None
+    for name in names:
+        if _read(os.path.join(root, name, "type")) == "Mains":
+            return _read(os.path.join(root, name, "online")) == "1"
+    return None
+
+
+def parse_uevent(data):
+    """Split a raw kernel uevent into its KEY=value properties."""
+    props = {}
+    for field in data.split(b"\0"):
+        key, sep, value = field.partition(b"=")
+        if sep:
+            props[key.decode(errors="replace")] = value.decode(errors="replace")
+    return props
+
+
+class BatteryMonitor:
+    """Shared battery state, refreshed on power_supply uevents.
+
+    ``fallback_interval`` re-reads sysfs every so many seconds for firmware
+    that does not send change events on capacity updates; set it to None to
+    rely on events only. Subscribers are called with the new
+    :class:`BatteryState` whenever it changes. Low, critical and full
+    warnings are sent once per discharge or charge, through ``notifier``, a
+    :class:`notify.Notifier`.
+    """
+
+    def __init__(
+        self,
+        root=POWER_SUPPLY,
+        low_level=0.26,
+        critical_level=0.1,
+        full_level=0.95,
+        fallback_interval=300,
+        notifier=None,
+    ):
+        self.root = root
+        self.low_level = low_level
+        self.critical_level = critical_level
+        self.full_level = full_level
+        self.fallback_interval = fallback_interval
+        self.notifier = notifier if notifier is not None else notify.get_notifier()
+        self.state = None
+        self.events = 0
+        self.reads = 0
+        self._subscribers = []
+        self._sock = None
+        self._loop = None
+        self._timer = None
+        self._low_sent = False
+        self._critical_sent = False
+        self._full_sent = False
+
+    @property
+    def running(self):
+        return self._loop is not None
+
+    def subscribe(self, callback):
+        if self.state is None:
+            self.refresh()
+        self._subscribers.append(callback)
+        if self.state is not None:
+            callback(self.state)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def start(self, loop=None):
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_event_loop()
+        try:
+            self._sock = self._open_socket()
+        except OSError:
+            logger.warning("battery: netlink unavailable, polling sysfs instead")
+            self._sock = None
+        else:
+            self._loop.add_reader(self._sock.fileno(), self._on_readable)
+        self.refresh()
+        self._schedule_fallback()
+
+    def stop(self):
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._loop = None
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        sock.setblocking(False)
+        # Multicast group 1 carries the raw kernel events.
+        sock.bind((0, 1))
+        return sock
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(8192)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.handle_uevent(data)
+
+    def handle_uevent(self, data):
+        props = parse_uevent(data)
+        if props.get("SUBSYSTEM") != "power_supply":
+            return
+        self.events += 1
+        self.refresh()
+
+    def _schedule_fallback(self):
+        if self._loop is None:
+            return
+        interval = self.fallback_interval
+        if self._sock is None and interval is None:
+            interval = 60
+        if interval is not None:
+            self._timer = self._loop.call_later(interval, self._on_fallback)
+
+    def _on_fallback(self):
+        self.refresh()
+        self._schedule_fallback()
+
+    def refresh(self):
+        self.reads += 1
+        state = read_state(self.root, self.state.name if self.state else None)
+        if state is None or state == self.state:
+            return
+        old, self.state = self.state, state
+        self._check_levels(old, state)
+        for callback in list(self._subscribers):
+            try:
+                callback(state)
+            except Exception:
+                logger.exception("battery: subscriber failed")
+
+    def _check_levels(self, old, new):
+        discharging = new.status == "Discharging"
+        if discharging:
+            self._full_sent = False
+        else:
+            self._low_sent = self._critical_sent = False
+
+        if discharging and new.percent <= self.critical_level and not self._critical_sent:
+            self._critical_sent = self._low_sent = True
+            self._notify(
+                "Critical Battery",
+                "{:.0%} of battery remaining, plug in now.".format(new.percent),
+                urgent=True,
+            )
+        elif discharging and new.percent <= self.low_level and not self._low_sent:
+            self._low_sent = True
+            self._notify(
+                "Low Battery",
+                "{:.0%} of battery remaining.".format(new.percent),
+                urgent=True,
+            )
+        elif not discharging and new.percent >= self.full_level and not self._full_sent:
+            self._full_sent = True
+            # Don't announce a full battery that was already full at startup.
+            if old is not None:
+                self._notify("Battery Charged", "Battery is fully charged.")
+
+    def _notify(self, title, message, urgent=False):
+        # One "battery" notification on screen at a time: each replaces the last.
+        self.notifier.send(title, message, category="battery", source="battery", urgent=urgent)
+
+
+# Kept across importlib.reload() of this module on config reloads so that
+# a session only ever has one netlink listener.
+try:
+    _monitor
+except NameError:
+    _monitor = None
+
+
+def get_monitor(**config):
+    """Return the session-wide monitor, creating it on first use."""
+    global _monitor
+    if _monitor is None:
+        _monitor = BatteryMonitor(**config)
+    return _monitor
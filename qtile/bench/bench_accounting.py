@@ -0,0 +1,148 @@
+"""Cost of a per-group accounting tick.
+
+Starts ``--windows`` stand-in "window" processes, each with a tree of
+children, ``--processes`` in all, spread over the groups of a fake qtile.
+It then reports how long :meth:`accounting.Accounting.sample` takes: the
+first tick, which walks the process tree and opens every descriptor, the
+ticks until every process had its PSS read once, ticks after that, and
+ticks that also walk the tree again. It finishes by checking that every
+process was charged to its window's group.
+
+    python bench/bench_accounting.py [--processes 300] [--windows 10] [--ticks 200]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accounting  # noqa: E402
+
+try:
+    # Already loaded in qtile; keep its import out of the first tick.
+    import xcffib  # noqa: E402, F401
+except ImportError:
+    pass
+
+# A shell that starts CHILDREN sleeping children and waits.
+TREE = "for i in $(seq {children}); do sleep 600 & done; wait"
+
+
+class FakeGroup:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeWindow:
+    def __init__(self, wid, pid, group):
+        self.wid = wid
+        self.pid = pid
+        self.group = group
+
+    def get_pid(self):
+        return self.pid
+
+
+class FakeQtile:
+    def __init__(self):
+        self.windows_map = {}
+
+
+def _summary(name, latencies):
+    ordered = sorted(latencies)
+    print("{:<18} {:>9.0f} {:>9.0f} {:>9.0f}".format(
+        name, statistics.median(ordered) * 1e6, ordered[int(0.95 * (len(ordered) - 1))] * 1e6,
+        ordered[-1] * 1e6,
+    ))
+
+
+def main(args):
+    children = max(args.processes // args.windows - 1, 0)
+    roots = [
+        subprocess.Popen(["sh", "-c", TREE.format(children=children)], start_new_session=True)
+        for _ in range(args.windows)
+    ]
+    try:
+        qtile = FakeQtile()
+        for i, root in enumerate(roots):
+            qtile.windows_map[i + 1] = FakeWindow(i + 1, root.pid, FakeGroup(str(i % 8 + 1)))
+        # Let every shell start its children.
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            counts = [_count_children(root.pid) for root in roots]
+            if all(count >= children for count in counts):
+                break
+            time.sleep(0.05)
+
+        usage = accounting.Accounting(rescan=3600, pss_per_tick=args.pss_per_tick)
+        usage.install(qtile)
+        start = time.perf_counter()
+        usage.sample()
+        first = time.perf_counter() - start
+
+        # Until every process had its PSS read once.
+        warmup = []
+        while usage.smaps_reads < stats_processes(usage):
+            start = time.perf_counter()
+            usage.sample()
+            warmup.append(time.perf_counter() - start)
+
+        ticks = []
+        for _ in range(args.ticks):
+            start = time.perf_counter()
+            usage.sample()
+            ticks.append(time.perf_counter() - start)
+        rescans = []
+        for _ in range(max(args.ticks // 10, 1)):
+            usage.changed()
+            start = time.perf_counter()
+            usage.sample()
+            rescans.append(time.perf_counter() - start)
+
+        stats = usage.cmd_accounting_stats()
+        print("{} processes, {} descriptors open".format(stats["processes"], stats["fds"]))
+        print("{:<18} {:>9} {:>9} {:>9}".format("", "p50 us", "p95 us", "max us"))
+        print("{:<18} {:>9.0f}".format("first tick", first * 1e6))
+        _summary("warming up", warmup)
+        _summary("tick", ticks)
+        _summary("tick with rescan", rescans)
+
+        expected = {}
+        for i in range(len(roots)):
+            group = str(i % 8 + 1)
+            expected[group] = expected.get(group, 0) + 1 + children
+        charged = {entry["group"]: entry["processes"] for entry in usage.top(count=8)}
+        ok = charged == expected
+        print("{:<18} {}".format("groups charged", "ok" if ok else "FAILED {} != {}".format(charged, expected)))
+        usage.close()
+    finally:
+        for root in roots:
+            os.killpg(root.pid, 15)
+            root.wait()
+    if not ok:
+        sys.exit(1)
+
+
+def stats_processes(usage):
+    return usage.cmd_accounting_stats()["processes"]
+
+
+def _count_children(pid):
+    try:
+        with open("/proc/{0}/task/{0}/children".format(pid)) as f:
+            return len(f.read().split())
+    except OSError:
+        return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=300)
+    parser.add_argument("--windows", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--pss-per-tick", type=int, default=4)
+    main(parser.parse_args())
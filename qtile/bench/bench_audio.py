@@ -0,0 +1,184 @@
+"""Volume keys against a stand-in sound server driven through ``pactl``.
+
+Puts a fake ``pactl`` on PATH that keeps the sink's volume and mute in a
+state file, logs every call, and appends an ``Event 'change' on sink`` line
+to an event file on each write; ``pactl subscribe`` tails that file, so
+:class:`audio.PactlBackend` hears its own writes echoed back just as it does
+from PulseAudio. Writes take ``--delay`` seconds, like a busy server. The
+run reports the calls each burst caused and the worst event loop stall, and
+checks that a burst forks one write, mute is only sent when it changed, our
+own echoes are not read back, outside changes are, and the loop never waits
+on ``pactl``.
+
+    python bench/bench_audio.py [--presses 20] [--delay 0.1]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio  # noqa: E402
+
+PACTL = """#!/bin/sh
+echo "$1" >> "{log}"
+read -r volume mute < "{state}"
+case "$1" in
+get-sink-volume)
+    echo "Volume: front-left: 65536 / $volume% / 0.00 dB,   front-right: 65536 / $volume% / 0.00 dB" ;;
+get-sink-mute)
+    echo "Mute: $mute" ;;
+set-sink-volume)
+    sleep {delay}
+    echo "${{3%\\%}} $mute" > "{state}"
+    echo "Event 'change' on sink #0" >> "{events}" ;;
+set-sink-mute)
+    sleep {delay}
+    if [ "$3" = 1 ]; then mute=yes; else mute=no; fi
+    echo "$volume $mute" > "{state}"
+    echo "Event 'change' on sink #0" >> "{events}" ;;
+subscribe)
+    exec tail -n 0 -f "{events}" ;;
+esac
+"""
+
+
+class Server:
+    def __init__(self, root, delay):
+        self.log = os.path.join(root, "calls")
+        self.state = os.path.join(root, "state")
+        self.events = os.path.join(root, "events")
+        for path in (self.log, self.events):
+            open(path, "w").close()
+        self.write_state(50, "no")
+        bindir = os.path.join(root, "bin")
+        os.makedirs(bindir)
+        pactl = os.path.join(bindir, "pactl")
+        with open(pactl, "w") as f:
+            f.write(PACTL.format(log=self.log, state=self.state, events=self.events, delay=delay))
+        os.chmod(pactl, os.stat(pactl).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bindir + os.pathsep + os.environ["PATH"]
+
+    def write_state(self, volume, mute):
+        with open(self.state, "w") as f:
+            f.write("{} {}\n".format(volume, mute))
+
+    def outside_change(self, volume):
+        """What pavucontrol would do."""
+        self.write_state(volume, "no")
+        with open(self.events, "a") as f:
+            f.write("Event 'change' on sink #0\n")
+
+    def calls(self):
+        with open(self.log) as f:
+            return [line.strip() for line in f if line.strip() != "subscribe"]
+
+
+class Stalls:
+    """Largest gap between ticks of a periodic callback on the loop."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.worst = 0
+        self._loop = asyncio.get_event_loop()
+        self._last = self._loop.time()
+        self._handle = self._loop.call_later(interval, self._tick)
+
+    def _tick(self):
+        now = self._loop.time()
+        self.worst = max(self.worst, now - self._last - self.interval)
+        self._last = now
+        self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def stop(self):
+        self._handle.cancel()
+
+
+async def settle(controller, quiet=0.5):
+    while controller._flush_handle is not None or controller._write is not None:
+        await asyncio.sleep(controller.coalesce_delay)
+    # Give the echoes time to come back.
+    await asyncio.sleep(quiet)
+
+
+async def burst(controller, server, presses, delta):
+    before = len(server.calls())
+    for _ in range(presses):
+        if delta:
+            controller.change(delta)
+        else:
+            controller.toggle_mute()
+        await asyncio.sleep(0)
+    await settle(controller)
+    return server.calls()[before:]
+
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="pactl-")
+    controller = None
+    try:
+        server = Server(root, args.delay)
+        controller = audio.VolumeController(backend=audio.PactlBackend(), coalesce_delay=0.03)
+        seen = []
+        stalls = Stalls()
+        controller.backend.listen(controller._on_server_event)
+        controller.subscribe(lambda volume, mute: seen.append((volume, mute)))
+        await settle(controller)
+        start = server.calls()
+
+        up = await burst(controller, server, args.presses, 5)
+        down = await burst(controller, server, args.presses, -1)
+        mute = await burst(controller, server, 1, 0)
+        unmute_and_step = []
+        controller.toggle_mute()
+        unmute_and_step += await burst(controller, server, 1, 5)
+
+        server.outside_change(30)
+        for _ in range(40):
+            if controller.volume == 30:
+                break
+            await asyncio.sleep(0.05)
+        outside = controller.volume
+        stalls.stop()
+
+        print("{:<28} {}".format("", "pactl calls"))
+        for name, calls in (
+            ("startup", start),
+            ("{} presses up".format(args.presses), up),
+            ("{} presses down".format(args.presses), down),
+            ("mute", mute),
+            ("unmute and step", unmute_and_step),
+        ):
+            print("{:<28} {}".format(name, " ".join(calls) or "-"))
+        print("{:<28} {:.1f} ms".format("worst loop stall", stalls.worst * 1e3))
+        print("{:<28} {}".format("echoes skipped", controller.echoes))
+        checks = {
+            "one write per burst": up == ["set-sink-volume"] and down == ["set-sink-volume"],
+            "mute only when changed": mute == ["set-sink-mute"]
+            and sorted(unmute_and_step) == ["set-sink-mute", "set-sink-volume"],
+            "own echoes not read back": controller.echoes >= 4
+            and not any(call.startswith("get-") for call in up + down + mute + unmute_and_step),
+            "outside change followed": outside == 30,
+            "subscribers told": seen[0] == (50, False) and seen[-1] == (30, False),
+            "loop not blocked": stalls.worst < args.delay / 2,
+        }
+        for name, ok in checks.items():
+            print("{:<28} {}".format(name, "ok" if ok else "FAILED"))
+        return all(checks.values())
+    finally:
+        if controller is not None and controller._backend is not None:
+            controller._backend.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--presses", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.1)
+    if not asyncio.run(main(parser.parse_args())):
+        sys.exit(1)
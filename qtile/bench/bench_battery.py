@@ -0,0 +1,153 @@
+"""Battery monitor against a fake sysfs tree and injected uevents.
+
+Builds a stand-in ``/sys/class/power_supply`` with a battery and an AC
+adapter in a temp dir. The monitor's netlink socket is replaced by one end
+of a datagram socketpair, and the other end sends kernel-format uevent
+payloads (``ACTION@DEVPATH`` then ``KEY=value`` fields, NUL separated) as
+the battery drains and charges. The run reports the cost of handling one
+event. It checks the low, critical and full warnings, that each is sent
+only once per discharge or charge, and that events from other subsystems
+are ignored.
+
+    python bench/bench_battery.py [--events 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import battery  # noqa: E402
+
+DEVPATH = "/devices/LNXSYSTM:00/LNXSYBUS:00/PNP0C0A:00/power_supply/BAT0"
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, title, message="", category=None, source="qtile", urgent=False, timeout=None):
+        self.sent.append((title, urgent))
+        return True
+
+
+class SocketpairMonitor(battery.BatteryMonitor):
+    """Reads uevents from a socketpair instead of the kernel."""
+
+    def _open_socket(self):
+        self.kernel, sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        return sock
+
+
+def make_tree(root):
+    for name, files in (
+        ("AC", {"type": "Mains", "online": "0"}),
+        ("BAT0", {"type": "Battery", "capacity": "50", "status": "Discharging"}),
+    ):
+        os.makedirs(os.path.join(root, name))
+        for key, value in files.items():
+            write(root, name, key, value)
+
+
+def write(root, name, key, value):
+    with open(os.path.join(root, name, key), "w") as f:
+        f.write(value + "\n")
+
+
+def uevent(capacity, status, subsystem="power_supply"):
+    fields = [
+        "change@" + DEVPATH,
+        "ACTION=change",
+        "DEVPATH=" + DEVPATH,
+        "SUBSYSTEM=" + subsystem,
+        "POWER_SUPPLY_NAME=BAT0",
+        "POWER_SUPPLY_STATUS=" + status,
+        "POWER_SUPPLY_CAPACITY={}".format(capacity),
+        "SEQNUM=4242",
+    ]
+    return "\0".join(fields).encode() + b"\0"
+
+
+async def change(monitor, root, capacity, status, subsystem="power_supply"):
+    """Update sysfs like the kernel does, then send the event."""
+    write(root, "BAT0", "capacity", str(capacity))
+    write(root, "BAT0", "status", status)
+    write(root, "AC", "online", "0" if status == "Discharging" else "1")
+    monitor.kernel.send(uevent(capacity, status, subsystem))
+    # Let the loop's reader run.
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="power_supply-")
+    try:
+        make_tree(root)
+        notifier = FakeNotifier()
+        monitor = SocketpairMonitor(
+            root=root, low_level=0.26, critical_level=0.1, full_level=0.95,
+            fallback_interval=None, notifier=notifier,
+        )
+        states = []
+        monitor.start()
+        monitor.subscribe(states.append)
+
+        # Drain through the low and critical levels, with repeated events at
+        # each level, then charge to full and drain again.
+        for capacity in (40, 30, 26, 25, 25, 20, 10, 9, 9, 5):
+            await change(monitor, root, capacity, "Discharging")
+        drained = list(notifier.sent)
+        await change(monitor, root, 5, "Charging")
+        for capacity in (50, 94, 95, 96, 100):
+            await change(monitor, root, capacity, "Charging" if capacity < 100 else "Full")
+        await change(monitor, root, 100, "Full")
+        charged = notifier.sent[len(drained):]
+        events = monitor.events
+        await change(monitor, root, 20, "Discharging", subsystem="usb")
+        ignored = monitor.events == events
+        await change(monitor, root, 25, "Discharging")
+        again = notifier.sent[len(drained) + len(charged):]
+
+        latencies = []
+        data = uevent(25, "Discharging")
+        for _ in range(args.events):
+            start = time.perf_counter()
+            monitor.handle_uevent(data)
+            latencies.append(time.perf_counter() - start)
+        monitor.stop()
+        monitor.kernel.close()
+
+        latencies.sort()
+        print("{:<26} {:>9} {:>9}".format("", "p50 us", "p95 us"))
+        print("{:<26} {:>9.1f} {:>9.1f}".format(
+            "uevent to state", statistics.median(latencies) * 1e6,
+            latencies[int(0.95 * (len(latencies) - 1))] * 1e6,
+        ))
+        checks = {
+            "low then critical": drained == [("Low Battery", True), ("Critical Battery", True)],
+            "full once": charged == [("Battery Charged", False)],
+            "warned again after charge": again == [("Low Battery", True)],
+            "other subsystems ignored": ignored,
+            "subscribers see changes": states[0].percent == 0.5 and states[-1].percent == 0.25,
+            "ac follows status": states[-2].ac_online is True and states[-1].ac_online is False,
+        }
+        for name, ok in checks.items():
+            print("{:<26} {}".format(name, "ok" if ok else "FAILED"))
+        return all(checks.values())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000)
+    if not asyncio.run(main(parser.parse_args())):
+        sys.exit(1)
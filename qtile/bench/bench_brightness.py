@@ -0,0 +1,140 @@
+"""Backlight writes against a fake sysfs directory.
+
+Builds a stand-in ``/sys/class/backlight/<device>`` in a temp dir and drives
+:class:`brightness.BrightnessController` on an event loop: bursts of key
+repeats, animated changes, and the ``brightnessctl`` fallback with a
+stand-in ``brightnessctl`` on PATH. It reports the writes each burst caused
+and checks coalescing, clamping to ``max_brightness`` and the lower limit,
+and that no ``brightnessctl`` is left unreaped.
+
+    python bench/bench_brightness.py [--presses 20]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import brightness  # noqa: E402
+
+MAX_BRIGHTNESS = 1000
+
+# Writes its argument the way brightnessctl would.
+BRIGHTNESSCTL = """#!/bin/sh
+printf '%s' "$3" > "{path}"
+"""
+
+
+def make_device(root, value=500):
+    path = os.path.join(root, "fake_backlight")
+    os.makedirs(path)
+    for name, content in (("max_brightness", MAX_BRIGHTNESS), ("brightness", value)):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(str(content))
+    return path
+
+
+def read(path):
+    with open(os.path.join(path, "brightness")) as f:
+        return int(f.read())
+
+
+async def settle(controller):
+    while controller._timer is not None:
+        await asyncio.sleep(controller.coalesce_delay)
+
+
+async def burst(controller, presses, percent):
+    before = controller.writes
+    for _ in range(presses):
+        controller.change(percent)
+        await asyncio.sleep(0)
+    await settle(controller)
+    # sysfs replaces the whole value on each write, while a regular file
+    # keeps the tail of a longer old value; write it out in full.
+    if controller.writable and controller.value is not None:
+        with open(os.path.join(controller.path, "brightness"), "w") as f:
+            f.write(str(controller.value))
+    return controller.writes - before
+
+
+def zombies():
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(pid)) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if fields[0] == "Z" and int(fields[1]) == os.getpid():
+            count += 1
+    return count
+
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="backlight-")
+    try:
+        path = make_device(root)
+        controller = brightness.BrightnessController(device="fake_backlight", root=root)
+        seen = []
+        controller.subscribe(lambda value, max_brightness: seen.append(value))
+
+        up = await burst(controller, args.presses, 5)
+        at_max = read(path)
+        down = await burst(controller, args.presses * 3, -5)
+        at_min = read(path)
+
+        animated = brightness.BrightnessController(
+            device="fake_backlight", root=root, frames=5, frame_interval=0.001
+        )
+        frames = await burst(animated, 1, 50)
+        animated.close()
+
+        bindir = os.path.join(root, "bin")
+        os.makedirs(bindir)
+        fake = os.path.join(bindir, "brightnessctl")
+        with open(fake, "w") as f:
+            f.write(BRIGHTNESSCTL.format(path=os.path.join(path, "brightness")))
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = bindir + os.pathsep + os.environ["PATH"]
+        fallback = brightness.BrightnessController(device="fake_backlight", root=root)
+        fallback.writable = False
+        spawned = 0
+        for _ in range(3):
+            spawned += await burst(fallback, args.presses, -10)
+        await asyncio.sleep(0.5)
+        left = zombies()
+        controller.close()
+
+        print("{:<28} {:>6}".format("", "writes"))
+        print("{:<28} {:>6}".format("{} presses up".format(args.presses), up))
+        print("{:<28} {:>6}".format("{} presses down".format(args.presses * 3), down))
+        print("{:<28} {:>6}".format("one animated change", frames))
+        print("{:<28} {:>6}".format("3 bursts via brightnessctl", spawned))
+        checks = {
+            "one write per burst": up == 1 and down == 1 and spawned == 3,
+            "clamped to max": at_max == MAX_BRIGHTNESS,
+            "clamped to min_percent": at_min == MAX_BRIGHTNESS * controller.min_percent // 100,
+            "subscribers told": seen == [at_max, at_min],
+            "animated in frames": frames == 5,
+            "brightnessctl reaped": left == 0,
+        }
+        for name, ok in checks.items():
+            print("{:<28} {}".format(name, "ok" if ok else "FAILED"))
+        return all(checks.values())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--presses", type=int, default=20)
+    if not asyncio.run(main(parser.parse_args())):
+        sys.exit(1)
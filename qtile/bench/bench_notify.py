@@ -0,0 +1,164 @@
+"""Notification latency against a private session bus.
+
+Starts a ``dbus-daemon`` of its own with a stand-in notification server on
+it, so no real daemon or desktop is needed. It then sends ``--count``
+notifications three ways and reports the latency of each:
+``notify-send`` (skipped when not installed), a fresh connection per
+message as qtile's ``send_notification`` does, and :class:`notify.Notifier`.
+It finishes by checking the Notifier's replace ids, dedupe, rate limit and
+urgent exemption against what the stand-in received.
+
+    python bench/bench_notify.py [--count 50]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dbus_next import Message, Variant  # noqa: E402
+from dbus_next.aio import MessageBus  # noqa: E402
+from dbus_next.service import ServiceInterface, method  # noqa: E402
+
+import notify  # noqa: E402
+
+
+class FakeNotifications(ServiceInterface):
+    """Just enough of org.freedesktop.Notifications."""
+
+    def __init__(self):
+        super().__init__(notify.NOTIFICATIONS)
+        self.received = []
+        self._next_id = 1
+
+    @method()
+    def Notify(  # noqa: N802
+        self,
+        app_name: "s",  # noqa: F821
+        replaces_id: "u",  # noqa: F821
+        app_icon: "s",  # noqa: F821
+        summary: "s",  # noqa: F821
+        body: "s",  # noqa: F821
+        actions: "as",  # noqa: F821
+        hints: "a{sv}",  # noqa: F821
+        expire_timeout: "i",  # noqa: F821
+    ) -> "u":  # noqa: F821
+        if replaces_id:
+            id_ = replaces_id
+        else:
+            id_ = self._next_id
+            self._next_id += 1
+        self.received.append((id_, summary, body))
+        return id_
+
+
+def _summary(name, latencies):
+    ordered = sorted(latencies)
+    print("{:<22} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+        name, statistics.median(ordered) * 1000, ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        ordered[-1] * 1000,
+    ))
+
+
+async def per_message_connection(address, count):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        bus = await MessageBus(bus_address=address).connect()
+        await bus.call(Message(
+            destination=notify.NOTIFICATIONS, path=notify.NOTIFICATIONS_PATH,
+            interface=notify.NOTIFICATIONS, member="Notify", signature="susssasa{sv}i",
+            body=["bench", 0, "", "fresh", str(i), [], {"urgency": Variant("y", 1)}, 1000],
+        ))
+        bus.disconnect()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def notifier(address, count):
+    client = notify.Notifier(bus_address=address, rate=count, per=60)
+    latencies = []
+    for i in range(count):
+        client.send("persistent", str(i), category="bench")
+        while client._task is not None and not client._task.done():
+            await asyncio.sleep(0)
+        latencies.append(client.latencies[-1])
+    client.close()
+    return latencies
+
+
+def notify_send(address, count):
+    env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        subprocess.run(["notify-send", "notify-send", str(i)], env=env, check=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def behaviour(address, server):
+    client = notify.Notifier(bus_address=address, dedupe_window=5, rate=3, per=60)
+    server.received.clear()
+    sent = [
+        client.send("Low Battery", "20%", category="battery", source="battery"),
+        client.send("Low Battery", "20%", category="battery", source="battery"),
+        client.send("Low Battery", "19%", category="battery", source="battery"),
+        client.send("Low Battery", "18%", category="battery", source="battery"),
+        client.send("Low Battery", "17%", category="battery", source="battery"),
+        client.send("Critical Battery", "5%", category="battery", source="battery", urgent=True),
+    ]
+    while client._task is not None and not client._task.done():
+        await asyncio.sleep(0.01)
+    client.close()
+    ids = {id_ for id_, _, _ in server.received}
+    checks = {
+        "duplicate merged": sent[1] is False and client.deduped == 1,
+        "rate limited after 3": sent[4] is False and client.limited == 1,
+        "urgent not limited": sent[5] is True and client.limited == 1,
+        "one replace id": len(server.received) == 4 and len(ids) == 1,
+    }
+    for name, ok in checks.items():
+        print("{:<22} {}".format(name, "ok" if ok else "FAILED"))
+    return all(checks.values())
+
+
+async def main(args):
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    address = daemon.stdout.readline().strip()
+    try:
+        server_bus = await MessageBus(bus_address=address).connect()
+        server = FakeNotifications()
+        server_bus.export(notify.NOTIFICATIONS_PATH, server)
+        await server_bus.request_name(notify.NOTIFICATIONS)
+
+        print("{:<22} {:>9} {:>9} {:>9}".format("", "p50 ms", "p95 ms", "max ms"))
+        if shutil.which("notify-send"):
+            _summary("notify-send", await asyncio.get_event_loop().run_in_executor(
+                None, notify_send, address, args.count
+            ))
+        _summary("connection per message", await per_message_connection(address, args.count))
+        _summary("Notifier", await notifier(address, args.count))
+        ok = await behaviour(address, server)
+        server_bus.disconnect()
+    finally:
+        daemon.terminate()
+        daemon.wait()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,162 @@
+"""Benchmark configure requests per layout operation: stock vs tiling.*.
+
+Lays out 2 to 50 fake windows in each layout of the config, replays focus
+moves and shuffles, and counts the ConfigureWindow requests (``place()``
+calls that reach the window) and border repaints each operation causes.
+Both variants must end with every window at the same geometry.
+
+    python bench/bench_relayout.py [--windows 2,5,10,20,50] [--ops 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libqtile import layout  # noqa: E402
+from libqtile.config import ScreenRect  # noqa: E402
+
+import tiling  # noqa: E402
+
+LAYOUTS = ("Columns", "Max", "Matrix", "MonadTall", "MonadWide", "Tile")
+CONFIG = dict(margin=4, border_focus="#1F1D2E", border_normal="#1F1D2E", border_width=0)
+OPERATIONS = ("next", "previous", "shuffle_up", "shuffle_down", "left", "right", "up", "down")
+
+
+class FakeWindow:
+    def __init__(self, group, wid):
+        self.group = group
+        self.wid = wid
+        self.name = "window {}".format(wid)
+        self.x = self.y = 0
+        self.width = self.height = 100
+        self.borderwidth = 0
+        self.bordercolor = None
+        self.floating = False
+        self.minimized = False
+        self.configures = 0
+        self.borders = 0
+
+    @property
+    def has_focus(self):
+        return self.group.current_window is self
+
+    def place(self, x, y, width, height, borderwidth, bordercolor, above=False, margin=None,
+              respect_hints=False):
+        if margin is not None:
+            if isinstance(margin, int):
+                margin = [margin] * 4
+            x += margin[3]
+            y += margin[0]
+            width -= margin[1] + margin[3]
+            height -= margin[0] + margin[2]
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.configures += 1
+        self.paint_borders(bordercolor, borderwidth)
+
+    def paint_borders(self, color, width):
+        self.borderwidth = width
+        self.bordercolor = color
+        self.borders += 1
+
+    def hide(self):
+        pass
+
+    def unhide(self):
+        pass
+
+    def info(self):
+        return dict(
+            name=self.name, id=self.wid, x=self.x, y=self.y, width=self.width, height=self.height
+        )
+
+    def get_size_hints(self):
+        return {}
+
+
+class FakeScreen:
+    x, y, width, height = 0, 32, 1920, 1048
+
+    def get_rect(self):
+        return ScreenRect(self.x, self.y, self.width, self.height)
+
+
+class FakeGroup:
+    def __init__(self, layout_class, count):
+        self.screen = FakeScreen()
+        self.screen_rect = self.screen.get_rect()
+        self.current_window = None
+        self.windows = []
+        self.layout = layout_class(**CONFIG).clone(self)
+        for i in range(count):
+            win = FakeWindow(self, i)
+            self.windows.append(win)
+            self.layout.add(win)
+            self.focus(win)
+
+    def focus(self, win, warp=True, force=False):
+        if win is None:
+            return
+        self.current_window = win
+        self.layout.focus(win)
+        self.layout_all()
+
+    def layout_all(self, warp=False):
+        self.layout.layout(self.windows, self.screen_rect)
+
+    def geometry(self):
+        return [(w.x, w.y, w.width, w.height) for w in self.windows]
+
+    def requests(self):
+        return sum(w.configures for w in self.windows), sum(w.borders for w in self.windows)
+
+
+def run(layout_class, count, operations):
+    group = FakeGroup(layout_class, count)
+    before = group.requests()
+    done = 0
+    for name in operations:
+        cmd = getattr(group.layout, "cmd_" + name, None)
+        if cmd is None:
+            continue
+        # The layout commands relayout the group themselves.
+        cmd()
+        done += 1
+    configures, borders = group.requests()
+    return group.geometry(), configures - before[0], borders - before[1], done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", default="2,5,10,20,50")
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    operations = [rng.choice(OPERATIONS) for _ in range(args.ops)]
+    mismatches = 0
+    if not tiling.geometry_supported():
+        print("qtile is not one of tiling.GEOMETRY_VERSIONS; tiling.* use the stock configure()")
+    print("{:<10} {:>7} {:>5} {:>14} {:>14} {:>16}".format(
+        "layout", "windows", "ops", "stock cfg/op", "tiling cfg/op", "tiling border/op"
+    ))
+    for name in LAYOUTS:
+        for count in (int(n) for n in args.windows.split(",")):
+            stock_geometry, stock, _, done = run(getattr(layout, name), count, operations)
+            ours_geometry, ours, borders, _ = run(getattr(tiling, name), count, operations)
+            if stock_geometry != ours_geometry:
+                mismatches += 1
+            done = max(done, 1)
+            print("{:<10} {:>7} {:>5} {:>14.2f} {:>14.2f} {:>16.2f}".format(
+                name, count, done, stock / done, ours / done, borders / done
+            ))
+    if mismatches:
+        print("MISMATCHES: {}".format(mismatches))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
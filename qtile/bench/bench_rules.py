@@ -0,0 +1,124 @@
+"""Benchmark float rule matching: linear Match.compare vs rules.RuleSet.
+
+Builds thousands of rules and replays a window-map storm (a browser opening
+many popups, plus a long tail of other windows), checks that both matchers
+agree on every window and prints the time per window.
+
+    python bench/bench_rules.py [--rules 2000] [--windows 1000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libqtile.config import Match  # noqa: E402
+from libqtile.layout import Floating  # noqa: E402
+
+import rules  # noqa: E402
+
+
+class FakeWindow:
+    def __init__(self, name, wm_class, role=None, wm_type="normal", pid=1, wid=1):
+        self.name = name
+        self.wm_class = wm_class
+        self.role = role
+        self.wm_type = wm_type
+        self.pid = pid
+        self.wid = wid
+
+    def get_wm_class(self):
+        return self.wm_class
+
+    def get_wm_role(self):
+        return self.role
+
+    def get_wm_type(self):
+        return self.wm_type
+
+    def get_pid(self):
+        return self.pid
+
+    def has_fixed_size(self):
+        return False
+
+    def has_fixed_ratio(self):
+        return False
+
+    def match(self, rule):
+        return rule.compare(self)
+
+
+def make_rules(count, rng):
+    out = list(Floating.default_float_rules)
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            out.append(Match(wm_class="app-{}".format(i)))
+        elif kind < 0.7:
+            out.append(Match(title="Dialog {}".format(i)))
+        elif kind < 0.8:
+            out.append(Match(role="role-{}".format(i)))
+        elif kind < 0.95:
+            out.append(Match(wm_class=re.compile(r"tool-{}-\d+".format(i))))
+        else:
+            out.append(Match(wm_class="app-{}".format(i), title="Setup {}".format(i)))
+    return out
+
+
+def make_storm(count, rng):
+    windows = []
+    for i in range(count):
+        if rng.random() < 0.7:
+            # popups from one browser: same class, few distinct titles
+            title = "Firefox popup {}".format(rng.randint(0, 20))
+            windows.append(FakeWindow(title, ["Navigator", "firefox"], role="Popup", wid=i))
+        else:
+            n = rng.randint(0, 10000)
+            windows.append(FakeWindow("Window {}".format(n), ["app-{}".format(n)] * 2, wid=i))
+    return windows
+
+
+def run(func, windows):
+    start = time.perf_counter()
+    result = [func(win) for win in windows]
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--windows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    float_rules = make_rules(args.rules, rng)
+    windows = make_storm(args.windows, rng)
+
+    start = time.perf_counter()
+    rule_set = rules.RuleSet(float_rules)
+    build = time.perf_counter() - start
+
+    linear, linear_time = run(lambda win: any(win.match(r) for r in float_rules), windows)
+    indexed, indexed_time = run(rule_set.matches, windows)
+
+    mismatches = sum(a != b for a, b in zip(linear, indexed))
+    per_window = 1e6 / len(windows)
+    print("rules: {}  windows: {}  floating: {}".format(len(float_rules), len(windows), sum(linear)))
+    print("build: {:.2f} ms".format(build * 1000))
+    print("linear: {:.2f} us/window".format(linear_time * per_window))
+    print("indexed: {:.2f} us/window".format(indexed_time * per_window))
+    print("speedup: {:.1f}x".format(linear_time / indexed_time))
+    print("stats: {}".format(rule_set.stats()))
+    if mismatches:
+        print("MISMATCHES: {}".format(mismatches))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
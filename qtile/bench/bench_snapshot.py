@@ -0,0 +1,241 @@
+"""Round-trip session snapshots over stand-in groups and windows.
+
+Arranges fake windows in qtile's own layouts (shuffles, resized columns, a
+changed ratio and master count, a non-default layout, a focused window),
+captures the snapshot to a temp file and restores it into a fresh session
+the way a reload (windows added in ``windows_map`` order) and a restart
+(windows adopted in stacking order) would, with one window gone. It checks
+that layouts, their sizes, window order and focus come back, and that a
+truncated, wrong-magic or garbage file is ignored rather than raising on
+the config import and startup path. It reports the cost of a capture and a
+restore.
+
+    python bench/bench_snapshot.py [--windows 6] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libqtile import layout  # noqa: E402
+
+import snapshot  # noqa: E402
+from bench_relayout import CONFIG, FakeScreen, FakeWindow  # noqa: E402
+
+# Group name -> layouts, first one is the default.
+GROUPS = {
+    "1": (layout.Columns, layout.MonadTall, layout.Max),
+    "2": (layout.MonadTall, layout.Tile, layout.Max),
+}
+# Closed between the capture and the restore.
+MISSING = 1001
+
+
+class FakeGroup:
+    def __init__(self, name, layout_classes):
+        self.name = name
+        self.screen = FakeScreen()
+        self.screen_rect = self.screen.get_rect()
+        self.current_window = None
+        self.windows = []
+        self.layouts = [cls(**CONFIG).clone(self) for cls in layout_classes]
+        self.current_layout = 0
+
+    @property
+    def layout(self):
+        return self.layouts[self.current_layout]
+
+    @layout.setter
+    def layout(self, name):
+        for index, obj in enumerate(self.layouts):
+            if obj.name == name:
+                self.current_layout = index
+                self.layout_all()
+
+    def add(self, win):
+        win.group = self
+        self.windows.append(win)
+        for obj in self.layouts:
+            obj.add(win)
+        self.focus(win)
+
+    def focus(self, win, warp=True, force=False):
+        if win is None:
+            return
+        self.current_window = win
+        self.layout.focus(win)
+        self.layout_all()
+
+    def layout_all(self, warp=False):
+        if self.windows:
+            self.layout.layout(self.windows, self.screen_rect)
+
+
+class FakeQtile:
+    def __init__(self, groups=True):
+        self.groups = [FakeGroup(name, classes) for name, classes in GROUPS.items()] if groups else []
+        self.groups_map = {group.name: group for group in self.groups}
+        self.current_group = self.groups[0] if self.groups else None
+        self.windows_map = {}
+
+
+def arrange(windows):
+    """The session that is saved: every group touched by hand."""
+    qtile = FakeQtile()
+    one, two = qtile.groups
+    for wid in range(1, windows + 1):
+        win = FakeWindow(one, wid)
+        qtile.windows_map[wid] = win
+        one.add(win)
+    for wid in range(1000, 1000 + windows):
+        win = FakeWindow(two, wid)
+        qtile.windows_map[wid] = win
+        two.add(win)
+
+    one.layout.cmd_shuffle_right()
+    one.layout.cmd_shuffle_right()
+    one.focus(qtile.windows_map[2])
+    one.layout.cmd_shuffle_up()
+    one.layout.cmd_grow_right()
+    one.layout.cmd_grow_down()
+
+    two.layout = "tile"
+    two.focus(qtile.windows_map[1003])
+    two.layout.cmd_shuffle_up()
+    two.layout.cmd_increase_ratio()
+    two.layout.cmd_increase_nmaster()
+    two.focus(qtile.windows_map[1002])
+    return qtile
+
+
+async def reopen(saved, path, restart):
+    """A new session holding the same windows, less MISSING."""
+    qtile = FakeQtile()
+    # As the X server lists them: not in the order they were first managed.
+    wids = sorted((wid for wid in saved.windows_map if wid != MISSING), reverse=True)
+    for wid in wids:
+        qtile.windows_map[wid] = FakeWindow(None, wid)
+    home = {win.wid: win.group.name for win in saved.windows_map.values()}
+
+    session = snapshot.Snapshot(path=path, delay=0)
+    session.restore(qtile)
+    # Then qtile hands the windows to their groups, before the loop runs.
+    adopted = wids if restart else list(qtile.windows_map)
+    for wid in adopted:
+        qtile.groups_map[home[wid]].add(qtile.windows_map[wid])
+    await asyncio.sleep(0)
+    return qtile, session
+
+
+def state(qtile):
+    return {group.name: snapshot.GroupState.of(group) for group in qtile.groups}
+
+
+def same(before, after, missing=()):
+    """Layout, focus, window order and sizes, ignoring what can't come back."""
+    ok = True
+    for name, saved in before.items():
+        restored = after[name]
+        windows = [wid for wid in saved.windows if wid not in missing]
+        ok &= restored.layout == saved.layout
+        ok &= restored.focused == saved.focused
+        ok &= restored.windows == windows
+        for layout_name, params in saved.params.items():
+            if missing and name == "2" and layout_name == "monadtall":
+                # relative_sizes are per window, so they are dropped when
+                # one is gone.
+                continue
+            ok &= restored.params.get(layout_name) == params
+    return bool(ok)
+
+
+async def corrupt(path, data):
+    """Run the config's snapshot lines over ``data``; True if nothing broke."""
+    with open(path, "wb") as f:
+        f.write(data)
+    # On a restart the config is imported before any group exists.
+    importing = FakeQtile(groups=False)
+    session = snapshot.Snapshot(path=path, delay=0)
+    session.capture(importing)
+    if session.read():
+        return False
+    qtile = FakeQtile()
+    win = FakeWindow(None, 7)
+    qtile.windows_map[7] = win
+    session.restore(qtile)
+    qtile.groups[0].add(win)
+    await asyncio.sleep(0)
+    return session.restored == 0 and qtile.groups[0].layout.name == "columns"
+
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="snapshot-")
+    try:
+        path = os.path.join(root, "session.bin")
+        saved = arrange(args.windows)
+        before = state(saved)
+        session = snapshot.Snapshot(path=path, delay=0)
+        session.capture(saved)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        reloaded, reload_session = await reopen(saved, path, restart=False)
+        restarted, restart_session = await reopen(saved, path, restart=True)
+        missing_ok = all(
+            MISSING not in [win.wid for win in group.windows]
+            for group in restarted.groups
+        )
+
+        broken = {
+            "empty": b"",
+            "wrong magic": b"QSN0" + data[4:],
+            "garbage": os.urandom(len(data)),
+            "more groups than written": data[:4] + b"\xff\xff" + data[6:],
+        }
+        survived = {name: await corrupt(path, blob) for name, blob in broken.items()}
+        truncations = [await corrupt(path, data[:n]) for n in range(len(data))]
+
+        captures = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            session.capture(saved)
+            captures.append(time.perf_counter() - start)
+        restores = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            await reopen(saved, path, restart=True)
+            restores.append(time.perf_counter() - start)
+
+        print("{:<34} {:>9}".format("", "p50 us"))
+        print("{:<34} {:>9.1f}".format("capture, 2 groups", statistics.median(captures) * 1e6))
+        print("{:<34} {:>9.1f}".format("restore incl. re-adding windows", statistics.median(restores) * 1e6))
+        print("{:<34} {:>9}".format("snapshot bytes", len(data)))
+        checks = {
+            "round trip after reload": same(before, state(reloaded), {MISSING})
+            and reload_session.restored == 2,
+            "round trip after restart": same(before, state(restarted), {MISSING})
+            and restart_session.restored == 2,
+            "missing window skipped": missing_ok,
+            "truncated files ignored": all(truncations),
+        }
+        checks.update(("{} ignored".format(name), ok) for name, ok in survived.items())
+        for name, ok in checks.items():
+            print("{:<34} {}".format(name, "ok" if ok else "FAILED"))
+        return all(checks.values())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=200)
+    if not asyncio.run(main(parser.parse_args())):
+        sys.exit(1)
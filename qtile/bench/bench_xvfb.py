@@ -0,0 +1,409 @@
+"""Window manager benchmark under a virtual X server.
+
+Starts Xvfb and qtile with this config, with tracing enabled, then drives
+scripted scenarios. Key presses go through XTEST, so they take the same
+path as real ones, and each step waits until qtile reports the expected
+state:
+
+* ``map_windows``: map ``--windows`` bare X windows, then destroy them
+* ``cycle_layouts``: ``mod+Tab`` through every layout with a few windows open
+* ``switch_groups``: ``mod+1`` to ``mod+8``
+* ``scratchpads``: show and hide every DropDown with its ``ctrl+N`` binding
+* ``bar_updates``: leave the bar updating on its own for ``--idle`` seconds
+
+For each scenario the report gives the step latencies, the CPU time qtile
+used and its RSS afterwards. For the scenarios driven by keys it also gives
+qtile's own key dispatch times, taken from the tracing histograms.
+``--write``/``--check`` store and compare a baseline, as with
+``profile_config.py``. qtile runs with HOME and the XDG directories in a
+temp dir and without the autostart services. Needs Xvfb and qtile
+installed.
+
+    python bench/bench_xvfb.py [--windows 200] [--rounds 5] [--idle 10]
+    python bench/bench_xvfb.py --check bench/xvfb_baseline.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import xcffib
+import xcffib.xproto
+import xcffib.xtest
+from libqtile import ipc
+from libqtile.command.client import InteractiveCommandClient
+from libqtile.command.interface import IPCCommandInterface
+
+CONFIG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How much worse than the baseline a number may get before --check fails,
+# and absolute allowances for those that are close to nothing.
+SLOWDOWN_FACTOR = 2.0
+SLOWDOWN_SLACK_MS = 5.0
+RSS_SLACK_KB = 20 * 1024
+
+# XTEST event types.
+KEY_PRESS = 2
+KEY_RELEASE = 3
+
+# Keysyms used by the scenarios.
+SUPER_L = 0xFFEB
+CONTROL_L = 0xFFE3
+TAB = 0xFF09
+
+TIMEOUT = 10.0
+WORKING_SET = 6
+
+
+class Session:
+    """Xvfb, qtile on top of it, and the connections driving them."""
+
+    def __init__(self, config, display=":99", size="1920x1080"):
+        self.display = display
+        self.tmp = tempfile.mkdtemp(prefix="qtile-bench-")
+        self.socket = os.path.join(self.tmp, "qtile.sock")
+        self.xvfb = subprocess.Popen(
+            ["Xvfb", display, "-screen", "0", size + "x24", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.conn = _wait(lambda: _connect(display), "Xvfb on " + display)
+        # qtile writes its caches, generated theme files and logs under HOME
+        # and the XDG directories; keep all of that inside the temp dir, and
+        # start none of the session's autostart services.
+        home = os.path.join(self.tmp, "home")
+        runtime = os.path.join(self.tmp, "runtime")
+        for path in (os.path.join(home, ".config"), runtime):
+            os.makedirs(path, mode=0o700)
+        # The bar loads its images from ~/.config/qtile/assets.
+        os.symlink(CONFIG_DIR, os.path.join(home, ".config", "qtile"))
+        env = dict(
+            os.environ,
+            DISPLAY=display,
+            HOME=home,
+            XDG_CONFIG_HOME=os.path.join(home, ".config"),
+            XDG_CACHE_HOME=os.path.join(home, ".cache"),
+            XDG_DATA_HOME=os.path.join(home, ".local", "share"),
+            XDG_RUNTIME_DIR=runtime,
+            QTILE_TRACE="1",
+            QTILE_NO_SERVICES="1",
+        )
+        self.qtile = subprocess.Popen(
+            ["qtile", "start", "-c", config, "-s", self.socket],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.client = _wait(self._client, "qtile IPC socket")
+        self.root = self.conn.get_setup().roots[0].root
+        self.xtest = self.conn(xcffib.xtest.key)
+        self.keycodes = self._keycodes()
+
+    def _client(self):
+        if not os.path.exists(self.socket):
+            return None
+        client = InteractiveCommandClient(IPCCommandInterface(ipc.Client(self.socket)))
+        client.status()
+        return client
+
+    def _keycodes(self):
+        setup = self.conn.get_setup()
+        first, last = setup.min_keycode, setup.max_keycode
+        reply = self.conn.core.GetKeyboardMapping(first, last - first + 1).reply()
+        per = reply.keysyms_per_keycode
+        codes = {}
+        for i in range(last - first + 1):
+            for keysym in reply.keysyms[i * per:(i + 1) * per]:
+                codes.setdefault(keysym, first + i)
+        return codes
+
+    def press(self, modifiers, keysym):
+        codes = [self.keycodes[k] for k in modifiers] + [self.keycodes[keysym]]
+        for code in codes:
+            self.xtest.FakeInput(KEY_PRESS, code, 0, self.root, 0, 0, 0)
+        for code in reversed(codes):
+            self.xtest.FakeInput(KEY_RELEASE, code, 0, self.root, 0, 0, 0)
+        self.conn.flush()
+
+    def create_windows(self, count):
+        screen = self.conn.get_setup().roots[0]
+        wids = []
+        for i in range(count):
+            wid = self.conn.generate_id()
+            self.conn.core.CreateWindow(
+                screen.root_depth, wid, screen.root, 0, 0, 200, 100, 0,
+                xcffib.xproto.WindowClass.InputOutput, screen.root_visual, 0, [],
+            )
+            name = "bench {}".format(i).encode()
+            self.conn.core.ChangeProperty(
+                xcffib.xproto.PropMode.Replace, wid, xcffib.xproto.Atom.WM_NAME,
+                xcffib.xproto.Atom.STRING, 8, len(name), name,
+            )
+            self.conn.core.MapWindow(wid)
+            wids.append(wid)
+        self.conn.flush()
+        return wids
+
+    def destroy_windows(self, wids):
+        for wid in wids:
+            self.conn.core.DestroyWindow(wid)
+        self.conn.flush()
+
+    def usage(self):
+        """qtile's CPU time in ms and RSS in KiB."""
+        with open("/proc/{}/stat".format(self.qtile.pid)) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu_ms = (int(fields[11]) + int(fields[12])) * 1000 / ticks
+        with open("/proc/{}/status".format(self.qtile.pid)) as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return cpu_ms, rss
+
+    def close(self):
+        try:
+            self.client.shutdown()
+        except Exception:
+            pass
+        try:
+            self.qtile.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.qtile.kill()
+        self.conn.disconnect()
+        self.xvfb.terminate()
+        self.xvfb.wait()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def _connect(display):
+    try:
+        return xcffib.connect(display=display)
+    except xcffib.ConnectionException:
+        return None
+
+
+def _wait(probe, what, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = probe()
+        except Exception:
+            result = None
+        if result:
+            return result
+        time.sleep(0.005)
+    raise TimeoutError("timed out waiting for " + what)
+
+
+def _timed(session, action, done):
+    """Run ``action`` and return how long until ``done()`` held, in ms."""
+    start = time.perf_counter()
+    action()
+    _wait(done, "scenario step")
+    return (time.perf_counter() - start) * 1000
+
+
+def map_windows(session, args):
+    before = len(session.client.windows())
+    latencies = []
+    wids = []
+    start = time.perf_counter()
+    for _ in range(args.windows):
+        latencies.append(_timed(
+            session, lambda: wids.extend(session.create_windows(1)),
+            lambda: len(session.client.windows()) >= before + len(wids),
+        ))
+    mapped = (time.perf_counter() - start) * 1000
+    destroyed = _timed(
+        session, lambda: session.destroy_windows(wids),
+        lambda: len(session.client.windows()) <= before,
+    )
+    return latencies, {"map_total_ms": round(mapped, 1), "destroy_ms": round(destroyed, 1)}
+
+
+def cycle_layouts(session, args):
+    latencies = []
+    count = len(session.client.group.info()["layouts"])
+    for _ in range(args.rounds * count):
+        current = session.client.group.info()["layout"]
+        latencies.append(_timed(
+            session, lambda: session.press([SUPER_L], TAB),
+            lambda: session.client.group.info()["layout"] != current,
+        ))
+    return latencies, {"layouts": count}
+
+
+def switch_groups(session, args):
+    latencies = []
+    for _ in range(args.rounds):
+        for name in "12345678":
+            if session.client.group.info()["name"] == name:
+                continue
+            latencies.append(_timed(
+                session, lambda: session.press([SUPER_L], ord(name)),
+                lambda: session.client.group.info()["name"] == name,
+            ))
+    return latencies, {}
+
+
+def scratchpads(session, args):
+    latencies = []
+    skipped = []
+    names = session.client.group["scratchpad"].dropdown_info()["dropdowns"]
+    for i, name in enumerate(names, 1):
+
+        def visible():
+            return session.client.group["scratchpad"].dropdown_info(name).get("visible", False)
+
+        try:
+            for _ in range(args.rounds):
+                for want in (True, False):
+                    latencies.append(_timed(
+                        session, lambda: session.press([CONTROL_L], ord(str(i))),
+                        lambda: visible() == want,
+                    ))
+        except TimeoutError:
+            # The DropDown's program is not installed here.
+            skipped.append(name)
+    return latencies, {"skipped": skipped}
+
+
+def bar_updates(session, args):
+    before = session.client.trace_stats()
+    time.sleep(args.idle)
+    after = session.client.trace_stats()
+    draws = sum(
+        after[label]["count"] - before.get(label, {}).get("count", 0)
+        for label in after
+        if label.startswith("draw:")
+    )
+    return [], {"draws_per_s": round(draws / args.idle, 1)}
+
+
+SCENARIOS = {
+    "map_windows": map_windows,
+    "cycle_layouts": cycle_layouts,
+    "switch_groups": switch_groups,
+    "scratchpads": scratchpads,
+    "bar_updates": bar_updates,
+}
+
+
+def _summary(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    return {
+        "steps": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def run(args):
+    session = Session(os.path.abspath(args.config), display=args.display)
+    result = {}
+    try:
+        # Keep a few windows open so layouts and group switches have work.
+        session.client.group["1"].toscreen()
+        working = session.create_windows(WORKING_SET)
+        _wait(lambda: len(session.client.windows()) >= WORKING_SET, "working set")
+        for name in args.scenarios.split(","):
+            session.client.trace_reset()
+            cpu_before, _ = session.usage()
+            start = time.perf_counter()
+            latencies, extra = SCENARIOS[name](session, args)
+            wall = time.perf_counter() - start
+            cpu_after, rss = session.usage()
+            keys = {
+                label: stats["p50_us"]
+                for label, stats in session.client.trace_stats().items()
+                if label.startswith("key:")
+            }
+            result[name] = dict(
+                _summary(latencies),
+                cpu_ms=round(cpu_after - cpu_before, 1),
+                cpu_percent=round((cpu_after - cpu_before) / wall / 10, 1),
+                rss_kb=rss,
+                **extra,
+                **({"key_dispatch_p50_us": keys} if keys else {}),
+            )
+        session.destroy_windows(working)
+    finally:
+        session.close()
+    return result
+
+
+def report(result):
+    print("{:<14} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "scenario", "steps", "p50 ms", "p95 ms", "max ms", "cpu ms", "rss MiB"
+    ))
+    for name, stats in result.items():
+        print("{:<14} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9.1f}".format(
+            name, stats.get("steps", "-"), stats.get("p50_ms", "-"), stats.get("p95_ms", "-"),
+            stats.get("max_ms", "-"), stats["cpu_ms"], stats["rss_kb"] / 1024,
+        ))
+        for key in ("map_total_ms", "destroy_ms", "draws_per_s", "skipped"):
+            if stats.get(key):
+                print("    {}: {}".format(key, stats[key]))
+
+
+def check(result, baseline):
+    failures = []
+    for name, base in baseline.items():
+        now = result.get(name)
+        if now is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "cpu_ms"):
+            if key not in base or key not in now:
+                continue
+            limit = max(base[key] * SLOWDOWN_FACTOR, base[key] + SLOWDOWN_SLACK_MS)
+            if now[key] > limit:
+                failures.append("{} {}: {} vs baseline {}".format(name, key, now[key], base[key]))
+        if now["rss_kb"] > base["rss_kb"] + RSS_SLACK_KB:
+            failures.append("{} rss: {} KiB vs baseline {} KiB".format(
+                name, now["rss_kb"], base["rss_kb"]
+            ))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", nargs="?", default=os.path.join(CONFIG_DIR, "config.py"))
+    parser.add_argument("--display", default=":99")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--windows", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--idle", type=float, default=10.0, help="seconds of bar_updates")
+    parser.add_argument("--json", action="store_true", help="print the raw results")
+    parser.add_argument("--check", metavar="BASELINE", help="fail on regressions")
+    parser.add_argument("--write", metavar="BASELINE", help="store this run as baseline")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+    if args.write:
+        with open(args.write, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.check:
+        with open(args.check) as f:
+            failures = check(result, json.load(f))
+        for failure in failures:
+            print("REGRESSION: " + failure)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
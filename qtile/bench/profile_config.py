@@ -0,0 +1,471 @@
+"""Headless config load profiler.
+
+Imports config.py against stub ``libqtile`` objects, so it runs without X,
+Wayland or qtile installed, and reports time and memory allocated for each
+part of the config (imports, keys, groups, layouts, widgets...). Every
+top-level statement is executed on its own and assigned to the section whose
+objects it built. Filesystem, process and socket calls made while the config
+loads are recorded, and those made while constructing a widget are flagged:
+they belong in the widget's timer or ``_configure``, not in ``__init__``.
+
+The first run is a cold import; the following ones reload the config-dir
+modules the way ``reload_config`` does. With ``--check BASELINE`` the run
+fails when a section got much slower than the stored profile or a widget
+started doing I/O at construction; ``--write BASELINE`` stores a new one.
+
+    python bench/profile_config.py [--runs 5] [--json]
+    python bench/profile_config.py --check bench/config_profile.json
+"""
+
+import argparse
+import ast
+import builtins
+import importlib
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+CONFIG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How much slower than the baseline a section may get before --check fails,
+# and an absolute allowance for sections that take next to nothing.
+SLOWDOWN_FACTOR = 3.0
+SLOWDOWN_SLACK_MS = 20.0
+
+# Already imported by qtile itself before it reads the config, so they are not
+# charged to the config's imports.
+PRELOADED = ("asyncio", "logging", "re", "shlex", "signal", "subprocess", "threading")
+
+
+class Recorder:
+    def __init__(self):
+        self.objects = {}
+        self.stack = []
+        self.io = []
+        self.hooks = 0
+
+    def built(self, category):
+        self.objects[category] = self.objects.get(category, 0) + 1
+
+
+recorder = Recorder()
+
+
+class Stub:
+    """Stand-in for any libqtile config object."""
+
+    category = "other"
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        init = cls.__dict__.get("__init__")
+        if init is not None:
+            cls.__init__ = _tracked(init)
+
+
+def _tracked(init):
+    def __init__(self, *args, **kwargs):
+        outermost = not recorder.stack
+        recorder.stack.append(type(self).__name__)
+        try:
+            init(self, *args, **kwargs)
+        finally:
+            recorder.stack.pop()
+        if outermost:
+            recorder.built(type(self).category)
+
+    return __init__
+
+
+class Configurable(Stub):
+    # Names of the positional arguments, for the stubs the config reads back.
+    positional = ()
+
+    def __init__(self, *args, **config):
+        Stub.__init__(self, *args, **config)
+        self._user_config = config
+        for name, value in zip(self.positional, args):
+            setattr(self, name, value)
+        for name, value in config.items():
+            setattr(self, name, value)
+
+    def add_defaults(self, defaults):
+        for name, value, _ in defaults:
+            if name not in self._user_config and not hasattr(self, name):
+                setattr(self, name, value)
+
+    def add_callbacks(self, defaults):
+        pass
+
+
+class Lazy:
+    """Absorbs ``lazy.layout.left()`` style chains."""
+
+    def __getattr__(self, name):
+        return self
+
+    def __getitem__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+class Subscribe:
+    def __getattr__(self, name):
+        def register(func):
+            recorder.hooks += 1
+            return func
+
+        return register
+
+
+def _stub_class(name, category, base=Configurable, positional=()):
+    return type(
+        name,
+        (base,),
+        {"category": category, "positional": positional, "__init__": base.__init__},
+    )
+
+
+def _lazy_module(name, category, base=Configurable):
+    module = types.ModuleType(name)
+    classes = {}
+
+    def __getattr__(attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr not in classes:
+            classes[attr] = _stub_class(attr, category, base)
+        return classes[attr]
+
+    module.__getattr__ = __getattr__
+    return module
+
+
+def install_stubs():
+    """Put a fake ``libqtile`` package into sys.modules."""
+    libqtile = types.ModuleType("libqtile")
+    libqtile.__path__ = []
+    libqtile.qtile = Stub()
+    # qtile has no groups yet when it first imports the config.
+    libqtile.qtile.groups = []
+
+    bar = types.ModuleType("libqtile.bar")
+    bar.STRETCH, bar.CALCULATED, bar.STATIC = "STRETCH", "CALCULATED", "STATIC"
+    bar.Bar = _stub_class("Bar", "widgets", positional=("widgets", "size"))
+    bar.Gap = _stub_class("Gap", "widgets")
+
+    config = types.ModuleType("libqtile.config")
+    for name, category, positional in (
+        ("Key", "keys", ("modifiers", "key")),
+        ("KeyChord", "keys", ("modifiers", "key", "submappings")),
+        ("Group", "groups", ("name",)),
+        ("ScratchPad", "groups", ("name", "dropdowns")),
+        ("DropDown", "groups", ("name", "cmd")),
+        ("Match", "rules", ()),
+        ("Screen", "widgets", ()),
+        ("Click", "mouse", ("modifiers", "button")),
+        ("Drag", "mouse", ("modifiers", "button")),
+    ):
+        setattr(config, name, _stub_class(name, category, positional=positional))
+
+    widget_base = types.ModuleType("libqtile.widget.base")
+    widget_base._Widget = _stub_class("_Widget", "widgets")
+    widget_base._TextBox = _stub_class("_TextBox", "widgets", widget_base._Widget)
+    widget_base.InLoopPollText = _stub_class("InLoopPollText", "widgets", widget_base._TextBox)
+    widget_base.ThreadPoolText = _stub_class("ThreadPoolText", "widgets", widget_base._TextBox)
+    widget = _lazy_module("libqtile.widget", "widgets", widget_base._Widget)
+    widget.base = widget_base
+    widget.__path__ = []
+
+    layout = _lazy_module("libqtile.layout", "layouts")
+    floating = _stub_class("Floating", "layouts")
+    floating.default_float_rules = [config.Match(wm_type="dialog") for _ in range(15)]
+    layout.Floating = floating
+
+    hook = types.ModuleType("libqtile.hook")
+    hook.subscribe = Subscribe()
+    hook.unsubscribe = Subscribe()
+
+    lazy = types.ModuleType("libqtile.lazy")
+    lazy.lazy = Lazy()
+    command = types.ModuleType("libqtile.command")
+    command.lazy = lazy.lazy
+
+    modules = {
+        "libqtile": libqtile,
+        "libqtile.bar": bar,
+        "libqtile.config": config,
+        "libqtile.widget": widget,
+        "libqtile.widget.base": widget_base,
+        "libqtile.layout": layout,
+        "libqtile.hook": hook,
+        "libqtile.lazy": lazy,
+        "libqtile.command": command,
+    }
+    for name, module in modules.items():
+        sys.modules[name] = module
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(modules[parent], child, module)
+
+
+def _watch_io():
+    """Wrap I/O entry points so calls made while loading are recorded."""
+    patched = []
+
+    def record(kind, args, kwargs):
+        target = args[0] if args else kwargs.get("args", "")
+        recorder.io.append((kind, str(target), list(recorder.stack), _statement))
+
+    def wrap(owner, name, kind):
+        original = getattr(owner, name)
+        if isinstance(original, type):
+            # Classes are wrapped by a subclass so modules imported by the
+            # config can still inherit from them.
+            def __init__(self, *args, **kwargs):
+                record(kind, args, kwargs)
+                original.__init__(self, *args, **kwargs)
+
+            wrapper = type(original.__name__, (original,), {"__init__": __init__})
+        else:
+            def wrapper(*args, **kwargs):
+                record(kind, args, kwargs)
+                return original(*args, **kwargs)
+
+        setattr(owner, name, wrapper)
+        patched.append((owner, name, original))
+
+    wrap(builtins, "open", "open")
+    wrap(os, "open", "open")
+    wrap(os, "listdir", "listdir")
+    wrap(os, "scandir", "scandir")
+    wrap(os, "stat", "stat")
+    wrap(subprocess, "Popen", "spawn")
+    wrap(socket, "socket", "socket")
+    return patched
+
+
+def _unwatch_io(patched):
+    for owner, name, original in reversed(patched):
+        setattr(owner, name, original)
+
+
+_statement = None
+
+# A statement that builds objects of several kinds (a layout with its Match
+# rules, a Screen with its bar) counts towards the first of these it built.
+SECTIONS = ("widgets", "layouts", "groups", "keys", "mouse", "rules")
+
+
+def _section(node, objects):
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return "imports"
+    for name in SECTIONS:
+        if objects.get(name):
+            return name
+    return "other"
+
+
+def _config_modules():
+    """Modules imported from the config directory, as reload_config sees them."""
+    found = []
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if os.path.dirname(os.path.abspath(path)) == CONFIG_DIR and name != "config":
+            found.append(module)
+    return found
+
+
+def _measure(func):
+    recorder.objects = {}
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    after, peak = tracemalloc.get_traced_memory()
+    return {
+        "time_ms": elapsed * 1000,
+        "alloc_kb": max(after - before, 0) / 1024,
+        "peak_kb": max(peak - before, 0) / 1024,
+        "objects": sum(recorder.objects.values()),
+    }
+
+
+def _add(sections, name, sample):
+    section = sections.setdefault(
+        name, {"time_ms": 0.0, "alloc_kb": 0.0, "peak_kb": 0.0, "objects": 0}
+    )
+    section["time_ms"] += sample["time_ms"]
+    section["alloc_kb"] += sample["alloc_kb"]
+    section["peak_kb"] = max(section["peak_kb"], sample["peak_kb"])
+    section["objects"] += sample["objects"]
+
+
+def load_once(path, reload):
+    """Execute config.py statement by statement and profile each.
+
+    Returns the per-section totals, each statement's sample and the I/O
+    calls seen.
+    """
+    global _statement
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source, path)
+    namespace = {"__name__": "config", "__file__": path}
+    sections = {}
+    statements = []
+
+    recorder.io.clear()
+    patched = _watch_io()
+    tracemalloc.start()
+    try:
+        if reload:
+            # The config-dir modules are reloaded before config.py runs
+            # again; their import statements below then hit sys.modules.
+            for module in _config_modules():
+                _statement = module.__name__
+                sample = _measure(lambda: importlib.reload(module))
+                _add(sections, "imports", sample)
+                statements.append(dict(sample, line=module.__name__, section="imports"))
+        for node in tree.body:
+            _statement = node.lineno
+            code = compile(ast.Module(body=[node], type_ignores=[]), path, "exec")
+            sample = _measure(lambda: exec(code, namespace))
+            name = _section(node, recorder.objects)
+            _add(sections, name, sample)
+            statements.append(dict(sample, line=node.lineno, section=name))
+    finally:
+        tracemalloc.stop()
+        _unwatch_io(patched)
+        _statement = None
+
+    io = [
+        {"kind": kind, "target": target, "widget": stack[0] if stack else None, "line": line}
+        for kind, target, stack, line in recorder.io
+    ]
+    return sections, statements, io
+
+
+def profile(path, runs):
+    sys.dont_write_bytecode = True
+    if CONFIG_DIR not in sys.path:
+        sys.path.insert(0, CONFIG_DIR)
+    install_stubs()
+    for name in PRELOADED:
+        importlib.import_module(name)
+
+    cold, statements, io = load_once(path, reload=False)
+    reloads = [load_once(path, reload=True) for _ in range(max(runs - 1, 0))]
+
+    result = {
+        "cold": cold,
+        "reload": {},
+        "slowest": sorted(statements, key=lambda s: -s["time_ms"])[:10],
+        "io": [],
+        "hooks": recorder.hooks,
+    }
+    for call in io + [call for _, _, reload_io in reloads for call in reload_io]:
+        if call not in result["io"]:
+            result["io"].append(call)
+    for name in cold:
+        samples = [run[name] for run, _, _ in reloads if name in run]
+        if samples:
+            result["reload"][name] = dict(
+                samples[-1], time_ms=statistics.median(s["time_ms"] for s in samples)
+            )
+    return result
+
+
+def report(result):
+    print("{:<10} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        "section", "cold ms", "reload ms", "alloc KiB", "peak KiB", "objects"
+    ))
+    total_cold = total_reload = 0.0
+    for name, cold in sorted(result["cold"].items(), key=lambda kv: -kv[1]["time_ms"]):
+        reload_ms = result["reload"].get(name, {}).get("time_ms", float("nan"))
+        total_cold += cold["time_ms"]
+        total_reload += reload_ms if reload_ms == reload_ms else 0
+        print("{:<10} {:>10.2f} {:>10.2f} {:>10.1f} {:>10.1f} {:>8}".format(
+            name, cold["time_ms"], reload_ms, cold["alloc_kb"], cold["peak_kb"], cold["objects"]
+        ))
+    print("{:<10} {:>10.2f} {:>10.2f}".format("total", total_cold, total_reload))
+
+    print("\nSlowest statements (cold):")
+    for sample in result["slowest"]:
+        print("  {line!s:<10} {section:<8} {time_ms:8.2f} ms {alloc_kb:9.1f} KiB".format(**sample))
+
+    widget_io = [call for call in result["io"] if call["widget"]]
+    other_io = [call for call in result["io"] if not call["widget"]]
+    if widget_io:
+        print("\nI/O at widget construction:")
+        for call in widget_io:
+            print("  {widget}: {kind} {target} (line {line})".format(**call))
+    if other_io:
+        print("\nOther I/O while loading:")
+        for call in other_io:
+            print("  {kind} {target} (line {line})".format(**call))
+
+
+def check(result, baseline):
+    failures = []
+    for name, base in baseline["reload"].items():
+        now = result["reload"].get(name)
+        if now is None:
+            continue
+        limit = max(base["time_ms"] * SLOWDOWN_FACTOR, base["time_ms"] + SLOWDOWN_SLACK_MS)
+        if now["time_ms"] > limit:
+            failures.append(
+                "{}: {:.2f} ms on reload, baseline {:.2f} ms".format(
+                    name, now["time_ms"], base["time_ms"]
+                )
+            )
+    known = {(c["widget"], c["kind"], c["target"]) for c in baseline["io"] if c["widget"]}
+    for call in result["io"]:
+        if call["widget"] and (call["widget"], call["kind"], call["target"]) not in known:
+            failures.append("{widget} does {kind} {target} at construction".format(**call))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", nargs="?", default=os.path.join(CONFIG_DIR, "config.py"))
+    parser.add_argument("--runs", type=int, default=5, help="1 cold load + N-1 reloads")
+    parser.add_argument("--json", action="store_true", help="print the raw profile")
+    parser.add_argument("--check", metavar="BASELINE", help="fail on regressions")
+    parser.add_argument("--write", metavar="BASELINE", help="store this run as baseline")
+    args = parser.parse_args()
+
+    result = profile(os.path.abspath(args.config), args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+    if args.write:
+        with open(args.write, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.check:
+        with open(args.check) as f:
+            failures = check(result, json.load(f))
+        for failure in failures:
+            print("REGRESSION: " + failure)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
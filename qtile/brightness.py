@@ -0,0 +1,176 @@
+"""Backlight control by writing sysfs directly.
+
+Presses only move a target value; the controller then writes the brightness
+file once per burst, or walks it there over a few frames when ``frames`` is
+set. Subscribers (the bar widget) are told about every value written, so the
+bar no longer waits for its next poll.
+
+Writing ``brightness`` needs permission on the file, usually a udev rule that
+gives the ``video`` group write access. Without it the controller falls back
+to one ``brightnessctl`` call per burst.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+
+logger = logging.getLogger("libqtile")
+
+BACKLIGHT_DIR = "/sys/class/backlight"
+
+
+class BrightnessController:
+    """Coalesced, optionally animated backlight changes.
+
+    ``frames`` is the number of intermediate steps used to reach a new target
+    (0 jumps straight to it) and ``frame_interval`` the delay between them.
+    """
+
+    def __init__(
+        self,
+        device="intel_backlight",
+        root=BACKLIGHT_DIR,
+        min_percent=1,
+        coalesce_delay=0.02,
+        frames=0,
+        frame_interval=1 / 60,
+    ):
+        self.path = os.path.join(root, device)
+        self.min_percent = min_percent
+        self.coalesce_delay = coalesce_delay
+        self.frames = frames
+        self.frame_interval = frame_interval
+        self.max_brightness = None
+        self.value = None
+        self.target = None
+        self.presses = 0
+        self.writes = 0
+        self.writable = True
+        self._fd = None
+        self._frames_left = 0
+        self._timer = None
+        self._loop = None
+        self._subscribers = []
+        self._children = []
+
+    def _read(self, name):
+        with open(os.path.join(self.path, name)) as f:
+            return int(f.read())
+
+    def _load(self):
+        if self.max_brightness is None:
+            self.max_brightness = self._read("max_brightness")
+        # Re-read at the start of each burst in case something else changed it.
+        if self.target is None:
+            self.value = self._read("brightness")
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def change(self, percent):
+        """Move the target by ``percent`` of the maximum brightness."""
+        try:
+            self._load()
+        except (OSError, ValueError):
+            logger.exception("brightness: cannot read %s", self.path)
+            return
+        self.presses += 1
+        start = self.value if self.target is None else self.target
+        lowest = max(round(self.max_brightness * self.min_percent / 100), 1)
+        step = round(self.max_brightness * percent / 100)
+        self.target = min(max(start + step, lowest), self.max_brightness)
+        self._frames_left = max(self.frames, 1)
+        if self._timer is None:
+            self._loop = self._loop or asyncio.get_event_loop()
+            self._timer = self._loop.call_later(self.coalesce_delay, self._step)
+
+    def _step(self):
+        self._timer = None
+        if self.target is None:
+            return
+        if not self.writable:
+            # Don't fork brightnessctl for every animation frame.
+            self._frames_left = 1
+        value = self.value + round((self.target - self.value) / self._frames_left)
+        self._frames_left -= 1
+        self._write(value)
+        if self._frames_left <= 0 or value == self.target:
+            self.target = None
+        else:
+            self._timer = self._loop.call_later(self.frame_interval, self._step)
+
+    def _write(self, value):
+        try:
+            if not self.writable:
+                self._brightnessctl(value)
+            else:
+                if self._fd is None:
+                    path = os.path.join(self.path, "brightness")
+                    self._fd = os.open(path, os.O_WRONLY | os.O_CLOEXEC)
+                # sysfs replaces the whole value on each write.
+                os.pwrite(self._fd, str(value).encode(), 0)
+        except PermissionError:
+            logger.warning("brightness: no write access to %s, using brightnessctl", self.path)
+            self.writable = False
+            self._brightnessctl(value)
+        except OSError:
+            logger.exception("brightness: writing %s failed", self.path)
+            self.close()
+            return
+        self.writes += 1
+        self.value = value
+        for callback in list(self._subscribers):
+            try:
+                callback(value, self.max_brightness)
+            except Exception:
+                logger.exception("brightness: subscriber failed")
+
+    def _brightnessctl(self, value):
+        proc = subprocess.Popen(["brightnessctl", "-q", "set", str(value)])
+        # Reap it as soon as it exits, as launcher.py does, rather than
+        # leaving a zombie behind every burst.
+        self._children = [child for child in self._children if child.poll() is None]
+        if self._loop is not None and hasattr(os, "pidfd_open"):
+            try:
+                fd = os.pidfd_open(proc.pid)
+            except OSError:
+                pass
+            else:
+                self._loop.add_reader(fd, self._exited, proc, fd)
+                return
+        self._children.append(proc)
+
+    def _exited(self, proc, fd):
+        self._loop.remove_reader(fd)
+        os.close(fd)
+        proc.poll()
+
+    def stats(self):
+        return {"presses": self.presses, "writes": self.writes}
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _controller
+except NameError:
+    _controller = None
+
+
+def get_controller(**config):
+    """Return the session-wide controller, creating it on first use."""
+    global _controller
+    if _controller is None:
+        _controller = BrightnessController(**config)
+    return _controller
@@ -33,41 +33,78 @@ from libqtile.config import Click, Drag, Group, Key, Match, Screen, ScratchPad,
 from libqtile.lazy import lazy
 from libqtile.command import lazy
 
+import accounting
+import audio
+import battery
+import brightness
+import damagebar
+import drag
+import floating
+import focus
+import launcher
+import lazybar
+import notify
+import power
+import sampler
+import snapshot
+import standby
+import supervisor
+import surfaces
+import theme
+import tiling
+import tracing
+import widgets
+
 # Colors
 
-colors = {
-    "rosewater"   : "#f4dbd6",
-    "flamingo"    : "#f0c6c6",
-    "pink"        : "#f5bde6",
-    "mauve"       : "#c6a0f6",
-    "red"         : "#ed8796",
-    "maroon"      : "#ee99a0",
-    "peach"       : "#f5a97f",
-    "yellow"      : "#eed49f",
-    "green"       : "#a6da95",
-    "teal"        : "#8bd5ca",
-    "sky"         : "#91d7e3",
-    "sapphire"    : "#7dc4e4",
-    "blue"        : "#8aadf4",
-    "lavender"    : "#b7bdf8",
-    "text"        : "#cad3f5",
-    "subtext1"    : "#b8c0e0",
-    "subtext0"    : "#a5adcb",
-    "overlay2"    : "#939ab7",
-    "overlay1"    : "#8087a2",
-    "overlay0"    : "#6e738d",
-    "surface2"    : "#5b6078",
-    "surface1"    : "#494d64",
-    "surface0"    : "#363a4f",
-    "base"        : "#24273a",
-    "mantle"      : "#1e2030",
-    "crust"       : "#181926"
-}
+# Parsed once into RGBA tuples; the same palette is written out for
+# alacritty, rofi and dunst at startup.
+colorscheme = theme.get_theme(flavour="macchiato", extra={"border": "#1F1D2E"})
+colors = colorscheme.palette
+layout_theme = dict(border_focus=colors.hex("border"), border_normal=colors.hex("border"))
 
 
 mod = "mod4"
 terminal = "alacritty"
 
+# One D-Bus connection for every notification; a burst of more than 5 from
+# one source in 30s is cut short and repeats within 5s are merged.
+notifier = notify.get_notifier(dedupe_window=5.0, rate=5, per=30.0)
+battery_monitor = battery.get_monitor(low_level=0.26, full_level=0.95, notifier=notifier)
+sampling_hub = sampler.get_hub(tick=0.5)
+volume = audio.get_controller(coalesce_delay=0.03)
+backlight = brightness.get_controller(device="intel_backlight", frames=4)
+# CPU and memory per group, of each window's whole process tree.
+group_usage = accounting.get_accounting(rescan=10.0, pss_per_tick=4, idle_every=8)
+
+
+def change_volume(qtile, step):
+    volume.change(step)
+
+
+def toggle_mute(qtile):
+    volume.toggle_mute()
+
+
+def change_brightness(qtile, step):
+    backlight.change(step)
+
+
+rofi_theme = [
+    "~/.config/rofi/config.rasi",
+    "~/.config/rofi/themes/my_theme.rasi",
+]
+launchers = launcher.get_pool([
+    launcher.Launcher("combi", "rofi -show combi", wm_class="rofi", warm_files=rofi_theme),
+    launcher.Launcher("drun", "rofi -show drun", wm_class="rofi", warm_files=rofi_theme),
+    launcher.Launcher("power", "rofi -show power-menu -modi power-menu:rofi-power-menu",
+                      wm_class="rofi", warm_files=rofi_theme),
+])
+
+
+def launch(qtile, name):
+    launchers.launch(name)
+
 # █▄▀ █▀▀ █▄█ █▄▄ █ █▄░█ █▀▄ █▀
 # █░█ ██▄ ░█░ █▄█ █ █░▀█ █▄▀ ▄█
 
@@ -107,20 +144,20 @@ keys = [
     Key([mod], "q", lazy.window.kill(), desc="Kill focused window"),
     Key([mod, "control"], "r", lazy.reload_config(), desc="Reload the config"),
     Key([mod, "control"], "q", lazy.shutdown(), desc="Shutdown Qtile"),
-    Key([mod], "r", lazy.spawn("rofi -show combi"), desc="Spawn a command using a prompt widget"),
+    Key([mod], "r", lazy.function(launch, "combi"), desc="Spawn a command using a prompt widget"),
 
     ##CUSTOM
-    Key([], "XF86AudioRaiseVolume", lazy.spawn("pactl set-sink-volume 0 +5%"), desc='Volume Up'),
-    Key([], "XF86AudioLowerVolume", lazy.spawn("pactl set-sink-volume 0 -5%"), desc='volume down'),
-    Key([], "XF86AudioMute", lazy.spawn("pactl set-sink-mute 0 toggle"), desc='Volume Mute'),
+    Key([], "XF86AudioRaiseVolume", lazy.function(change_volume, 5), desc='Volume Up'),
+    Key([], "XF86AudioLowerVolume", lazy.function(change_volume, -5), desc='volume down'),
+    Key([], "XF86AudioMute", lazy.function(toggle_mute), desc='Volume Mute'),
     Key([], "XF86AudioPlay", lazy.spawn("playerctl play-pause"), desc='playerctl'),
     Key([mod], "XF86AudioLowerVolume", lazy.spawn("playerctl previous"), desc='playerctl'),
     Key([mod], "XF86AudioRaiseVolume", lazy.spawn("playerctl next"), desc='playerctl'),
-    Key([], "XF86MonBrightnessUp", lazy.spawn("brightnessctl s 5%+"), desc='brightness UP'),
-    Key([], "XF86MonBrightnessDown", lazy.spawn("brightnessctl s 5%-"), desc='brightness Down'),
+    Key([], "XF86MonBrightnessUp", lazy.function(change_brightness, 5), desc='brightness UP'),
+    Key([], "XF86MonBrightnessDown", lazy.function(change_brightness, -5), desc='brightness Down'),
     Key([mod, "shift"], "f", lazy.window.toggle_floating(),  desc="Toggle floating window."),
     #Key([mod], "m",lazy.layout.maximize(),desc='toggle window between minimum and maximum sizes'),
-    Key([mod, "shift" ], "q", lazy.spawn("rofi -show power-menu -modi power-menu:rofi-power-menu"), desc='power menu'),
+    Key([mod, "shift" ], "q", lazy.function(launch, "power"), desc='power menu'),
     Key([mod], "e", lazy.spawn("thunar"), desc='file browser'),
     Key([mod], "s", lazy.spawn("flatpak run com.spotify.Client "), desc='music player'),
     Key([mod, "shift"], "b", lazy.spawn("firefox --private-window"), desc='firefox incognito'),
@@ -164,53 +201,55 @@ groups.append(ScratchPad('scratchpad', [
     DropDown('mixer', 'pavucontrol', width=0.8, height=0.8, x=0.1, y=0.1, opacity=0.9),
     DropDown('ranger', 'alacritty --class=ranger -e ranger',  width=0.8, height=0.8, x=0.1, y=0.1, opacity=0.9),
 ]))
+# keep the dropdowns spawned and hidden once the session is idle, so the
+# first toggle is as fast as the next ones
+dropdowns = standby.get_standby(
+    scratchpad="scratchpad",
+    enabled=True,
+    min_available_mb=800,
+    hub=sampling_hub,
+)
 # extend keys list with keybinding for scratchpad
 keys.extend([
-    Key(["control"], "1", lazy.group['scratchpad'].dropdown_toggle('term')),
-    Key(["control"], "2", lazy.group['scratchpad'].dropdown_toggle('mixer')),
-    Key(["control"], "3", lazy.group['scratchpad'].dropdown_toggle('ranger')),
+    Key(["control"], "1", lazy.function(dropdowns.toggle, 'term')),
+    Key(["control"], "2", lazy.function(dropdowns.toggle, 'mixer')),
+    Key(["control"], "3", lazy.function(dropdowns.toggle, 'ranger')),
 ])
 
 
 
+# tiling.* are the stock layouts, minus reconfiguring windows that did not move.
 layouts = [
-    layout.Columns( margin=4, border_focus='#1F1D2E',
-	    border_normal='#1F1D2E', 
+    tiling.Columns( margin=4, **layout_theme,
         border_width=0
     ),
     
-    layout.Max(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+    tiling.Max(	**layout_theme,
 	    margin=4,
 	    border_width=0,
     ),
     
-    layout.Floating(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+    layout.Floating(	**layout_theme,
 	    margin=4,
 	    border_width=0,
 	),
     # Try more layouts by unleashing below layouts
    #  layout.Stack(num_stacks=2),
    #  layout.Bsp(),
-     layout.Matrix(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+     tiling.Matrix(	**layout_theme,
 	    margin=4,
 	    border_width=0,
 	),
-     layout.MonadTall(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+     tiling.MonadTall(	**layout_theme,
         margin=4,
 	    border_width=0,
 	),
-    layout.MonadWide(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+    tiling.MonadWide(	**layout_theme,
 	    margin=4,
 	    border_width=0,
 	),
    #  layout.RatioTile(),
-     layout.Tile(	border_focus='#1F1D2E',
-	    border_normal='#1F1D2E',
+     tiling.Tile(	**layout_theme,
     ),
    #  layout.TreeTab(),
    #  layout.VerticalTile(),
@@ -218,7 +257,7 @@ layouts = [
 ]
 
 def open_launcher():
-    qtile.cmd_spawn("rofi -show drun")
+    launchers.launch("drun")
 
 
 widget_defaults = dict(
@@ -384,19 +423,39 @@ extension_defaults = widget_defaults.copy()
 # █▄█ █▀█ █▀▄
 ## from cufta22
 
+# Bar and layout icons are decoded once per session, not on every reload.
+surface_cache = surfaces.get_cache(budget_kb=4096, cache_dir="~/.cache/qtile/surfaces")
+
+# Widgets are built after the bar's first frame, in this order; the bar shows
+# placeholders until then.
+bar_loader = lazybar.BarLoader(
+    order=[
+        "HubClock",
+        "DamageGroupBox",
+        "BatteryText",
+        "VolumeText",
+        "HubBacklight",
+        "CachedLayoutIcon",
+        "Systray",
+        "CachedImage",
+    ],
+)
+
 screens = [
     Screen(
-        top=bar.Bar(
+        top=damagebar.DamageBar(
             [
 				widget.Spacer(
                     length = 10,
                 ),
 
-                widget.Image(
+                bar_loader.defer(
+                    widgets.CachedImage,
+                    cache     = surface_cache,
                     filename  = '~/.config/qtile/assets/bar/qtile.png',
                     margin    = 7,
                      mouse_callbacks  = {
-                        'Button1': lambda: qtile.cmd_spawn('rofi -show drun')
+                        'Button1': open_launcher
                     }
                 ),
 
@@ -404,7 +463,9 @@ screens = [
                     length = 10,
                 ),
 
-                widget.GroupBox(
+                bar_loader.defer(
+                    widgets.DamageGroupBox,
+                    width                       = 260,
                     fontsize                    = 20,
                     margin_y                    = 3,
                     margin_x                    = 5,
@@ -425,11 +486,17 @@ screens = [
 
                 # ----------------------------------------                 
   
-                widget.Image(
+                bar_loader.defer(
+                    widgets.CachedImage,
+                    cache     = surface_cache,
                     filename  = '~/.config/qtile/assets/bar/sun.png',
                     margin    = 8,
                 ),
-                widget.Backlight(
+                bar_loader.defer(
+                    widgets.HubBacklight,
+                    hub                  = sampling_hub,
+                    controller           = backlight,
+                    update_interval      = 5,
                     font                 = "Roboto, Regular",
                     foreground           = colors["yellow"],
                     brightness_file      = "/sys/class/backlight/intel_backlight/actual_brightness",
@@ -442,11 +509,15 @@ screens = [
                     length = 16,
                 ), 
 
-                widget.Image(
+                bar_loader.defer(
+                    widgets.CachedImage,
+                    cache     = surface_cache,
                     filename  = '~/.config/qtile/assets/bar/vol.png',
                     margin    = 8,
                 ),
-                widget.Volume(
+                bar_loader.defer(
+                    widgets.VolumeText,
+                    controller  = volume,
                     font        = "Roboto, Regular",
                     foreground  = colors["blue"],
                     fontsize    = 15,
@@ -464,17 +535,36 @@ screens = [
                 #    padding     = 0, 
                 #        },
 
-                widget.Image(
+                bar_loader.defer(
+                    widgets.CachedImage,
+                    cache     = surface_cache,
                     filename  = '~/.config/qtile/assets/bar/bat.png',
                     margin    = 7
                 ),         
-                widget.Battery(format=' {percent:2.0%}',
+                bar_loader.defer(
+                    widgets.BatteryText,
+                    monitor     = battery_monitor,
+                    format      = ' {percent:2.0%}',
                     font        = "Roboto, Regular",
                     foreground  = colors["red"],
                     fontsize    = 15,
                     padding     = 0,
                 ),         
 
+                widget.Spacer(
+                    length = 16,
+                ),
+                bar_loader.defer(
+                    widgets.TopGroups,
+                    hub         = sampling_hub,
+                    accounting  = group_usage,
+                    count       = 1,
+                    font        = "Roboto, Regular",
+                    foreground  = colors["mauve"],
+                    fontsize    = 15,
+                    padding     = 0,
+                ),
+
                 widget.Spacer(
                     length = 30,
                 ),
@@ -482,7 +572,8 @@ screens = [
                     length      =10,
                     background  = colors["surface0"]
                 ), 
-                widget.Systray(
+                bar_loader.defer(
+                    widget.Systray,
                     icon_size   = 24,
                     padding     = 0,
                     background  = colors["surface0"]
@@ -495,7 +586,10 @@ screens = [
                     length = 20,
                 ),
         
-                widget.Clock(
+                bar_loader.defer(
+                    widgets.HubClock,
+                    width   = 70,
+                    hub     = sampling_hub,
                     format  ='%I:%M %p',
                     font    ="Roboto, Regular",
                     fontsize = 15,
@@ -504,7 +598,9 @@ screens = [
                     length = 10,
                 ),
 
-                widget.CurrentLayoutIcon(
+                bar_loader.defer(
+                    widgets.CachedLayoutIcon,
+                    cache    = surface_cache,
                     padding  = 0,
                     scale    = 0.6,
                     custom_icon_paths = [
@@ -512,11 +608,13 @@ screens = [
                     ],
                 ),
 
-                widget.Image(
+                bar_loader.defer(
+                    widgets.CachedImage,
+                    cache     = surface_cache,
                     filename         = '~/.config/qtile/assets/bar/power.png',
                     margin           = 8,
                     mouse_callbacks  = {
-                        'Button1': lambda: qtile.cmd_spawn('rofi -show power-menu -modi power-menu:rofi-power-menu')
+                        'Button1': lambda: launchers.launch('power')
                     }
                 ),
 
@@ -533,19 +631,22 @@ screens = [
     ),
 ]
 
-# Drag floating layouts.
+# Drag floating layouts; moves and resizes are applied once per frame.
+drag_pacer = drag.DragPacer(fps=60, outline=colors["lavender"])
+
 mouse = [
-    Drag([mod], "Button1", lazy.window.set_position_floating(), start=lazy.window.get_position()),
-    Drag([mod], "Button3", lazy.window.set_size_floating(), start=lazy.window.get_size()),
+    Drag([mod], "Button1", lazy.function(drag_pacer.motion, "move"), start=lazy.window.get_position()),
+    Drag([mod], "Button3", lazy.function(drag_pacer.motion, "resize"), start=lazy.window.get_size()),
     Click([mod], "Button2", lazy.window.bring_to_front()),
 ]
 
 dgroups_key_binder = None
 dgroups_app_rules = []  # type: list
-follow_mouse_focus = True
+# Focus follows the mouse through focus.DwellFocus instead, see below.
+follow_mouse_focus = False
 bring_front_click = False
 cursor_warp = False
-floating_layout = layout.Floating(
+floating_layout = floating.IndexedFloating(
     float_rules=[
         # Run the utility of `xprop` to see the wm class and name of an X client.
         *layout.Floating.default_float_rules,
@@ -559,11 +660,80 @@ floating_layout = layout.Floating(
 )
 
 ##autostart
+services = supervisor.get_supervisor([
+    supervisor.Service("nitrogen", "nitrogen --restore", oneshot=True),
+    supervisor.Service("setxkbmap", "setxkbmap -option caps:escape", oneshot=True),
+    # start compositing once the wallpaper is set, so it doesn't flash
+    # power_profile writes the config picom runs with
+    supervisor.Service("picom", ["picom", "--config", os.path.expanduser("~/.cache/qtile/picom.conf")],
+                       after=["nitrogen"], ready_delay=0.2),
+    supervisor.Service("lxpolkit", "lxpolkit"),
+    supervisor.Service("dunst", "dunst",
+                       ready_check=supervisor.bus_name_owned("org.freedesktop.Notifications")),
+])
+
+# On battery: sample the bar 3x less often (6x under 30%), stop widgets that
+# can't be seen, hold off dropdown warming and turn off picom's animations.
+power_profile = power.get_profile(
+    battery_monitor,
+    sampling_hub,
+    standby=dropdowns,
+    supervisor=services,
+    stretch=3,
+    saver_stretch=6,
+    saver_level=0.3,
+    compositor_target="~/.cache/qtile/picom.conf",
+)
+
 @hook.subscribe.startup_once
 def autostart():
-    home = os.path.expanduser('~/.config/qtile/autostart.sh') # path to my script, under my user directory
-    subprocess.call([home])
-
+    battery_monitor.start()
+    power_profile.start(qtile)
+    launchers.start()
+    # Benchmarks and nested test sessions set QTILE_NO_SERVICES=1 so they
+    # don't start a second picom, dunst or polkit agent.
+    if not os.environ.get("QTILE_NO_SERVICES"):
+        services.start()
+
+
+@hook.subscribe.startup_complete
+def warm_dropdowns():
+    dropdowns.start(qtile)
+
+
+hook.subscribe.startup(lambda: notifier.install(qtile))
+hook.subscribe.startup(lambda: colorscheme.install(qtile))
+hook.subscribe.client_new(launchers.client_new)
+hook.subscribe.client_new(dropdowns.activity)
+for event in ("startup", "float_change", "focus_change", "setgroup"):
+    getattr(hook.subscribe, event)(power_profile.refresh)
+
+# Focus the window under the pointer once it has rested there for 50ms.
+pointer_focus = focus.get_focus(dwell=0.05)
+hook.subscribe.client_mouse_enter(pointer_focus.on_enter)
+
+# Keep layouts, their sizes and window order across reloads and restarts.
+# While reloading, this file is imported with the old groups still in place.
+session = snapshot.get_snapshot(path="~/.cache/qtile/session.bin", delay=2.0)
+session.capture(qtile)
+hook.subscribe.startup(lambda: session.restore(qtile))
+hook.subscribe.restart(lambda: session.capture(qtile))
+hook.subscribe.shutdown(lambda: session.capture(qtile))
+hook.subscribe.layout_change(session.changed)
+hook.subscribe.group_window_add(session.changed)
+hook.subscribe.client_killed(session.changed)
+hook.subscribe.focus_change(session.changed)
+
+# Latency tracing for keys, commands, hooks, layouts and draws; start qtile
+# with QTILE_TRACE=1 to turn it on, then `qtile cmd-obj -o root -f trace_stats`.
+tracer = tracing.get_tracer(enabled=bool(os.environ.get("QTILE_TRACE")))
+hook.subscribe.startup(lambda: tracer.install(qtile))
+
+# Top consumers: `qtile cmd-obj -o root -f top_groups`.
+hook.subscribe.startup(lambda: group_usage.install(qtile))
+hook.subscribe.client_managed(group_usage.changed)
+hook.subscribe.client_killed(group_usage.changed)
+hook.subscribe.group_window_add(group_usage.changed)
 
 auto_fullscreen = True
 focus_on_window_activation = "smart"
@@ -0,0 +1,116 @@
+"""Bar that only repaints the widgets that changed.
+
+Stock ``Bar.draw()`` repaints every widget, spacer and image, and widgets
+call it for any change that might move things: a GroupBox focus change, a
+layout switch, a clock text changing width. :class:`DamageBar` remembers
+where each widget was drawn, and widgets that go through :func:`redraw`
+say which of them changed; it then repaints only that widget and those
+whose position or length changed. Everything else keeps the pixels already
+on the bar window, so the X server and the compositor see a small damaged
+rectangle instead of the whole bar.
+
+A plain ``bar.draw()`` (stock widgets, expose events, screen reconfigures,
+showing the bar) still repaints everything.
+"""
+
+from libqtile import bar
+
+
+def redraw(widget):
+    """Redraw ``widget``'s bar, only repainting ``widget`` on a DamageBar."""
+    if isinstance(widget.bar, DamageBar):
+        widget.bar.damage(widget)
+    else:
+        widget.bar.draw()
+
+
+class DamageBar(bar.Bar):
+    def __init__(self, widgets, size, **config):
+        bar.Bar.__init__(self, widgets, size, **config)
+        self.full_redraws = 0
+        self.partial_redraws = 0
+        self.skipped = 0
+        self.repaints = {}
+        self._geometry = {}
+        self._end = None
+        self._damaged = set()
+        self._full = True
+
+    def _configure(self, qtile, screen, reconfigure=False):
+        self._full = True
+        bar.Bar._configure(self, qtile, screen, reconfigure=reconfigure)
+
+    def _configure_widget(self, widget):
+        if not bar.Bar._configure_widget(self, widget):
+            return False
+        # Count what each widget actually copies to the bar window.
+        draw = widget.drawer.draw
+        counter = self.repaints.setdefault(widget.name, [0, 0])
+        drawer = widget.drawer
+
+        def counted(offsetx=0, offsety=0, width=None, height=None):
+            counter[0] += 1
+            counter[1] += (width or drawer.width) * (height or drawer.height)
+            draw(offsetx=offsetx, offsety=offsety, width=width, height=height)
+
+        drawer.draw = counted
+        return True
+
+    def process_window_expose(self):
+        self._full = True
+        bar.Bar.process_window_expose(self)
+
+    def draw(self, widget=None):
+        """Queue a redraw: of ``widget`` and anything it moved, or of everything."""
+        if widget is not None and widget in self._geometry:
+            self._damaged.add(widget)
+        else:
+            self._full = True
+        bar.Bar.draw(self)
+
+    def damage(self, widget):
+        """Queue a redraw of ``widget``, whose content changed."""
+        self.draw(widget=widget)
+
+    def _actual_draw(self):
+        damaged, self._damaged = self._damaged, set()
+        if self._full:
+            self._full = False
+            self.full_redraws += 1
+            bar.Bar._actual_draw(self)
+            self._remember()
+            return
+
+        self.queued_draws = 0
+        self._resize(self.length, self.widgets)
+        self.partial_redraws += 1
+        for widget in self.widgets:
+            if widget in damaged or self._geometry.get(widget) != (widget.offset, widget.length):
+                widget.draw()
+            else:
+                self.skipped += 1
+
+        end = self.widgets[-1].offset + self.widgets[-1].length
+        if end < self.length and end != self._end:
+            if self.horizontal:
+                self.drawer.draw(offsetx=end, width=self.length - end)
+            else:
+                self.drawer.draw(offsety=end, height=self.length - end)
+        self._remember()
+
+    def _remember(self):
+        self._geometry = {widget: (widget.offset, widget.length) for widget in self.widgets}
+        last = self.widgets[-1]
+        self._end = last.offset + last.length
+
+    def cmd_damage_stats(self):
+        """Redraw counts, and per widget the number of blits and pixels copied."""
+        return {
+            "full_redraws": self.full_redraws,
+            "partial_redraws": self.partial_redraws,
+            "skipped_widget_draws": self.skipped,
+            "widgets": {
+                name: {"repaints": count, "pixels": pixels}
+                for name, (count, pixels) in self.repaints.items()
+            },
+        }
@@ -0,0 +1,141 @@
+"""Frame-paced floating drag and resize.
+
+qtile runs a Drag binding's commands on every pointer motion event, and a
+high polling rate mouse delivers several hundred of them a second, each one
+a ConfigureWindow round and a compositor repaint. :class:`DragPacer` is bound
+instead of ``set_position_floating``/``set_size_floating``: motion events
+only record where the window should go, and once per display frame the
+latest position is applied. Resizing can instead show an outline and resize
+the window once, when the button is released.
+"""
+
+import asyncio
+import time
+
+
+class _Outline:
+    """Four thin internal windows drawing a rectangle."""
+
+    def __init__(self, qtile, color, width):
+        self.qtile = qtile
+        self.color = color
+        self.width = width
+        self.strips = []
+
+    def show(self, x, y, w, h):
+        t = self.width
+        rects = [(x, y, w, t), (x, y + h - t, w, t), (x, y, t, h), (x + w - t, y, t, h)]
+        if not self.strips:
+            screen_w = max(s.x + s.width for s in self.qtile.screens)
+            screen_h = max(s.y + s.height for s in self.qtile.screens)
+            for i, rect in enumerate(rects):
+                internal = self.qtile.core.create_internal(*rect)
+                size = (screen_w, t) if i < 2 else (t, screen_h)
+                drawer = internal.create_drawer(*size)
+                drawer.clear(self.color)
+                internal.unhide()
+                self.strips.append((internal, drawer))
+        for (internal, drawer), (sx, sy, sw, sh) in zip(self.strips, rects):
+            sw, sh = max(sw, 1), max(sh, 1)
+            internal.place(sx, sy, sw, sh, 0, None, above=True)
+            drawer.draw(width=sw, height=sh)
+
+    def hide(self):
+        for internal, drawer in self.strips:
+            drawer.finalize()
+            internal.kill()
+        self.strips = []
+
+
+class DragPacer:
+    """Applies floating moves and resizes at most once per frame.
+
+    Bind ``lazy.function(pacer.motion, "move")`` or ``(pacer.motion,
+    "resize")`` as the Drag command, with the usual ``start``. With
+    ``outline`` set to a colour, resizes draw an outline while dragging and
+    configure the window once, on release.
+    """
+
+    def __init__(self, fps=60, outline=None, outline_width=2):
+        self.frame = 1 / fps
+        self.outline_color = outline
+        self.outline_width = outline_width
+        self.drags = 0
+        self.events = 0
+        self.configures = 0
+        self.latencies = []
+        self._target = None
+        self._since = None
+        self._drag = None
+        self._timer = None
+        self._last_frame = 0
+        self._outline = None
+        self._pending_size = None
+
+    def motion(self, qtile, kind, x, y):
+        """Drag command: remember the geometry, apply it on the next frame."""
+        window = qtile.current_window
+        if window is None:
+            return
+        if self._drag is not qtile._drag:
+            self._drag = qtile._drag
+            self.drags += 1
+        self.events += 1
+        if self._target is None:
+            self._since = time.monotonic()
+        self._target = (qtile, window, kind, x, y)
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            delay = max(self._last_frame + self.frame - time.monotonic(), 0)
+            self._timer = asyncio.get_event_loop().call_later(delay, self._on_frame)
+
+    def _on_frame(self):
+        self._timer = None
+        self._last_frame = time.monotonic()
+        target, self._target = self._target, None
+        if target is not None:
+            qtile, window, kind, x, y = target
+            self.latencies.append(self._last_frame - self._since)
+            del self.latencies[:-256]
+            if kind == "resize" and self.outline_color is not None:
+                self._show_outline(qtile, window, x, y)
+                self._pending_size = (window, x, y)
+            else:
+                self._apply(window, kind, x, y)
+
+        if self._outline is not None:
+            if self._outline.qtile._drag is None:
+                # Button released: resize for real, once.
+                window, w, h = self._pending_size
+                self._pending_size = None
+                self._outline.hide()
+                self._outline = None
+                self._apply(window, "resize", w, h)
+            else:
+                # Keep looking for the release.
+                self._schedule()
+
+    def _apply(self, window, kind, x, y):
+        self.configures += 1
+        if kind == "move":
+            window.cmd_set_position_floating(x, y)
+        else:
+            window.cmd_set_size_floating(x, y)
+
+    def _show_outline(self, qtile, window, w, h):
+        if self._outline is None:
+            self._outline = _Outline(qtile, self.outline_color, self.outline_width)
+        bw = window.borderwidth
+        self._outline.show(window.x, window.y, max(w, 1) + 2 * bw, max(h, 1) + 2 * bw)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "drags": self.drags,
+            "motion_events": self.events,
+            "configures": self.configures,
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
@@ -0,0 +1,37 @@
+"""Layout variants used by config.py."""
+
+from libqtile import layout
+
+import rules
+
+
+class IndexedFloating(layout.Floating):
+    """Floating layout that checks ``float_rules`` through a :class:`rules.RuleSet`.
+
+    Decisions are the same as the stock layout's. The rule set is rebuilt if
+    ``float_rules`` is replaced or changes length.
+    """
+
+    def __init__(self, float_rules=None, no_reposition_rules=None, **config):
+        layout.Floating.__init__(self, float_rules, no_reposition_rules, **config)
+        self._rule_set = None
+
+    @property
+    def rule_set(self):
+        rule_set = self._rule_set
+        if (
+            rule_set is None
+            or rule_set.source is not self.float_rules
+            or len(rule_set.rules) != len(self.float_rules)
+        ):
+            rule_set = self._rule_set = rules.RuleSet(self.float_rules)
+            rule_set.source = self.float_rules
+        return rule_set
+
+    def match(self, win):
+        """Used to default float some windows"""
+        return self.rule_set.matches(win)
+
+    def cmd_rule_stats(self):
+        """Index and cache counters of the compiled float rules."""
+        return self.rule_set.stats()
@@ -0,0 +1,98 @@
+"""Focus follows mouse, once the pointer settles.
+
+With ``follow_mouse_focus = True`` qtile focuses every window the pointer
+crosses, and each focus change redraws borders, the GroupBox and the window
+name. Sweeping the pointer over a Matrix or Columns layout produces a storm
+of them. :class:`DwellFocus` takes over from ``follow_mouse_focus`` through
+the ``client_mouse_enter`` hook: a crossing only records the window, and
+focus moves once the pointer has stayed there for ``dwell`` seconds, so the
+windows passed over on the way are never focused.
+"""
+
+import asyncio
+import time
+
+
+class DwellFocus:
+    """Focus the window under the pointer after ``dwell`` seconds.
+
+    A focus change made meanwhile by other means (a key binding, a new
+    window) wins over the pending one.
+    """
+
+    def __init__(self, dwell=0.05):
+        self.dwell = dwell
+        self.crossings = 0
+        self.applied = 0
+        self.suppressed = 0
+        self.latencies = []
+        self._pending = None
+        self._focused_before = None
+        self._entered_at = None
+        self._timer = None
+
+    def on_enter(self, client):
+        """Hook for ``client_mouse_enter``."""
+        self.crossings += 1
+        if self._pending is not None:
+            # The previous window was only passed over.
+            self.suppressed += 1
+        else:
+            self._focused_before = client.qtile.current_window
+            self._entered_at = time.monotonic()
+        self._pending = client
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_event_loop().call_later(self.dwell, self._settle)
+
+    def _settle(self):
+        self._timer = None
+        client, self._pending = self._pending, None
+        if client is None:
+            return
+        qtile = client.qtile
+        group = client.group
+        if (
+            group is None
+            or client not in group.windows
+            or qtile._drag
+            or qtile.current_window not in (self._focused_before, client)
+        ):
+            self.suppressed += 1
+            return
+
+        changed = False
+        if group.current_window != client:
+            group.focus(client, False)
+            changed = True
+        if group.screen and qtile.current_screen != group.screen:
+            qtile.focus_screen(group.screen.index, False)
+            changed = True
+        if changed:
+            self.applied += 1
+            self.latencies.append(time.monotonic() - self._entered_at)
+            del self.latencies[:-64]
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "crossings": self.crossings,
+            "applied": self.applied,
+            "suppressed": self.suppressed,
+            "settle_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        }
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _focus
+except NameError:
+    _focus = None
+
+
+def get_focus(**config):
+    """Return the session-wide focus policy, creating it on first use."""
+    global _focus
+    if _focus is None:
+        _focus = DwellFocus(**config)
+    return _focus
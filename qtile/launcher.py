@@ -0,0 +1,309 @@
+"""Pre-warmed launchers for the hot keybindings.
+
+Each configured launcher keeps a small pool of processes that are already
+forked and waiting: a tiny ``sh`` blocked on its stdin that ``exec``s the
+real command (rofi, the power menu...) as soon as it reads a line. A key
+press then only costs a pipe write, and the pool is refilled shortly after
+each use. Theme and config files listed in ``warm_files`` are kept in the
+page cache ahead of time.
+
+Press-to-map latency is recorded for every launch. On X11 a separate
+connection watches MapNotify on the root window, which also sees
+override-redirect windows such as rofi's; elsewhere the ``client_new`` hook
+is used, which only sees managed windows.
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import subprocess
+import time
+from collections import deque
+
+logger = logging.getLogger("libqtile")
+
+_WAITER = 'read -r _ || exit 0; exec "$@" </dev/null'
+
+
+class Launcher:
+    """A command that may be launched from a key or a bar click.
+
+    ``wm_class`` is the window class its first window maps with, used to
+    measure latency. ``pool_size`` waiting processes are kept; 0 disables
+    pooling for this launcher.
+    """
+
+    def __init__(self, name, command, wm_class=None, pool_size=1, warm_files=()):
+        self.name = name
+        self.argv = shlex.split(command) if isinstance(command, str) else list(command)
+        self.wm_class = wm_class
+        self.pool_size = pool_size
+        self.warm_files = [os.path.expanduser(f) for f in warm_files]
+
+
+class _Stats:
+    def __init__(self, history):
+        self.pooled = deque(maxlen=history)
+        self.cold = deque(maxlen=history)
+        self.launches = 0
+        self.unmatched = 0
+
+    def summary(self):
+        out = {"launches": self.launches, "unmatched": self.unmatched}
+        for kind in ("pooled", "cold"):
+            samples = sorted(getattr(self, kind))
+            if samples:
+                out[kind] = {
+                    "count": len(samples),
+                    "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+                    "max_ms": round(samples[-1] * 1000, 2),
+                }
+        return out
+
+
+class LauncherPool:
+    """Keeps warm launchers ready and measures press-to-map latency."""
+
+    def __init__(self, launchers, refill_delay=0.5, history=50, map_timeout=10):
+        self.launchers = {launcher.name: launcher for launcher in launchers}
+        self.refill_delay = refill_delay
+        self.map_timeout = map_timeout
+        self._pools = {name: [] for name in self.launchers}
+        self._stats = {name: _Stats(history) for name in self.launchers}
+        self._pending = []
+        self._running = []
+        self._watching = {}
+        self._probe = None
+        self._loop = None
+
+    def start(self, loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        for launcher in self.launchers.values():
+            self._warm_files(launcher)
+            self._refill(launcher.name)
+        try:
+            self._probe = _MapProbe(self._loop, self._on_map, lambda: bool(self._pending))
+        except Exception:
+            logger.info("launcher: no X11 map probe, timing managed windows only")
+            self._probe = None
+
+    def launch(self, name, pooled=True):
+        """Run launcher ``name``, from the pool unless ``pooled`` is False."""
+        launcher = self.launchers[name]
+        press = time.monotonic()
+        self._reap()
+
+        proc = None
+        if pooled:
+            pool = self._pools[name]
+            while pool and proc is None:
+                proc = pool.pop(0)
+                if not self._release(proc):
+                    proc = None
+        if proc is None:
+            pooled = False
+            try:
+                proc = subprocess.Popen(launcher.argv, stdin=subprocess.DEVNULL)
+            except OSError:
+                logger.exception("launcher: cannot run %s", launcher.argv[0])
+                return
+
+        self._track(proc)
+        self._stats[name].launches += 1
+        self._pending.append((launcher, press, pooled, proc.pid))
+        if self._loop is not None and launcher.pool_size:
+            self._loop.call_later(self.refill_delay, self._refill, name)
+
+    def _spawn_waiter(self, launcher):
+        proc = subprocess.Popen(
+            ["/bin/sh", "-c", _WAITER, "sh", *launcher.argv],
+            stdin=subprocess.PIPE,
+            start_new_session=True,
+        )
+        # The waiter execs the real command, so this also reaps the app.
+        self._track(proc)
+        return proc
+
+    def _track(self, proc):
+        """Reap ``proc`` as soon as it exits, through a pidfd on the loop.
+
+        Without pidfds (Linux < 5.3) exited children are reaped on the next
+        launch instead.
+        """
+        if proc.pid in self._watching or proc in self._running:
+            return
+        if self._loop is not None and hasattr(os, "pidfd_open"):
+            try:
+                fd = os.pidfd_open(proc.pid)
+            except OSError:
+                pass
+            else:
+                self._watching[proc.pid] = fd
+                self._loop.add_reader(fd, self._exited, proc)
+                return
+        self._running.append(proc)
+
+    def _exited(self, proc):
+        fd = self._watching.pop(proc.pid, None)
+        if fd is not None:
+            self._loop.remove_reader(fd)
+            os.close(fd)
+        proc.poll()
+
+    def _release(self, proc):
+        if proc.poll() is not None:
+            return False
+        try:
+            proc.stdin.write(b"\n")
+            proc.stdin.close()
+        except OSError:
+            return False
+        return True
+
+    def _refill(self, name):
+        launcher = self.launchers[name]
+        pool = self._pools[name]
+        pool[:] = [proc for proc in pool if proc.poll() is None]
+        while len(pool) < launcher.pool_size:
+            try:
+                pool.append(self._spawn_waiter(launcher))
+            except OSError:
+                logger.exception("launcher: cannot pre-spawn %s", name)
+                return
+
+    def _warm_files(self, launcher):
+        for path in launcher.warm_files:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+
+    def _reap(self):
+        self._running = [proc for proc in self._running if proc.poll() is None]
+
+    def _on_map(self, wm_class=None, pid=None):
+        now = time.monotonic()
+        for i, (launcher, press, pooled, child) in enumerate(self._pending):
+            if now - press > self.map_timeout:
+                continue
+            if (pid is not None and pid == child) or (
+                wm_class is not None and launcher.wm_class in wm_class
+            ):
+                del self._pending[i]
+                stats = self._stats[launcher.name]
+                (stats.pooled if pooled else stats.cold).append(now - press)
+                break
+        self._expire(now)
+
+    def _expire(self, now):
+        for entry in list(self._pending):
+            if now - entry[1] > self.map_timeout:
+                self._pending.remove(entry)
+                self._stats[entry[0].name].unmatched += 1
+
+    def client_new(self, client):
+        """Hook for ``client_new``, used when there is no X11 map probe."""
+        if self._probe is not None or not self._pending:
+            return
+        self._on_map(wm_class=client.get_wm_class() or (), pid=client.get_pid())
+
+    def stats(self):
+        """Per-launcher press-to-map latency, split by pooled and cold."""
+        return {name: stats.summary() for name, stats in self._stats.items()}
+
+    def drain(self, name):
+        """Let the waiting processes of launcher ``name`` exit unused."""
+        for proc in self._pools.get(name, ()):
+            # EOF makes the waiting shell exit without running anything.
+            proc.stdin.close()
+            self._track(proc)
+        self._pools[name] = []
+
+    def close(self):
+        if self._probe is not None:
+            self._probe.close()
+            self._probe = None
+        for name in self._pools:
+            self.drain(name)
+
+
+class _MapProbe:
+    """Reports the WM_CLASS of every top-level window that gets mapped."""
+
+    def __init__(self, loop, callback, wanted):
+        import xcffib
+        import xcffib.xproto
+
+        self.xproto = xcffib.xproto
+        self.loop = loop
+        self.callback = callback
+        self.wanted = wanted
+        self.conn = xcffib.connect()
+        root = self.conn.get_setup().roots[self.conn.pref_screen].root
+        self.conn.core.ChangeWindowAttributesChecked(
+            root,
+            xcffib.xproto.CW.EventMask,
+            [xcffib.xproto.EventMask.SubstructureNotify],
+        ).check()
+        self.fd = self.conn.get_file_descriptor()
+        loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        while True:
+            try:
+                event = self.conn.poll_for_event()
+            except Exception:
+                logger.debug("launcher: map probe error", exc_info=True)
+                return
+            if event is None:
+                return
+            # Only pay for the WM_CLASS round trip while a launch is pending.
+            if isinstance(event, self.xproto.MapNotifyEvent) and self.wanted():
+                self.callback(wm_class=self._wm_class(event.window))
+
+    def _wm_class(self, wid):
+        try:
+            reply = self.conn.core.GetProperty(
+                False, wid, self.xproto.Atom.WM_CLASS, self.xproto.Atom.STRING, 0, 64
+            ).reply()
+        except Exception:
+            return ()
+        value = reply.value.to_string() if reply.value_len else ""
+        return tuple(part for part in value.split("\0") if part)
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        self.conn.disconnect()
+
+
+# Kept across importlib.reload() of this module on config reloads so the
+# pools aren't respawned every time.
+try:
+    _pool
+except NameError:
+    _pool = None
+
+
+def get_pool(launchers, **config):
+    """Return the session-wide pool, creating it on first use.
+
+    Launchers are updated from ``launchers`` on every call so config reloads
+    pick up changed commands.
+    """
+    global _pool
+    if _pool is None:
+        _pool = LauncherPool(launchers, **config)
+    else:
+        for launcher in launchers:
+            old = _pool.launchers.get(launcher.name)
+            if old is not None and old.argv != launcher.argv:
+                _pool.drain(launcher.name)
+            _pool.launchers[launcher.name] = launcher
+            _pool._pools.setdefault(launcher.name, [])
+            _pool._stats.setdefault(launcher.name, _Stats(50))
+    return _pool
@@ -0,0 +1,151 @@
+"""Deferred bar widgets.
+
+Widgets wrapped with :meth:`BarLoader.defer` start out as empty placeholders
+of roughly their final size, so the bar's first frame needs no image decoding,
+icon scanning or font layout. Once the bar is up the real widgets are built
+and configured one per event-loop iteration, in the order the loader is
+given, and swapped into the bar in place of their placeholders. The same
+happens after every config reload.
+"""
+
+import heapq
+import itertools
+import logging
+import time
+
+from libqtile import bar
+from libqtile.widget import base
+
+logger = logging.getLogger("libqtile")
+
+
+class Deferred(base._Widget):
+    """Placeholder for a widget that is built after the first frame.
+
+    ``width`` is the space kept for it until then, the bar height if unset.
+    """
+
+    def __init__(self, loader, widget_class, args, config, width=None, priority=None):
+        base._Widget.__init__(self, bar.CALCULATED, background=config.get("background"))
+        self.loader = loader
+        self.widget_class = widget_class
+        self.widget_args = args
+        self.widget_config = config
+        self.placeholder_width = width
+        self.priority = priority
+        self.queued = False
+        self.finalized = False
+
+    def calculate_length(self):
+        if self.placeholder_width is not None:
+            return self.placeholder_width
+        return self.bar.height if self.bar.horizontal else self.bar.width
+
+    def _configure(self, qtile, bar):
+        base._Widget._configure(self, qtile, bar)
+        if not self.queued:
+            self.queued = True
+            self.loader.add(self)
+
+    def draw(self):
+        self.drawer.clear(self.background or self.bar.background)
+        if self.bar.horizontal:
+            self.drawer.draw(offsetx=self.offset, offsety=self.offsety, width=self.length)
+        else:
+            self.drawer.draw(offsety=self.offset, offsetx=self.offsetx, height=self.length)
+
+    def finalize(self):
+        self.finalized = True
+        base._Widget.finalize(self)
+
+    def realize(self):
+        """Build the real widget and put it where the placeholder is."""
+        if self.finalized or self not in self.bar.widgets:
+            return None
+        widget = self.widget_class(*self.widget_args, **self.widget_config)
+        index = self.bar.widgets.index(self)
+        self.bar.widgets[index] = widget
+
+        widgets_map = self.qtile.widgets_map
+        for name, registered in list(widgets_map.items()):
+            if registered is self:
+                del widgets_map[name]
+        self.finalize()
+
+        self.bar.crashed_widgets = []
+        if self.bar._configure_widget(widget):
+            self.qtile.register_widget(widget)
+        else:
+            self.bar._remove_crashed_widgets()
+        self.bar.draw()
+        return widget
+
+
+class BarLoader:
+    """Builds deferred widgets in priority order once the bar is drawn.
+
+    ``order`` lists widget class names, most wanted first; a ``priority``
+    given to :meth:`defer` overrides it, and anything not listed comes last.
+    Widgets of equal priority are built in bar order. ``delay`` is how long
+    after the first placeholder is configured building starts. With
+    ``enabled=False`` :meth:`defer` builds widgets right away.
+    """
+
+    def __init__(self, order=(), delay=0.05, enabled=True):
+        self.order = {name: i for i, name in enumerate(order)}
+        self.delay = delay
+        self.enabled = enabled
+        self.timings = []
+        self._queue = []
+        self._seq = itertools.count()
+        self._scheduled = False
+        self._started = None
+        self._finished = None
+
+    def defer(self, widget_class, *args, width=None, priority=None, **config):
+        if not self.enabled:
+            return widget_class(*args, **config)
+        return Deferred(self, widget_class, args, config, width=width, priority=priority)
+
+    def add(self, placeholder):
+        priority = placeholder.priority
+        if priority is None:
+            priority = self.order.get(placeholder.widget_class.__name__, len(self.order))
+        heapq.heappush(self._queue, (priority, next(self._seq), placeholder))
+        if not self._scheduled:
+            self._scheduled = True
+            self._started = time.monotonic()
+            self._finished = None
+            placeholder.qtile.call_later(self.delay, self._step, placeholder.qtile)
+
+    def _step(self, qtile):
+        if not self._queue:
+            self._scheduled = False
+            self._finished = time.monotonic()
+            return
+        _, _, placeholder = heapq.heappop(self._queue)
+        start = time.perf_counter()
+        try:
+            widget = placeholder.realize()
+        except Exception:
+            logger.exception("lazybar: building %s failed", placeholder.widget_class.__name__)
+            widget = None
+        if widget is not None:
+            self.timings.append(
+                (widget.name, (time.perf_counter() - start) * 1000, time.monotonic() - self._started)
+            )
+        # One widget per loop iteration so input is handled in between.
+        qtile.call_soon(self._step, qtile)
+
+    def stats(self):
+        """Build time of each widget in ms, when it was ready and the total."""
+        return {
+            "pending": len(self._queue),
+            "widgets": [
+                {"name": name, "build_ms": round(ms, 2), "ready_after": round(after, 3)}
+                for name, ms, after in self.timings[-64:]
+            ],
+            "done_after": None
+            if self._finished is None
+            else round(self._finished - self._started, 3),
+        }
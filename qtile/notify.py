@@ -0,0 +1,193 @@
+"""Desktop notifications over one persistent D-Bus connection.
+
+``notify-send``, and qtile's own ``send_notification``, connect to the
+session bus again for every message. :class:`Notifier` keeps a single
+connection to the notification daemon (dunst here) and sends through it:
+
+* each ``category`` (e.g. "battery", "volume") reuses the id the server
+  returned for its last notification, so a new one replaces the old one
+  instead of stacking up
+* a message identical to one sent less than ``dedupe_window`` seconds ago is
+  merged into the one already on screen, i.e. dropped
+* each ``source`` may send at most ``rate`` messages per ``per`` seconds;
+  the rest of a burst is dropped. Urgent messages are exempt
+
+Sending never blocks: messages are queued and delivered from the event
+loop. Helper scripts can go through the same connection with
+``qtile cmd-obj -o root -f notify -a TITLE MESSAGE``.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger("libqtile")
+
+NOTIFICATIONS = "org.freedesktop.Notifications"
+NOTIFICATIONS_PATH = "/org/freedesktop/Notifications"
+
+
+class Notifier:
+    """Sends notifications with per-category replace ids, dedupe and rate limits.
+
+    ``bus_address`` connects to a specific bus instead of the session bus,
+    e.g. a private one in a benchmark.
+    """
+
+    def __init__(
+        self,
+        app_name="qtile",
+        dedupe_window=5.0,
+        rate=5,
+        per=30.0,
+        timeout=10000,
+        bus_address=None,
+    ):
+        self.app_name = app_name
+        self.dedupe_window = dedupe_window
+        self.rate = rate
+        self.per = per
+        self.timeout = timeout
+        self.bus_address = bus_address
+        self.sent = 0
+        self.deduped = 0
+        self.limited = 0
+        self.errors = 0
+        self.latencies = []
+        self._ids = {}
+        self._recent = {}
+        self._by_source = collections.defaultdict(collections.deque)
+        self._queue = collections.deque()
+        self._task = None
+        self._bus = None
+
+    def send(self, title, message="", category=None, source="qtile", urgent=False, timeout=None):
+        """Queue a notification; returns False if it was merged or rate limited."""
+        now = time.monotonic()
+        key = (category, title, message)
+        if now - self._recent.get(key, -self.dedupe_window) < self.dedupe_window:
+            self.deduped += 1
+            return False
+        # Urgent messages (critical battery, failures) are never rate limited
+        # and don't use up the source's budget.
+        if not urgent:
+            sent = self._by_source[source]
+            while sent and now - sent[0] >= self.per:
+                sent.popleft()
+            if len(sent) >= self.rate:
+                self.limited += 1
+                logger.debug("notify: rate limited %s: %s", source, title)
+                return False
+            sent.append(now)
+        self._remember(key, now)
+
+        self._queue.append(
+            (title, message, category, urgent, self.timeout if timeout is None else timeout, now)
+        )
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_event_loop().create_task(self._drain())
+            except RuntimeError:
+                logger.warning("notify: no event loop, dropping %s", title)
+                self._queue.clear()
+        return True
+
+    def _remember(self, key, now):
+        self._recent[key] = now
+        if len(self._recent) > 64:
+            self._recent = {
+                k: t for k, t in self._recent.items() if now - t < self.dedupe_window
+            }
+
+    async def _connect(self):
+        if self._bus is None or not self._bus.connected:
+            from dbus_next.aio import MessageBus
+
+            self._bus = await MessageBus(bus_address=self.bus_address).connect()
+        return self._bus
+
+    async def _drain(self):
+        from dbus_next import Message, MessageType, Variant
+
+        while self._queue:
+            title, message, category, urgent, timeout, queued = self._queue.popleft()
+            body = [
+                self.app_name,
+                self._ids.get(category, 0) if category else 0,
+                "",
+                title,
+                message,
+                [],
+                {"urgency": Variant("y", 2 if urgent else 1)},
+                timeout,
+            ]
+            try:
+                bus = await self._connect()
+                reply = await bus.call(
+                    Message(
+                        destination=NOTIFICATIONS,
+                        path=NOTIFICATIONS_PATH,
+                        interface=NOTIFICATIONS,
+                        member="Notify",
+                        signature="susssasa{sv}i",
+                        body=body,
+                    )
+                )
+            except Exception as e:
+                # Reconnect on the next message, the daemon may have restarted.
+                self.errors += 1
+                self._bus = None
+                logger.warning("notify: cannot send %s: %s", title, e)
+                continue
+            if reply.message_type == MessageType.ERROR:
+                self.errors += 1
+                logger.warning("notify: %s: %s", reply.error_name, reply.body)
+                continue
+            if category:
+                self._ids[category] = reply.body[0]
+            self.sent += 1
+            self.latencies.append(time.monotonic() - queued)
+            del self.latencies[:-64]
+
+    def install(self, qtile):
+        """Hook for ``startup``: add the ``notify`` command to the root object."""
+        qtile.cmd_notify = self.cmd_notify
+        qtile.cmd_notify_stats = self.cmd_notify_stats
+
+    def cmd_notify(self, title, message="", category=None, source="cmd", urgent=False):
+        """Send a notification through qtile's connection."""
+        return self.send(title, message, category=category, source=source, urgent=urgent)
+
+    def cmd_notify_stats(self):
+        """Sent, merged, rate limited and failed counts, and send latency."""
+        latencies = sorted(self.latencies)
+        return {
+            "sent": self.sent,
+            "deduped": self.deduped,
+            "limited": self.limited,
+            "errors": self.errors,
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+
+    def close(self):
+        if self._bus is not None:
+            self._bus.disconnect()
+            self._bus = None
+
+
+# Kept across importlib.reload() of this module on config reloads, so the
+# connection, replace ids and rate limits outlive them.
+try:
+    _notifier
+except NameError:
+    _notifier = None
+
+
+def get_notifier(**config):
+    """Return the session-wide notifier, creating it on first use."""
+    global _notifier
+    if _notifier is None:
+        _notifier = Notifier(**config)
+    return _notifier
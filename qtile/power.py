@@ -0,0 +1,233 @@
+"""Power profiles driven by the shared battery state.
+
+On battery the bar keeps sampling at its AC intervals and picom keeps
+fading and animating every window. :class:`PowerProfile` subscribes to the
+:class:`battery.BatteryMonitor` and moves the session between three
+profiles:
+
+* ``ac``: everything as configured
+* ``battery``: discharging. Hub sampling is stretched by ``stretch``, widgets
+  on hidden bars or under fullscreen windows stop sampling, dropdown warming
+  waits, and picom runs with the ``compositor`` overrides
+* ``saver``: discharging below ``saver_level``, the same but stretched by
+  ``saver_stretch``
+
+Plugging in switches back to ``ac`` as soon as the uevent arrives. The
+wakeups per second the process and the hub had in each profile are kept, so
+``qtile cmd-obj -o root -f power_stats`` shows what a profile actually saved.
+"""
+
+import logging
+import os
+import re
+import signal
+import time
+
+logger = logging.getLogger("libqtile")
+
+PROFILES = ("ac", "battery", "saver")
+
+# picom settings swapped in on battery: no fades, no open/close and resize
+# animations, so picom renders frames only when window contents change.
+COMPOSITOR_SAVER = {
+    "fading": "false",
+    "transition-length": "0",
+    "size-transition": "false",
+}
+
+
+def _schedstat():
+    """Times this process was scheduled in, i.e. its wakeups so far."""
+    try:
+        with open("/proc/self/schedstat") as f:
+            return int(f.read().split()[2])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def apply_overrides(text, overrides):
+    """Return a picom config with ``key = value;`` settings replaced or added."""
+    missing = dict(overrides)
+    lines = []
+    for line in text.splitlines():
+        match = re.match(r"\s*([\w-]+)\s*[=:]", line)
+        if match and match.group(1) in missing:
+            key = match.group(1)
+            line = "{} = {};".format(key, missing.pop(key))
+        lines.append(line)
+    lines.extend("{} = {};".format(key, value) for key, value in missing.items())
+    return "\n".join(lines) + "\n"
+
+
+class _Usage:
+    def __init__(self):
+        self.seconds = 0.0
+        self.wakeups = 0
+        self.hub_wakeups = 0
+
+
+class PowerProfile:
+    """Switches the session between the ac, battery and saver profiles.
+
+    ``compositor_config`` is the picom config to start from; the profile
+    writes the one picom should use to ``compositor_target``, so the
+    ``compositor`` service has to be started with ``--config`` pointing
+    there. picom reloads it on SIGUSR1 when the profile goes on or off AC.
+    """
+
+    def __init__(
+        self,
+        monitor,
+        hub,
+        standby=None,
+        supervisor=None,
+        stretch=3,
+        saver_stretch=6,
+        saver_level=0.3,
+        compositor="picom",
+        compositor_config="~/.config/picom/picom.conf",
+        compositor_target="~/.cache/qtile/picom.conf",
+        compositor_overrides=None,
+    ):
+        self.monitor = monitor
+        self.hub = hub
+        self.standby = standby
+        self.supervisor = supervisor
+        self.stretch = stretch
+        self.saver_stretch = saver_stretch
+        self.saver_level = saver_level
+        self.compositor = compositor
+        self.compositor_config = os.path.expanduser(compositor_config)
+        self.compositor_target = os.path.expanduser(compositor_target)
+        self.compositor_overrides = (
+            COMPOSITOR_SAVER if compositor_overrides is None else compositor_overrides
+        )
+        self.profile = "ac"
+        self.switches = 0
+        self.qtile = None
+        self._paused = []
+        self._usage = {name: _Usage() for name in PROFILES}
+        self._since = None
+        self._wakeups = None
+        self._hub_wakeups = None
+
+    def start(self, qtile):
+        """Write picom's config and follow the battery; call before autostart."""
+        self.qtile = qtile
+        self._write_compositor_config()
+        self._mark()
+        self.monitor.subscribe(self.on_state)
+        qtile.cmd_power_stats = self.cmd_power_stats
+
+    def stop(self):
+        self.monitor.unsubscribe(self.on_state)
+
+    def profile_for(self, state):
+        if state is None or state.ac_online or state.status in ("Charging", "Full"):
+            return "ac"
+        if state.percent < self.saver_level:
+            return "saver"
+        return "battery"
+
+    def on_state(self, state):
+        """Battery monitor subscriber."""
+        self.apply(self.profile_for(state))
+
+    def apply(self, profile):
+        if profile == self.profile:
+            return
+        self._mark()
+        logger.info("power: switching from %s to %s", self.profile, profile)
+        previous, self.profile = self.profile, profile
+        self.switches += 1
+
+        scale = {"ac": 1, "battery": self.stretch, "saver": self.saver_stretch}[profile]
+        self.hub.set_scale(scale)
+        if self.standby is not None:
+            self.standby.set_deferred(profile != "ac")
+        self.refresh()
+        if (previous == "ac") != (profile == "ac"):
+            self._write_compositor_config()
+            if self.supervisor is not None:
+                self.supervisor.signal(self.compositor, signal.SIGUSR1)
+
+    def refresh(self, *args):
+        """Hook for changes that can hide a bar: pause the widgets on it."""
+        if self.qtile is None:
+            return
+        hidden = []
+        if self.profile != "ac":
+            for screen in self.qtile.screens:
+                window = screen.group.current_window if screen.group else None
+                covered = window is not None and window.fullscreen
+                for gap in (screen.top, screen.bottom, screen.left, screen.right):
+                    if gap is None or not hasattr(gap, "widgets"):
+                        continue
+                    if covered or not gap.is_show():
+                        hidden.extend(w for w in gap.widgets if hasattr(w, "pause"))
+        for widget in self._paused:
+            if widget not in hidden:
+                widget.resume()
+        for widget in hidden:
+            if widget not in self._paused:
+                widget.pause()
+        self._paused = hidden
+
+    def _write_compositor_config(self):
+        try:
+            with open(self.compositor_config) as f:
+                text = f.read()
+        except OSError as e:
+            # picom is started with --config pointing at the target, so there
+            # always has to be one: an empty config means picom's defaults.
+            logger.warning("power: cannot read %s, using picom defaults: %s", self.compositor_config, e)
+            text = ""
+        if self.profile != "ac":
+            text = apply_overrides(text, self.compositor_overrides)
+        try:
+            os.makedirs(os.path.dirname(self.compositor_target), exist_ok=True)
+            with open(self.compositor_target, "w") as f:
+                f.write(text)
+        except OSError as e:
+            logger.warning("power: cannot write %s: %s", self.compositor_target, e)
+
+    def _mark(self):
+        """Charge the time and wakeups since the last mark to the profile."""
+        now = time.monotonic()
+        wakeups = _schedstat()
+        hub_wakeups = self.hub.wakeups
+        if self._since is not None:
+            usage = self._usage[self.profile]
+            usage.seconds += now - self._since
+            if wakeups is not None and self._wakeups is not None:
+                usage.wakeups += wakeups - self._wakeups
+            usage.hub_wakeups += hub_wakeups - self._hub_wakeups
+        self._since, self._wakeups, self._hub_wakeups = now, wakeups, hub_wakeups
+
+    def cmd_power_stats(self):
+        """Current profile, and time and wakeups per second spent in each."""
+        self._mark()
+        report = {"profile": self.profile, "switches": self.switches, "paused": len(self._paused)}
+        for name, usage in self._usage.items():
+            if usage.seconds:
+                report[name] = {
+                    "seconds": round(usage.seconds),
+                    "wakeups_per_s": round(usage.wakeups / usage.seconds, 2),
+                    "hub_wakeups_per_s": round(usage.hub_wakeups / usage.seconds, 2),
+                }
+        return report
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _profile
+except NameError:
+    _profile = None
+
+
+def get_profile(monitor, hub, **config):
+    """Return the session-wide power profile, creating it on first use."""
+    global _profile
+    if _profile is None:
+        _profile = PowerProfile(monitor, hub, **config)
+    return _profile
@@ -0,0 +1,240 @@
+"""Indexed matcher for window rules.
+
+``RuleSet`` answers "does any of these Match rules apply to this window?"
+with the same result as ``any(win.match(rule) for rule in rules)``, without
+walking every rule for every window:
+
+* plain string rules are joined per property into one NUL-separated
+  haystack, so the include-match Match does for strings (the window's value
+  contained in the rule's) is a single substring search, with a set lookup
+  in front for the common exact case;
+* compiled regex rules on the same property are merged into one alternation;
+* ``net_wm_pid``/``wid`` rules go into a set;
+* multi-property rules are looked up by one of their string properties and
+  only the candidates found get a full ``Match.compare``;
+* anything else (``func`` rules, other values) is checked with
+  ``Match.compare`` as before.
+
+The indexed part only depends on a window's class, instance, role, type and
+(if title rules exist) title, so its result is cached per combination; storms
+of popups from one browser are answered from the cache.
+"""
+
+import re
+from bisect import bisect_right
+from collections import OrderedDict
+
+# Properties whose string rules use Match's include-match.
+_TEXT = ("title", "wm_class", "wm_instance_class", "role", "wm_type")
+# Properties compared with ==.
+_EXACT = ("net_wm_pid", "wid")
+
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _values(client, prop):
+    """The client's values for ``prop`` the way Match.compare reads them."""
+    if prop == "title":
+        value = client.name
+        return () if value is None else (value,)
+    if prop == "wm_class":
+        return tuple(client.get_wm_class() or ())
+    if prop == "wm_instance_class":
+        wm_class = client.get_wm_class()
+        return (wm_class[0],) if wm_class else ()
+    if prop == "role":
+        value = client.get_wm_role()
+    elif prop == "wm_type":
+        value = client.get_wm_type()
+    elif prop == "net_wm_pid":
+        value = client.get_pid()
+    else:
+        value = client.wid
+    return () if value is None else (value,)
+
+
+class _TextIndex:
+    """String and regex rules of one property."""
+
+    def __init__(self):
+        self.strings = []
+        self.patterns = []
+        self.exact = set()
+        self.haystack = ""
+        self.compiled = []
+
+    def build(self):
+        self.exact = set(self.strings)
+        self.haystack = "\0" + "\0".join(self.strings) + "\0" if self.strings else ""
+        self.compiled = _merge_patterns(self.patterns)
+
+    def matches(self, value):
+        if self.strings:
+            if value in self.exact:
+                return True
+            if "\0" not in value:
+                if value in self.haystack:
+                    return True
+            elif any(value in rule for rule in self.strings):
+                return True
+        return any(pattern.match(value) for pattern in self.compiled)
+
+
+class _CandidateIndex:
+    """Multi-property rules keyed by one of their string properties.
+
+    Finds the rules whose string contains the window's value by scanning a
+    joined haystack, so only those few get a full ``compare``.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.rules = []
+        self.starts = []
+        self.haystack = ""
+
+    def build(self):
+        offset = 1
+        for string in self.strings:
+            self.starts.append(offset)
+            offset += len(string) + 1
+        self.haystack = "\0" + "\0".join(self.strings) + "\0"
+
+    def candidates(self, value):
+        if not value or "\0" in value:
+            return [rule for rule, string in zip(self.rules, self.strings) if value in string]
+        found = []
+        find = self.haystack.find
+        pos = find(value)
+        while pos != -1:
+            i = bisect_right(self.starts, pos) - 1
+            found.append(self.rules[i])
+            # Skip to the next rule's string, one hit per rule is enough.
+            pos = find(value, self.starts[i] + len(self.strings[i]) + 1)
+        return found
+
+
+def _merge_patterns(patterns):
+    """Merge patterns into as few alternations as their flags allow."""
+    by_flags = OrderedDict()
+    compiled = []
+    for pattern in patterns:
+        if _BACKREF.search(pattern.pattern):
+            compiled.append(pattern)
+        else:
+            by_flags.setdefault(pattern.flags, []).append(pattern)
+    for flags, group in by_flags.items():
+        if len(group) == 1:
+            compiled.extend(group)
+            continue
+        try:
+            merged = "|".join("(?:{})".format(p.pattern) for p in group)
+            compiled.append(re.compile(merged, flags))
+        except (re.error, TypeError):
+            compiled.extend(group)
+    return compiled
+
+
+class RuleSet:
+    """Compiled form of a list of ``libqtile.config.Match`` rules."""
+
+    def __init__(self, rules, cache_size=1024):
+        self.rules = list(rules)
+        self.source = None
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._text = {}
+        self._exact = {}
+        self._generic = []
+        self._candidates = {}
+        self._cache = OrderedDict()
+
+        for rule in self.rules:
+            items = list(rule._rules.items())
+            if not items:
+                # An empty Match never matches.
+                continue
+            if len(items) > 1:
+                self._add_multi(rule)
+                continue
+            prop, value = items[0]
+            if prop in _TEXT and isinstance(value, str):
+                self._text.setdefault(prop, _TextIndex()).strings.append(value)
+            elif prop in _TEXT and isinstance(value, re.Pattern):
+                self._text.setdefault(prop, _TextIndex()).patterns.append(value)
+            elif prop in _EXACT:
+                self._exact.setdefault(prop, set()).add(value)
+            else:
+                self._generic.append(rule)
+
+        for index in self._text.values():
+            index.build()
+        for index in self._candidates.values():
+            index.build()
+        self._key_props = tuple(
+            prop
+            for prop in ("wm_class", "role", "wm_type", "title")
+            if prop in self._text or (prop == "wm_class" and "wm_instance_class" in self._text)
+        )
+
+    def _add_multi(self, rule):
+        # Every property of a Match has to match, so a string property that
+        # the window fails rules the whole Match out.
+        if "func" not in rule._rules:
+            for prop in ("wm_class", "role", "title", "wm_type", "wm_instance_class"):
+                value = rule._rules.get(prop)
+                if isinstance(value, str):
+                    index = self._candidates.setdefault(prop, _CandidateIndex())
+                    index.strings.append(value)
+                    index.rules.append(rule)
+                    return
+        self._generic.append(rule)
+
+    def matches(self, client):
+        if self._text and self._match_text(client):
+            return True
+        for prop, values in self._exact.items():
+            for value in _values(client, prop):
+                if value in values:
+                    return True
+        for prop, index in self._candidates.items():
+            seen = set()
+            for value in _values(client, prop):
+                for rule in index.candidates(value):
+                    if id(rule) not in seen:
+                        seen.add(id(rule))
+                        if rule.compare(client):
+                            return True
+        return any(rule.compare(client) for rule in self._generic)
+
+    def _match_text(self, client):
+        key = tuple(_values(client, prop) for prop in self._key_props)
+        result = self._cache.get(key)
+        if result is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return result
+        self.misses += 1
+
+        result = False
+        for prop, index in self._text.items():
+            if any(index.matches(value) for value in _values(client, prop)):
+                result = True
+                break
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        return {
+            "rules": len(self.rules),
+            "indexed": len(self.rules) - len(self._generic) - sum(
+                len(index.rules) for index in self._candidates.values()
+            ),
+            "candidate_indexed": sum(len(index.rules) for index in self._candidates.values()),
+            "generic": len(self._generic),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
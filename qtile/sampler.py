@@ -0,0 +1,259 @@
+"""Shared sampling hub for the bar.
+
+Every polled value on the bar (backlight, volume, clock...) is registered
+here instead of keeping its own timer. The hub keeps the sysfs/procfs files
+open and re-reads them with ``pread``, only calls a widget back when its value
+actually changed, and aligns every interval to multiples of one base tick so
+the CPU wakes once per boundary instead of once per widget.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger("libqtile")
+
+# Wake up this much after a boundary so time.time() is already past it.
+_SLACK = 0.002
+
+
+class _Source:
+    __slots__ = ("key", "read", "interval", "parse", "stretch", "value", "callbacks", "due")
+
+    def __init__(self, key, read, interval, parse, stretch):
+        self.key = key
+        self.read = read
+        self.interval = interval
+        self.parse = parse
+        self.stretch = stretch
+        self.value = None
+        self.callbacks = []
+        self.due = 0
+
+
+class _File:
+    """A file kept open and read from offset 0 on every sample."""
+
+    def __init__(self, hub, path, size=4096):
+        self.hub = hub
+        self.path = path
+        self.size = size
+        self.fd = None
+
+    def __call__(self):
+        if self.fd is None:
+            try:
+                self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return None
+        self.hub.reads += 1
+        try:
+            return os.pread(self.fd, self.size, 0).decode().strip()
+        except OSError:
+            self.close()
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SamplingHub:
+    """Coalesces widget polling onto shared, aligned ticks.
+
+    ``tick`` is the base period in seconds; every watched interval is rounded
+    up to a multiple of it and scheduled on wall-clock multiples of that
+    interval, so a 60s clock fires exactly on the minute together with
+    anything else that is due.
+
+    ``set_scale()`` stretches every interval of sources watched with
+    ``stretch=True``, and sources whose callbacks are all paused are not
+    sampled until one of them is resumed.
+    """
+
+    def __init__(self, tick=0.5):
+        self.tick = tick
+        self.scale = 1
+        self.wakeups = 0
+        self.reads = 0
+        self.samples = 0
+        self.changes = 0
+        self._sources = {}
+        self._files = {}
+        self._paused = set()
+        self._timer = None
+        self._loop = None
+
+    def watch_file(self, path, interval, callback, parse=None, stretch=True):
+        """Call ``callback(value)`` whenever the contents of ``path`` change."""
+        reader = self._files.get(path)
+        if reader is None:
+            reader = self._files[path] = _File(self, path)
+        return self._watch(("file", path, parse), reader, interval, callback, parse, stretch)
+
+    def watch(self, func, interval, callback, parse=None, stretch=True):
+        """Call ``callback(value)`` whenever ``func()`` returns something new."""
+        return self._watch(("func", func, parse), func, interval, callback, parse, stretch)
+
+    def _watch(self, key, read, interval, callback, parse, stretch):
+        interval = self.align(interval)
+        key = key + (interval, stretch)
+        source = self._sources.get(key)
+        if source is None:
+            source = self._sources[key] = _Source(key, read, interval, parse, stretch)
+            source.due = self._next_due(self._interval(source), time.time())
+            self._sample(source)
+        source.callbacks.append(callback)
+        if source.value is not None:
+            callback(source.value)
+        self._reschedule()
+        return key, callback
+
+    def unwatch(self, handle):
+        key, callback = handle
+        self._paused.discard(handle)
+        source = self._sources.get(key)
+        if source is None:
+            return
+        try:
+            source.callbacks.remove(callback)
+        except ValueError:
+            pass
+        if not source.callbacks:
+            del self._sources[key]
+            if key[0] == "file" and not any(k[1] == key[1] for k in self._sources):
+                self._files.pop(key[1]).close()
+            self._reschedule()
+
+    def poke(self, key_path, value):
+        """Push a value that is already known, e.g. right after writing it."""
+        for source in self._sources.values():
+            if source.key[1] == key_path:
+                self._update(source, value)
+
+    def set_scale(self, scale):
+        """Sample stretchable sources ``scale`` times less often."""
+        if scale == self.scale:
+            return
+        self.scale = scale
+        now = time.time()
+        for source in self._sources.values():
+            if source.stretch:
+                source.due = self._next_due(self._interval(source), now)
+        self._reschedule()
+
+    def pause(self, handle):
+        """Stop sampling for one ``watch()`` handle, e.g. of a hidden widget."""
+        self._paused.add(handle)
+        self._reschedule()
+
+    def resume(self, handle):
+        """Undo ``pause()``; a source that was not sampled meanwhile is read now."""
+        if handle not in self._paused:
+            return
+        self._paused.discard(handle)
+        source = self._sources.get(handle[0])
+        if source is not None and source.due <= time.time():
+            self._sample(source)
+            source.due = self._next_due(self._interval(source), time.time())
+        self._reschedule()
+
+    def _active(self, source):
+        return any((source.key, callback) not in self._paused for callback in source.callbacks)
+
+    def _interval(self, source):
+        if source.stretch and self.scale != 1:
+            return self.align(source.interval * self.scale)
+        return source.interval
+
+    def align(self, interval):
+        return max(self.tick, math.ceil(interval / self.tick - 1e-9) * self.tick)
+
+    @staticmethod
+    def _next_due(interval, now):
+        return (math.floor(now / interval) + 1) * interval
+
+    def _sample(self, source):
+        self.samples += 1
+        try:
+            raw = source.read()
+        except Exception:
+            logger.exception("sampler: reading %s failed", source.key[1])
+            return
+        if raw is None:
+            return
+        self._update(source, raw)
+
+    def _update(self, source, raw):
+        value = source.parse(raw) if source.parse else raw
+        if value == source.value:
+            return
+        source.value = value
+        self.changes += 1
+        for callback in list(source.callbacks):
+            try:
+                callback(value)
+            except Exception:
+                logger.exception("sampler: callback failed")
+
+    def _reschedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        active = [source for source in self._sources.values() if self._active(source)]
+        if not active:
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        due = min(source.due for source in active)
+        delay = max(due - time.time(), 0) + _SLACK
+        self._timer = self._loop.call_later(delay, self._on_tick)
+
+    def _on_tick(self):
+        self._timer = None
+        self.wakeups += 1
+        now = time.time()
+        for source in list(self._sources.values()):
+            if source.due <= now and self._active(source):
+                self._sample(source)
+                source.due = self._next_due(self._interval(source), now)
+        self._reschedule()
+
+    def stats(self):
+        return {
+            "sources": len(self._sources),
+            "paused": len(self._paused),
+            "scale": self.scale,
+            "files": len(self._files),
+            "wakeups": self.wakeups,
+            "reads": self.reads,
+            "samples": self.samples,
+            "changes": self.changes,
+        }
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for reader in self._files.values():
+            reader.close()
+        self._files.clear()
+        self._sources.clear()
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _hub
+except NameError:
+    _hub = None
+
+
+def get_hub(**config):
+    """Return the session-wide hub, creating it on first use."""
+    global _hub
+    if _hub is None:
+        _hub = SamplingHub(**config)
+    return _hub
@@ -0,0 +1,378 @@
+"""Group and layout state kept across config reloads and restarts.
+
+``reload_config`` rebuilds every group with its first layout and re-adds the
+windows in the order they were first managed, and a restart additionally
+forgets ratios and column widths, so shuffles, ``grow_*`` adjustments and
+per-group layout choices are lost. :class:`Snapshot` keeps a small binary
+file with, per group, the current layout, its sizing parameters, the window
+order and the focused window.
+
+The file is rewritten shortly after a change, re-encoding only the groups
+that changed, synchronously when qtile restarts, and from the config itself
+while a reload imports it (the old groups still exist at that point). On
+load it is mapped back in one go: windows are handed to their groups in the
+saved order, each layout's window order is then set to the saved one where
+it differs (layouts insert new windows at the head or beside the focused
+one, and after a restart qtile adopts windows in stacking order), and the
+saved ratios and sizes are put back once the windows are in.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+
+logger = logging.getLogger("libqtile")
+
+_MAGIC = b"QSN1"
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_F64 = struct.Struct("<d")
+
+
+def _columns_get(layout):
+    return {
+        "widths": [column.width for column in layout.columns],
+        "counts": [len(column) for column in layout.columns],
+        "splits": [int(column.split) for column in layout.columns],
+        "heights": [column.heights[c] for column in layout.columns for c in column.clients],
+    }
+
+
+def _columns_set(layout, params, windows):
+    # The window order alone doesn't say which column each window is in, so
+    # the columns are rebuilt from the saved sizes.
+    present = set(layout.get_windows())
+    clients = [win for win in windows if win in present]
+    counts = [int(n) for n in params.get("counts", [])]
+    if not counts or sum(counts) != len(clients) or 0 in counts:
+        return
+    column_class = type(layout.columns[0])
+    heights = iter(params.get("heights") or [100] * len(clients))
+    columns = []
+    start = 0
+    for n, width, split in zip(counts, params["widths"], params["splits"]):
+        column = column_class(bool(split), layout.insert_position, int(width))
+        column.clients = clients[start:start + n]
+        column.heights = {c: int(next(heights, 100)) for c in column.clients}
+        columns.append(column)
+        start += n
+    layout.columns = columns
+    layout.current = 0
+
+
+def _monad_get(layout):
+    return {"ratio": [layout.ratio], "relative_sizes": list(layout.relative_sizes)}
+
+
+def _monad_set(layout, params, windows):
+    if "ratio" in params:
+        layout.ratio = params["ratio"][0]
+    sizes = params.get("relative_sizes")
+    if sizes and len(sizes) == len(layout.clients) - 1:
+        layout.relative_sizes = list(sizes)
+        layout.do_normalize = False
+
+
+def _tile_get(layout):
+    return {"ratio": [layout.ratio], "master": [layout.master]}
+
+
+def _tile_set(layout, params, windows):
+    if "ratio" in params:
+        layout.ratio = params["ratio"][0]
+    if "master" in params:
+        layout.master = int(params["master"][0])
+
+
+def _matrix_get(layout):
+    return {"columns": [layout.columns]}
+
+
+def _matrix_set(layout, params, windows):
+    if "columns" in params:
+        layout.columns = int(params["columns"][0])
+
+
+# Layout class name -> (read parameters, put them back given the group's
+# windows in saved order).
+LAYOUT_STATE = {
+    "Columns": (_columns_get, _columns_set),
+    "MonadTall": (_monad_get, _monad_set),
+    "MonadWide": (_monad_get, _monad_set),
+    "Tile": (_tile_get, _tile_set),
+    "Matrix": (_matrix_get, _matrix_set),
+}
+
+
+def _state_for(layout):
+    for cls in type(layout).__mro__:
+        if cls.__name__ in LAYOUT_STATE:
+            return LAYOUT_STATE[cls.__name__]
+    return None
+
+
+class GroupState:
+    def __init__(self, name, layout, focused, windows, params):
+        self.name = name
+        self.layout = layout
+        self.focused = focused
+        self.windows = windows
+        self.params = params
+
+    @classmethod
+    def of(cls, group):
+        layouts = {}
+        for layout in group.layouts:
+            state = _state_for(layout)
+            if state is not None:
+                try:
+                    layouts[layout.name] = state[0](layout)
+                except AttributeError:
+                    pass
+        current = group.current_window
+        return cls(
+            group.name,
+            group.layout.name,
+            current.wid if current is not None else 0,
+            [win.wid for win in _ordered_windows(group)],
+            layouts,
+        )
+
+    def encode(self):
+        out = [_str(self.name), _str(self.layout), _U32.pack(self.focused)]
+        out.append(_U32.pack(len(self.windows)))
+        out.extend(_U32.pack(wid) for wid in self.windows)
+        out.append(_U16.pack(len(self.params)))
+        for layout, params in self.params.items():
+            out.append(_str(layout))
+            out.append(_U16.pack(len(params)))
+            for key, values in params.items():
+                out.append(_str(key))
+                out.append(_U16.pack(len(values)))
+                out.extend(_F64.pack(value) for value in values)
+        return b"".join(out)
+
+    @classmethod
+    def decode(cls, buf, pos):
+        name, pos = _read_str(buf, pos)
+        layout, pos = _read_str(buf, pos)
+        (focused,) = _U32.unpack_from(buf, pos)
+        (count,) = _U32.unpack_from(buf, pos + 4)
+        pos += 8
+        windows = list(struct.unpack_from("<{}I".format(count), buf, pos))
+        pos += 4 * count
+        (nlayouts,) = _U16.unpack_from(buf, pos)
+        pos += 2
+        params = {}
+        for _ in range(nlayouts):
+            layout_name, pos = _read_str(buf, pos)
+            (nparams,) = _U16.unpack_from(buf, pos)
+            pos += 2
+            values = params[layout_name] = {}
+            for _ in range(nparams):
+                key, pos = _read_str(buf, pos)
+                (n,) = _U16.unpack_from(buf, pos)
+                values[key] = list(struct.unpack_from("<{}d".format(n), buf, pos + 2))
+                pos += 2 + 8 * n
+        return cls(name, layout, focused, windows, params), pos
+
+
+def _ordered_windows(group):
+    """The group's tiled windows in layout order, then the rest."""
+    try:
+        ordered = list(group.layout.get_windows())
+    except (AttributeError, NotImplementedError):
+        ordered = []
+    seen = set(ordered)
+    return ordered + [win for win in group.windows if win not in seen]
+
+
+def _str(value):
+    data = value.encode()
+    return _U16.pack(len(data)) + data
+
+
+def _read_str(buf, pos):
+    (n,) = _U16.unpack_from(buf, pos)
+    return bytes(buf[pos + 2:pos + 2 + n]).decode(), pos + 2 + n
+
+
+def encode(groups, encoded=None):
+    """Serialise ``GroupState``s; ``encoded`` holds blobs that can be reused."""
+    blobs = [encoded[g.name] if encoded and g.name in encoded else g.encode() for g in groups]
+    return b"".join([_MAGIC, _U16.pack(len(blobs))] + blobs)
+
+
+def decode(buf):
+    if bytes(buf[:4]) != _MAGIC:
+        raise ValueError("not a snapshot")
+    (count,) = _U16.unpack_from(buf, 4)
+    pos = 6
+    groups = []
+    for _ in range(count):
+        group, pos = GroupState.decode(buf, pos)
+        groups.append(group)
+    return groups
+
+
+class Snapshot:
+    """Saves and restores :class:`GroupState` for every regular group."""
+
+    def __init__(self, path="~/.cache/qtile/session.bin", delay=2.0):
+        self.path = os.path.expanduser(path)
+        self.delay = delay
+        self.writes = 0
+        self.restored = 0
+        self._encoded = {}
+        self._dirty = set()
+        self._timer = None
+        self._qtile = None
+
+    def _groups(self, qtile):
+        # ScratchPads are restored by qtile itself.
+        return [g for g in qtile.groups if not hasattr(g, "dropdowns")]
+
+    def capture(self, qtile):
+        """Write the state of every group now."""
+        groups = self._groups(qtile) if qtile is not None else []
+        if not groups:
+            return
+        self._dirty = {g.name for g in groups}
+        self._write(groups)
+
+    def changed(self, *args):
+        """Hook for state changes: rewrite the current group soon."""
+        qtile = self._qtile
+        if qtile is None or qtile.current_group is None:
+            return
+        # Hooks pass the group, a window that knows its group, or nothing.
+        group = next((a for a in args if hasattr(a, "layouts")), None)
+        if group is None:
+            group = next((a.group for a in args if getattr(a, "group", None)), None)
+        self._dirty.add((group or qtile.current_group).name)
+        if self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.delay, self._flush)
+
+    def _flush(self):
+        self._timer = None
+        if self._qtile is not None:
+            self._write(self._groups(self._qtile))
+
+    def _write(self, groups):
+        for group in groups:
+            if group.name in self._dirty or group.name not in self._encoded:
+                self._encoded[group.name] = GroupState.of(group).encode()
+        self._dirty.clear()
+        data = encode(groups, self._encoded)
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+            self.writes += 1
+        except OSError as e:
+            logger.warning("snapshot: cannot write %s: %s", self.path, e)
+
+    def read(self):
+        try:
+            with open(self.path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    return decode(buf)
+        except (OSError, ValueError, struct.error) as e:
+            logger.debug("snapshot: nothing to restore from %s: %s", self.path, e)
+            return []
+
+    def restore(self, qtile):
+        """Hook for ``startup``: put the saved state back once windows are grouped."""
+        self._qtile = qtile
+        states = {state.name: state for state in self.read()}
+        if not states:
+            return
+
+        # Windows are handed to groups in windows_map order after this hook;
+        # ordering it by the saved layouts makes them add in that order.
+        order = [wid for state in states.values() for wid in state.windows]
+        rank = {wid: i for i, wid in enumerate(order)}
+        windows = sorted(qtile.windows_map.items(), key=lambda item: rank.get(item[0], len(rank)))
+        qtile.windows_map.clear()
+        qtile.windows_map.update(windows)
+
+        for name, state in states.items():
+            group = qtile.groups_map.get(name)
+            if group is not None and group.layout.name != state.layout:
+                group.layout = state.layout
+        asyncio.get_event_loop().call_soon(self._finish, qtile, states)
+
+    def _finish(self, qtile, states):
+        for name, state in states.items():
+            group = qtile.groups_map.get(name)
+            if group is None:
+                continue
+            windows = self._reorder(group, state.windows)
+            for layout in group.layouts:
+                state_for = _state_for(layout)
+                if state_for is not None and layout.name in state.params:
+                    state_for[1](layout, state.params[layout.name], windows)
+            focused = qtile.windows_map.get(state.focused)
+            if focused is not None and focused in group.windows:
+                group.focus(focused, warp=False)
+            if group.screen is not None:
+                group.layout_all()
+            self.restored += 1
+        self._encoded.clear()
+
+    def _reorder(self, group, saved):
+        # Layouts don't keep the order windows are added in (Tile puts them
+        # at the head, MonadTall next to the focused one), and after a
+        # restart windows are managed in stacking order anyway, so the saved
+        # order is put back in every layout here.
+        tiled = [win for win in _ordered_windows(group) if not win.floating]
+        rank = {wid: i for i, wid in enumerate(saved)}
+        wanted = sorted(tiled, key=lambda win: rank.get(win.wid, len(rank)))
+        for layout in group.layouts:
+            try:
+                current = list(layout.get_windows())
+            except (AttributeError, NotImplementedError):
+                continue
+            order = [win for win in wanted if win in current]
+            if order == current:
+                continue
+            clients = getattr(layout, "clients", None)
+            if isinstance(getattr(clients, "clients", None), list):
+                # A _ClientList: set the order outright, keeping its focus.
+                focused = clients.current_client
+                clients.clients = order + [win for win in clients.clients if win not in order]
+                if focused is not None:
+                    clients.current_client = focused
+            else:
+                for win in current:
+                    layout.remove(win)
+                for win in order:
+                    layout.add(win)
+        return wanted
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "writes": self.writes,
+            "groups_restored": self.restored,
+            "pending": sorted(self._dirty),
+        }
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _snapshot
+except NameError:
+    _snapshot = None
+
+
+def get_snapshot(**config):
+    """Return the session-wide snapshot, creating it on first use."""
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = Snapshot(**config)
+    return _snapshot
@@ -0,0 +1,257 @@
+"""Warm-standby ScratchPad dropdowns.
+
+Once the session has gone idle after login, the configured dropdowns are
+spawned one at a time straight into the hidden scratchpad, so even the first
+toggle just moves an existing window. Available memory is watched through
+the sampling hub; when it drops below the threshold the least recently used
+hidden dropdowns are closed again, and toggling them later simply spawns
+them the normal way. A dropdown is only ever pre-spawned once, before its
+first use.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("libqtile")
+
+# ScratchPad has no public way to spawn a dropdown hidden, so _ScratchPad
+# reaches into its private state. It was written against these versions; on
+# others the attributes are checked first and warming is off without them.
+SCRATCHPAD_VERSIONS = ("0.21", "0.22")
+SCRATCHPAD_PRIVATE = ("_dropdownconfig", "_spawned", "_to_hide", "_spawn")
+
+
+def mem_available_mb(meminfo):
+    for line in meminfo.splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) // 1024
+    return None
+
+
+def load_average():
+    try:
+        with open("/proc/loadavg") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError):
+        return 0.0
+
+
+def qtile_version():
+    try:
+        from importlib.metadata import version
+
+        return version("qtile")
+    except Exception:
+        return None
+
+
+class _ScratchPad:
+    """The only place that touches ScratchPad internals."""
+
+    def __init__(self, group):
+        self.group = group
+
+    @staticmethod
+    def supported(group):
+        version = qtile_version()
+        missing = [name for name in SCRATCHPAD_PRIVATE if not hasattr(group, name)]
+        if missing:
+            logger.warning(
+                "standby: ScratchPad of qtile %s lacks %s, not warming dropdowns",
+                version, ", ".join(missing),
+            )
+            return False
+        if version is not None and not version.startswith(SCRATCHPAD_VERSIONS):
+            logger.info("standby: ScratchPad internals untested with qtile %s", version)
+        return True
+
+    def names(self):
+        return list(self.group._dropdownconfig)
+
+    def spawned(self, name):
+        return name in self.group.dropdowns or name in self.group._spawned
+
+    def spawn_hidden(self, name):
+        # qtile hides dropdowns listed in _to_hide as soon as their window
+        # shows up.
+        self.group._to_hide.append(name)
+        self.group._spawn(self.group._dropdownconfig[name])
+
+
+class WarmStandby:
+    """Keeps scratchpad dropdowns spawned and hidden until first use.
+
+    A dropdown is only pre-spawned while the user has never toggled it, and
+    at most once unless low memory freed it: one the user closed stays
+    closed.
+
+    ``idle_delay`` seconds without new windows and a 1-minute load average
+    below ``max_load`` count as idle. Dropdowns are freed, least recently
+    used first, while MemAvailable is under ``min_available_mb``, and only
+    warmed again once it is back above that plus ``rewarm_margin_mb``.
+    """
+
+    def __init__(
+        self,
+        scratchpad="scratchpad",
+        names=None,
+        enabled=True,
+        idle_delay=20,
+        max_load=1.0,
+        min_available_mb=800,
+        rewarm_margin_mb=400,
+        memory_interval=10,
+        hub=None,
+    ):
+        self.scratchpad = scratchpad
+        self.names = names
+        self.enabled = enabled
+        self.idle_delay = idle_delay
+        self.max_load = max_load
+        self.min_available_mb = min_available_mb
+        self.rewarm_margin_mb = rewarm_margin_mb
+        self.memory_interval = memory_interval
+        self.hub = hub
+        self.warmed = 0
+        self.freed = 0
+        self.deferred = False
+        self.qtile = None
+        self._last_used = {}
+        self._warmed_names = set()
+        self._supported = None
+        self._last_activity = time.monotonic()
+        self._available = None
+        self._timer = None
+        self._watch = None
+        self._loop = None
+
+    def _group(self):
+        return self.qtile.groups_map.get(self.scratchpad) if self.qtile else None
+
+    def _scratchpad(self):
+        group = self._group()
+        if group is None:
+            return None
+        if self._supported is None:
+            self._supported = _ScratchPad.supported(group)
+        return _ScratchPad(group) if self._supported else None
+
+    def start(self, qtile):
+        if not self.enabled or self._loop is not None:
+            return
+        self.qtile = qtile
+        self._loop = asyncio.get_event_loop()
+        if self.hub is not None:
+            self._watch = self.hub.watch_file(
+                "/proc/meminfo", self.memory_interval, self._on_memory, mem_available_mb
+            )
+        self._schedule(self.idle_delay)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._watch is not None:
+            self.hub.unwatch(self._watch)
+            self._watch = None
+        self._loop = None
+
+    def activity(self, *args):
+        """Hook for ``client_new``: postpones warming while windows open."""
+        self._last_activity = time.monotonic()
+
+    def toggle(self, qtile, name):
+        """Toggle dropdown ``name``, recording its use for LRU freeing."""
+        self._last_used[name] = time.monotonic()
+        group = qtile.groups_map[self.scratchpad]
+        group.cmd_dropdown_toggle(name)
+
+    def set_deferred(self, deferred):
+        """Hold off warming, e.g. on battery; warming resumes when idle again."""
+        self.deferred = deferred
+        if not deferred:
+            self._schedule(self.idle_delay)
+
+    def _schedule(self, delay):
+        if self._loop is not None and self._timer is None:
+            self._timer = self._loop.call_later(delay, self._tick)
+
+    def _tick(self):
+        self._timer = None
+        scratchpad = self._scratchpad()
+        if scratchpad is None or self.deferred:
+            return
+        idle_for = time.monotonic() - self._last_activity
+        if idle_for < self.idle_delay:
+            self._schedule(self.idle_delay - idle_for)
+            return
+        if load_average() > self.max_load:
+            self._schedule(self.idle_delay)
+            return
+        if self._available is not None and (
+            self._available < self.min_available_mb + self.rewarm_margin_mb
+        ):
+            return
+
+        for name in self.names or scratchpad.names():
+            if name in self._warmed_names or name in self._last_used or scratchpad.spawned(name):
+                continue
+            scratchpad.spawn_hidden(name)
+            self._warmed_names.add(name)
+            self.warmed += 1
+            # One at a time, so the session stays responsive.
+            self._schedule(self.idle_delay / 4)
+            return
+
+    def _on_memory(self, available):
+        self._available = available
+        if available is None:
+            return
+        if available < self.min_available_mb:
+            self._free_one()
+        elif available >= self.min_available_mb + self.rewarm_margin_mb:
+            self._schedule(self.idle_delay)
+
+    def _free_one(self):
+        group = self._group()
+        if group is None:
+            return
+        hidden = [
+            (self._last_used.get(name, 0), name)
+            for name, dropdown in group.dropdowns.items()
+            if not dropdown.visible
+        ]
+        if not hidden:
+            return
+        _, name = min(hidden)
+        logger.info("standby: low memory, closing hidden dropdown %s", name)
+        group.dropdowns[name].window.kill()
+        if name not in self._last_used:
+            # Never opened, so it may be warmed again once memory recovers.
+            self._warmed_names.discard(name)
+        self.freed += 1
+
+    def stats(self):
+        group = self._group()
+        return {
+            "warmed": self.warmed,
+            "freed": self.freed,
+            "available_mb": self._available,
+            "ready": sorted(group.dropdowns) if group else [],
+        }
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _standby
+except NameError:
+    _standby = None
+
+
+def get_standby(**config):
+    """Return the session-wide standby manager, creating it on first use."""
+    global _standby
+    if _standby is None:
+        _standby = WarmStandby(**config)
+    return _standby
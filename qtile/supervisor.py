@@ -0,0 +1,359 @@
+"""Autostart supervisor.
+
+Replaces ``autostart.sh``: services are declared with their dependencies,
+independent ones are started in parallel on qtile's event loop, dependants
+wait for a readiness signal rather than a fixed order, and crashed daemons
+are restarted with exponential backoff. Nothing here blocks the loop, so the
+first frame of the session is drawn before any service has started.
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import signal
+import time
+
+logger = logging.getLogger("libqtile")
+
+# Exit statuses that mean somebody stopped the service on purpose.
+_STOPPED = (0, -signal.SIGTERM, -signal.SIGINT)
+
+
+class Service:
+    """A program started at login.
+
+    ``after`` names services that must be ready first. A ``oneshot`` service
+    is ready once it exited successfully; a daemon is ready once
+    ``ready_check`` (a coroutine function returning a bool, polled until
+    ``ready_timeout``) succeeds, or ``ready_delay`` seconds after it started.
+    ``restart`` is one of "on-failure", "always" or "never".
+    """
+
+    def __init__(
+        self,
+        name,
+        command,
+        after=(),
+        oneshot=False,
+        ready_check=None,
+        ready_delay=0,
+        ready_timeout=10,
+        restart="on-failure",
+        max_backoff=60,
+    ):
+        self.name = name
+        self.argv = shlex.split(command) if isinstance(command, str) else list(command)
+        self.after = tuple(after)
+        self.oneshot = oneshot
+        self.ready_check = ready_check
+        self.ready_delay = ready_delay
+        self.ready_timeout = ready_timeout
+        self.restart = restart
+        self.max_backoff = max_backoff
+
+    def spec(self):
+        """What a config reload compares to decide whether to restart.
+
+        ``ready_check`` is left out: it is a new closure on every reload.
+        """
+        return (
+            self.argv,
+            self.after,
+            self.oneshot,
+            self.ready_delay,
+            self.ready_timeout,
+            self.restart,
+            self.max_backoff,
+        )
+
+
+class _State:
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.status = "waiting"
+        self.pid = None
+        self.proc = None
+        self.started = None
+        self.ready_after = None
+        self.restarts = 0
+        self.returncode = None
+
+
+class Supervisor:
+    """Starts and watches a set of :class:`Service`.
+
+    ``stable_after`` is how long a daemon must stay up for its restart
+    backoff to reset, and ``stop_timeout`` how long a restart on reload waits
+    for the old process to exit. Each service's output goes to
+    ``<log_dir>/<name>.log``, started afresh each session; with
+    ``log_dir=None`` it is discarded.
+    """
+
+    def __init__(
+        self, services, stable_after=30, stop_timeout=5, log_dir="~/.cache/qtile/autostart"
+    ):
+        self.services = self._index(services)
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.log_dir = os.path.expanduser(log_dir) if log_dir else None
+        self._states = {}
+        self._tasks = {}
+        self._loop = None
+        self._t0 = None
+        self._stopping = False
+
+    @staticmethod
+    def _index(services):
+        index = {service.name: service for service in services}
+        for service in services:
+            for dep in service.after:
+                if dep not in index:
+                    raise ValueError("{} depends on unknown service {}".format(service.name, dep))
+        return index
+
+    def start(self, loop=None):
+        """Schedule every service; returns immediately."""
+        if self._tasks:
+            return
+        self._loop = loop or asyncio.get_event_loop()
+        self._t0 = time.monotonic()
+        for name in self.services:
+            self._launch(name)
+
+    def _launch(self, name, previous=None):
+        self._states[name] = _State()
+        self._tasks[name] = self._loop.create_task(
+            self._supervise(self.services[name], previous)
+        )
+
+    def stop(self):
+        """Stop supervising; running daemons are left alone."""
+        self._stopping = True
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+
+    def update(self, services):
+        """Switch to a new service list, as on a config reload.
+
+        Once started, services that were added are started, removed ones are
+        stopped and ones whose :meth:`Service.spec` changed are restarted;
+        the rest keep running untouched.
+        """
+        new = self._index(services)
+        old, self.services = self.services, new
+        if self._loop is None or self._stopping:
+            return
+        stopped = {}
+        for name in old:
+            if name not in new or old[name].spec() != new[name].spec():
+                stopped[name] = self._terminate(name)
+        for name in new:
+            if name not in old or old[name].spec() != new[name].spec():
+                logger.info("autostart: %s %s", "restarting" if name in old else "starting", name)
+                self._launch(name, stopped.get(name))
+
+    def _terminate(self, name):
+        """Stop supervising ``name`` and SIGTERM it; returns the process."""
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        state = self._states.pop(name, None)
+        if state is None or state.status != "running" or state.proc is None:
+            return None
+        try:
+            # Started in its own session, so this reaches its children too.
+            os.killpg(state.proc.pid, signal.SIGTERM)
+        except OSError as e:
+            logger.warning("autostart: cannot stop %s: %s", name, e)
+            return None
+        return state.proc
+
+    async def wait_ready(self, *names):
+        await asyncio.gather(*(self._states[name].ready.wait() for name in names))
+
+    async def _supervise(self, service, previous=None):
+        state = self._states[service.name]
+        if previous is not None:
+            # Don't run two copies of a restarted daemon side by side.
+            try:
+                await asyncio.wait_for(previous.wait(), self.stop_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("autostart: old %s still running, starting anyway", service.name)
+        if service.after:
+            await self.wait_ready(*service.after)
+
+        backoff = 1
+        while not self._stopping:
+            started = time.monotonic()
+            log = asyncio.subprocess.DEVNULL
+            try:
+                if self.log_dir is not None:
+                    os.makedirs(self.log_dir, exist_ok=True)
+                    # Appended to across crash restarts so the output of the crash stays.
+                    log = open(
+                        os.path.join(self.log_dir, service.name + ".log"),
+                        "ab" if state.restarts else "wb",
+                    )
+                proc = await asyncio.create_subprocess_exec(
+                    *service.argv,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True,
+                )
+            except OSError as e:
+                logger.warning("autostart: cannot start %s: %s", service.name, e)
+                state.status = "failed"
+                state.ready.set()
+                return
+            finally:
+                if log is not asyncio.subprocess.DEVNULL:
+                    log.close()
+
+            state.pid = proc.pid
+            state.proc = proc
+            state.status = "running"
+            if state.started is None:
+                state.started = started - self._t0
+
+            if service.oneshot:
+                state.returncode = await proc.wait()
+                state.status = "done" if state.returncode == 0 else "failed"
+                self._mark_ready(state)
+                return
+
+            waiter = asyncio.ensure_future(proc.wait())
+            if not state.ready.is_set():
+                await self._wait_for_readiness(service, state, waiter)
+            state.returncode = await waiter
+            state.status = "exited"
+
+            if service.restart == "never" or (
+                service.restart == "on-failure" and state.returncode in _STOPPED
+            ):
+                return
+            if time.monotonic() - started > self.stable_after:
+                backoff = 1
+            logger.warning(
+                "autostart: %s exited with %s, restarting in %ss",
+                service.name,
+                state.returncode,
+                backoff,
+            )
+            state.status = "backoff"
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, service.max_backoff)
+            state.restarts += 1
+
+    async def _wait_for_readiness(self, service, state, waiter):
+        deadline = time.monotonic() + service.ready_timeout
+        if service.ready_delay:
+            await asyncio.wait([waiter], timeout=service.ready_delay)
+        ready = False
+        if service.ready_check is not None:
+            while not waiter.done() and time.monotonic() < deadline:
+                try:
+                    if await service.ready_check():
+                        ready = True
+                        break
+                except Exception:
+                    logger.debug("autostart: readiness check failed", exc_info=True)
+                await asyncio.wait([waiter], timeout=0.1)
+        if not ready and waiter.done():
+            logger.warning(
+                "autostart: %s exited with %s before it was ready",
+                service.name,
+                waiter.result(),
+            )
+        elif service.ready_check is not None and not ready:
+            logger.warning(
+                "autostart: %s did not become ready in %ss", service.name, service.ready_timeout
+            )
+        # Dependants are released even if readiness timed out or the daemon
+        # died, rather than stalling the rest of the session.
+        self._mark_ready(state)
+
+    def _mark_ready(self, state):
+        if state.ready_after is None:
+            state.ready_after = time.monotonic() - self._t0
+        state.ready.set()
+
+    def signal(self, name, signum):
+        """Send ``signum`` to a running service; False if it isn't running."""
+        state = self._states.get(name)
+        if state is None or state.status != "running" or state.pid is None:
+            return False
+        try:
+            os.kill(state.pid, signum)
+        except OSError as e:
+            logger.warning("autostart: cannot signal %s: %s", name, e)
+            return False
+        return True
+
+    def stats(self):
+        """Per-service status and startup timings in seconds since start()."""
+        return {
+            name: {
+                "status": state.status,
+                "pid": state.pid,
+                "started": state.started,
+                "ready": state.ready_after,
+                "restarts": state.restarts,
+                "returncode": state.returncode,
+            }
+            for name, state in self._states.items()
+        }
+
+
+def bus_name_owned(name):
+    """Make a ``ready_check`` that waits for ``name`` on the session bus."""
+    bus = None
+
+    async def check():
+        nonlocal bus
+        from dbus_next import Message
+        from dbus_next.aio import MessageBus
+
+        if bus is None:
+            bus = await MessageBus().connect()
+        reply = await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="NameHasOwner",
+                signature="s",
+                body=[name],
+            )
+        )
+        if reply.body[0]:
+            bus.disconnect()
+            bus = None
+            return True
+        return False
+
+    return check
+
+
+# Kept across importlib.reload() of this module on config reloads so the
+# session keeps supervising what it started.
+try:
+    _supervisor
+except NameError:
+    _supervisor = None
+
+
+def get_supervisor(services, **config):
+    """Return the session-wide supervisor, creating it on first use.
+
+    On later calls the supervisor is switched to ``services``, so config
+    reloads start, stop and restart what changed.
+    """
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = Supervisor(services, **config)
+    else:
+        _supervisor.update(services)
+    return _supervisor
@@ -0,0 +1,175 @@
+"""Decoded image surface cache.
+
+``widget.Image`` and ``CurrentLayoutIcon`` read and decode their PNGs again
+on every config reload and every screen reconfigure. :class:`SurfaceCache`
+keeps the decoded, already scaled cairo surfaces for the whole process,
+keyed by a hash of the file's content and the target size, so reloads and
+monitor hotplugs only cost a stat() per image. Entries are evicted least
+recently used first once ``budget_kb`` is exceeded. With ``cache_dir`` set,
+decoded pixels are also written to disk, and the first start of a session
+reads them back instead of decoding.
+"""
+
+import hashlib
+import logging
+import os
+import struct
+from collections import OrderedDict
+
+logger = logging.getLogger("libqtile")
+
+# magic, width, height, stride
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"QSC1"
+
+
+class SurfaceCache:
+    """LRU cache of decoded image surfaces, bounded by their pixel size."""
+
+    def __init__(self, budget_kb=8192, cache_dir=None):
+        self.budget = budget_kb * 1024
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.decodes = 0
+        self.evictions = 0
+        self._surfaces = OrderedDict()
+        self._digests = {}
+
+    def digest(self, path):
+        """Content hash of ``path``; only re-read when its stat changes."""
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        known = self._digests.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+        with open(path, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        self._digests[path] = (stamp, digest)
+        return digest
+
+    def surface(self, path, width=None, height=None):
+        """Return an ImageSurface of ``path`` scaled to ``width``x``height``.
+
+        If only one of them is given the aspect ratio is kept, if neither is
+        the image keeps its own size.
+        """
+        path = os.path.expanduser(path)
+        key = (self.digest(path), width, height)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+
+        surface = self._load(key)
+        if surface is None:
+            surface = self._decode(path, width, height)
+            self.decodes += 1
+            self._store(key, surface)
+        else:
+            self.disk_hits += 1
+
+        self._surfaces[key] = surface
+        self.size += _nbytes(surface)
+        while self.size > self.budget and len(self._surfaces) > 1:
+            _, old = self._surfaces.popitem(last=False)
+            self.size -= _nbytes(old)
+            self.evictions += 1
+        return surface
+
+    def _decode(self, path, width, height):
+        import cairocffi
+        from libqtile import images
+
+        img = images.Img.from_path(path)
+        if width or height:
+            img.resize(width=width, height=height)
+        surface = img.surface
+        if (surface.get_width(), surface.get_height()) == (img.width, img.height):
+            return surface
+        # PNGs come back at their own size and Img scales them through the
+        # pattern on every paint; render the scaled pixels once instead.
+        scaled = cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, img.width, img.height)
+        ctx = cairocffi.Context(scaled)
+        ctx.set_source(images.get_cairo_pattern(surface, img.width, img.height))
+        ctx.paint()
+        scaled.flush()
+        return scaled
+
+    def _file(self, key):
+        digest, width, height = key
+        return os.path.join(self.cache_dir, "{}-{}x{}.argb".format(digest, width, height))
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        import cairocffi
+
+        try:
+            with open(self._file(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, width, height, stride = _HEADER.unpack_from(data)
+        pixels = bytearray(data[_HEADER.size:])
+        if magic != _MAGIC or len(pixels) != stride * height:
+            return None
+        return cairocffi.ImageSurface.create_for_data(
+            pixels, cairocffi.FORMAT_ARGB32, width, height, stride
+        )
+
+    def _store(self, key, surface):
+        if self.cache_dir is None:
+            return
+        import cairocffi
+
+        if surface.get_format() != cairocffi.FORMAT_ARGB32:
+            return
+        surface.flush()
+        header = _HEADER.pack(
+            _MAGIC, surface.get_width(), surface.get_height(), surface.get_stride()
+        )
+        path = self._file(key)
+        tmp = path + ".tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(header)
+                f.write(bytes(surface.get_data()))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug("surfaces: cannot write %s: %s", path, e)
+
+    def stats(self):
+        return {
+            "entries": len(self._surfaces),
+            "kb": self.size // 1024,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "decodes": self.decodes,
+            "evictions": self.evictions,
+        }
+
+
+def _nbytes(surface):
+    return surface.get_stride() * surface.get_height()
+
+
+# Kept across importlib.reload() of this module on config reloads; that is
+# the point of the cache.
+try:
+    _cache
+except NameError:
+    _cache = None
+
+
+def get_cache(**config):
+    """Return the process-wide surface cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = SurfaceCache(**config)
+    return _cache
@@ -0,0 +1,357 @@
+"""Catppuccin palette shared by the bar, the layouts and the companion apps.
+
+Widgets were given hex strings, which qtile parses again on every draw, and
+the same colours were written out by hand in the alacritty, rofi and dunst
+configs. Here each flavour is parsed once into a :class:`Palette` of
+immutable ``(r, g, b, alpha)`` tuples, the form qtile's drawer takes as is;
+``palette.hex(name)`` gives the string form for the places that need one,
+like window borders.
+
+:class:`Theme` also writes the companion app colours from the same palette:
+
+* ``~/.config/alacritty/theme.yml``, imported after ``catppuccin.yml``
+* ``~/.config/rofi/themes/palette.rasi``, imported by ``my_theme.rasi``
+* ``~/.config/dunst/dunstrc.d/50-theme.conf``, a dunst drop-in
+
+A file is only rewritten when the hash of its new content differs from the
+one on disk, so generating on every startup is free and switching flavour
+with ``qtile cmd-obj -o root -f theme -a mocha`` touches only what changed.
+"""
+
+import collections
+import collections.abc
+import hashlib
+import logging
+import os
+import subprocess
+import time
+
+logger = logging.getLogger("libqtile")
+
+FLAVOURS = {
+    "latte": {
+        "rosewater": "#dc8a78", "flamingo": "#dd7878", "pink": "#ea76cb",
+        "mauve": "#8839ef", "red": "#d20f39", "maroon": "#e64553",
+        "peach": "#fe640b", "yellow": "#df8e1d", "green": "#40a02b",
+        "teal": "#179299", "sky": "#04a5e5", "sapphire": "#209fb5",
+        "blue": "#1e66f5", "lavender": "#7287fd", "text": "#4c4f69",
+        "subtext1": "#5c5f77", "subtext0": "#6c6f85", "overlay2": "#7c7f93",
+        "overlay1": "#8c8fa1", "overlay0": "#9ca0b0", "surface2": "#acb0be",
+        "surface1": "#bcc0cc", "surface0": "#ccd0da", "base": "#eff1f5",
+        "mantle": "#e6e9ef", "crust": "#dce0e8",
+    },
+    "frappe": {
+        "rosewater": "#f2d5cf", "flamingo": "#eebebe", "pink": "#f4b8e4",
+        "mauve": "#ca9ee6", "red": "#e78284", "maroon": "#ea999c",
+        "peach": "#ef9f76", "yellow": "#e5c890", "green": "#a6d189",
+        "teal": "#81c8be", "sky": "#99d1db", "sapphire": "#85c1dc",
+        "blue": "#8caaee", "lavender": "#babbf1", "text": "#c6d0f5",
+        "subtext1": "#b5bfe2", "subtext0": "#a5adce", "overlay2": "#949cbb",
+        "overlay1": "#838ba7", "overlay0": "#737994", "surface2": "#626880",
+        "surface1": "#51576d", "surface0": "#414559", "base": "#303446",
+        "mantle": "#292c3c", "crust": "#232634",
+    },
+    "macchiato": {
+        "rosewater": "#f4dbd6", "flamingo": "#f0c6c6", "pink": "#f5bde6",
+        "mauve": "#c6a0f6", "red": "#ed8796", "maroon": "#ee99a0",
+        "peach": "#f5a97f", "yellow": "#eed49f", "green": "#a6da95",
+        "teal": "#8bd5ca", "sky": "#91d7e3", "sapphire": "#7dc4e4",
+        "blue": "#8aadf4", "lavender": "#b7bdf8", "text": "#cad3f5",
+        "subtext1": "#b8c0e0", "subtext0": "#a5adcb", "overlay2": "#939ab7",
+        "overlay1": "#8087a2", "overlay0": "#6e738d", "surface2": "#5b6078",
+        "surface1": "#494d64", "surface0": "#363a4f", "base": "#24273a",
+        "mantle": "#1e2030", "crust": "#181926",
+    },
+    "mocha": {
+        "rosewater": "#f5e0dc", "flamingo": "#f2cdcd", "pink": "#f5c2e7",
+        "mauve": "#cba6f7", "red": "#f38ba8", "maroon": "#eba0ac",
+        "peach": "#fab387", "yellow": "#f9e2af", "green": "#a6e3a1",
+        "teal": "#94e2d5", "sky": "#89dceb", "sapphire": "#74c7ec",
+        "blue": "#89b4fa", "lavender": "#b4befe", "text": "#cdd6f4",
+        "subtext1": "#bac2de", "subtext0": "#a6adc8", "overlay2": "#9399b2",
+        "overlay1": "#7f849c", "overlay0": "#6c7086", "surface2": "#585b70",
+        "surface1": "#45475a", "surface0": "#313244", "base": "#1e1e2e",
+        "mantle": "#181825", "crust": "#11111b",
+    },
+}
+
+
+class Color(collections.namedtuple("Color", "r g b a")):
+    """An RGBA colour as qtile's drawer takes it: 0-255 channels, 0-1 alpha."""
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, value):
+        """Parse ``#rrggbb`` or ``#rrggbbaa``."""
+        value = value.lstrip("#")
+        if len(value) not in (6, 8):
+            raise ValueError("not a colour: {!r}".format(value))
+        alpha = int(value[6:8], 16) / 255 if len(value) == 8 else 1.0
+        return cls(int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16), alpha)
+
+    @property
+    def hex(self):
+        text = "#{:02x}{:02x}{:02x}".format(self.r, self.g, self.b)
+        if self.a < 1:
+            text += "{:02x}".format(round(self.a * 255))
+        return text
+
+
+class Palette(collections.abc.Mapping):
+    """A flavour's colours by name, parsed once; read-only."""
+
+    def __init__(self, name, colors):
+        self.name = name
+        self._colors = {key: Color.parse(value) for key, value in colors.items()}
+        self._hex = {key: color.hex for key, color in self._colors.items()}
+
+    def __getitem__(self, key):
+        return self._colors[key]
+
+    def __iter__(self):
+        return iter(self._colors)
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__["_colors"][key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def hex(self, key):
+        """The colour as a ``#rrggbb`` string, e.g. for window borders."""
+        return self._hex[key]
+
+
+def render_alacritty(palette):
+    p = palette.hex
+    ansi = [("black", "surface1", "surface2"), ("red", "red", "red"),
+            ("green", "green", "green"), ("yellow", "yellow", "yellow"),
+            ("blue", "blue", "blue"), ("magenta", "pink", "pink"),
+            ("cyan", "teal", "teal"), ("white", "subtext1", "subtext0")]
+    if sum(palette["base"][:3]) > sum(palette["text"][:3]):
+        # Light flavour: black and white trade places.
+        ansi[0], ansi[-1] = ("black", "subtext1", "subtext0"), ("white", "surface2", "surface1")
+    lines = [
+        "# Generated by qtile's theme.py from the {} palette.".format(palette.name),
+        "colors:",
+        "  primary:",
+        "    background: '{}'".format(p("base")),
+        "    foreground: '{}'".format(p("text")),
+        "    dim_foreground: '{}'".format(p("text")),
+        "    bright_foreground: '{}'".format(p("text")),
+        "  cursor:",
+        "    text: '{}'".format(p("base")),
+        "    cursor: '{}'".format(p("rosewater")),
+        "  vi_mode_cursor:",
+        "    text: '{}'".format(p("base")),
+        "    cursor: '{}'".format(p("lavender")),
+        "  search:",
+    ]
+    for name, background in (("matches", "subtext0"), ("focused_match", "green"), ("bar", "subtext0")):
+        lines += [
+            "    {}:".format(name),
+            "      foreground: '{}'".format(p("base")),
+            "      background: '{}'".format(p(background)),
+        ]
+    lines.append("  hints:")
+    for name, background in (("start", "yellow"), ("end", "subtext0")):
+        lines += [
+            "    {}:".format(name),
+            "      foreground: '{}'".format(p("base")),
+            "      background: '{}'".format(p(background)),
+        ]
+    lines += [
+        "  selection:",
+        "    text: '{}'".format(p("base")),
+        "    background: '{}'".format(p("rosewater")),
+    ]
+    for section, column in (("normal", 1), ("bright", 2), ("dim", 1)):
+        lines.append("  {}:".format(section))
+        lines += ["    {}: '{}'".format(colors[0], p(colors[column])) for colors in ansi]
+    lines += [
+        "  indexed_colors:",
+        "    - {{ index: 16, color: '{}' }}".format(p("peach")),
+        "    - {{ index: 17, color: '{}' }}".format(p("rosewater")),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def render_rofi(palette):
+    # Only the flavour's own colours: rofi's "* {}" block also holds real
+    # properties, and an extra such as "border" would set one.
+    lines = ["/* Generated by qtile's theme.py from the {} palette. */".format(palette.name), "* {"]
+    lines += ["    {}: {};".format(name, palette.hex(name)) for name in FLAVOURS[palette.name]]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def render_dunst(palette):
+    p = palette.hex
+    sections = (("low", "base", "subtext0"), ("normal", "green", "crust"), ("critical", "red", "crust"))
+    lines = ["# Generated by qtile's theme.py from the {} palette.".format(palette.name)]
+    for urgency, background, foreground in sections:
+        lines += [
+            "[urgency_{}]".format(urgency),
+            '    background = "{}"'.format(p(background)),
+            '    foreground = "{}"'.format(p(foreground)),
+        ]
+    return "\n".join(lines) + "\n"
+
+
+TARGETS = {
+    "alacritty": ("~/.config/alacritty/theme.yml", render_alacritty),
+    "rofi": ("~/.config/rofi/themes/palette.rasi", render_rofi),
+    "dunst": ("~/.config/dunst/dunstrc.d/50-theme.conf", render_dunst),
+}
+
+# How each app picks up a rewritten file; alacritty watches its imports and
+# rofi reads its theme on every launch.
+RELOAD = {
+    "dunst": ["dunstctl", "reload"],
+}
+
+
+class Theme:
+    """The current flavour's palette and the app configs generated from it.
+
+    ``extra`` adds named colours on top of the flavour, e.g. a border colour
+    that isn't part of Catppuccin. The flavour last switched to is kept in
+    ``state``, so it survives restarts.
+    """
+
+    def __init__(self, flavour="macchiato", extra=None, state="~/.cache/qtile/theme", targets=None):
+        self.extra = dict(extra or {})
+        self.state = os.path.expanduser(state)
+        self.targets = TARGETS if targets is None else targets
+        self.generated = 0
+        self.written = 0
+        self.last_generate = None
+        self.qtile = None
+        self._palettes = {}
+        self._digests = {}
+        self.flavour = self._saved() or flavour
+
+    @property
+    def palette(self):
+        palette = self._palettes.get(self.flavour)
+        if palette is None:
+            palette = Palette(self.flavour, dict(FLAVOURS[self.flavour], **self.extra))
+            self._palettes[self.flavour] = palette
+        return palette
+
+    def _saved(self):
+        try:
+            with open(self.state) as f:
+                flavour = f.read().strip()
+        except OSError:
+            return None
+        return flavour if flavour in FLAVOURS else None
+
+    def generate(self):
+        """Write the app configs whose content changed; return their names."""
+        start = time.monotonic()
+        palette = self.palette
+        changed = []
+        for name, (path, render) in self.targets.items():
+            if self._write(os.path.expanduser(path), render(palette)):
+                changed.append(name)
+        self.generated += 1
+        self.written += len(changed)
+        self.last_generate = time.monotonic() - start
+        for name in changed:
+            if name in RELOAD:
+                try:
+                    subprocess.Popen(RELOAD[name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                except OSError as e:
+                    logger.debug("theme: cannot reload %s: %s", name, e)
+        return changed
+
+    def _write(self, path, text):
+        data = text.encode()
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        known = self._digests.get(path)
+        if known is None or known[1] != mtime:
+            # First look at this file, or someone else wrote it since.
+            try:
+                with open(path, "rb") as f:
+                    known = (hashlib.blake2b(f.read(), digest_size=16).digest(), mtime)
+            except OSError:
+                known = (None, None)
+        if known[0] == digest:
+            self._digests[path] = known
+            return False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._digests[path] = (digest, os.stat(path).st_mtime_ns)
+        except OSError as e:
+            logger.warning("theme: cannot write %s: %s", path, e)
+            return False
+        return True
+
+    def switch(self, flavour):
+        """Make ``flavour`` current and regenerate what changed."""
+        if flavour not in FLAVOURS:
+            raise ValueError("unknown flavour {!r}, have {}".format(flavour, ", ".join(FLAVOURS)))
+        self.flavour = flavour
+        try:
+            os.makedirs(os.path.dirname(self.state), exist_ok=True)
+            with open(self.state, "w") as f:
+                f.write(flavour + "\n")
+        except OSError as e:
+            logger.warning("theme: cannot save %s: %s", self.state, e)
+        return self.generate()
+
+    def install(self, qtile):
+        """Hook for ``startup``: generate the app configs, add the commands."""
+        self.qtile = qtile
+        self.generate()
+        qtile.cmd_theme = self.cmd_theme
+        qtile.cmd_theme_stats = self.cmd_theme_stats
+
+    def cmd_theme(self, flavour=None):
+        """Show the flavour, or switch to another one and reload the config."""
+        if flavour is None or flavour == self.flavour:
+            return {"flavour": self.flavour, "flavours": list(FLAVOURS)}
+        changed = self.switch(flavour)
+        # Widgets and layouts took their colours when the config was loaded.
+        self.qtile.call_soon(self.qtile.cmd_reload_config)
+        return {"flavour": self.flavour, "changed": changed}
+
+    def cmd_theme_stats(self):
+        """Generations, files written, and how long the last generation took."""
+        return {
+            "flavour": self.flavour,
+            "generated": self.generated,
+            "written": self.written,
+            "last_generate_ms": (
+                round(self.last_generate * 1000, 2) if self.last_generate is not None else None
+            ),
+        }
+
+
+# Kept across importlib.reload() of this module on config reloads, so a
+# switched flavour and the known file hashes outlive them.
+try:
+    _theme
+except NameError:
+    _theme = None
+
+
+def get_theme(**config):
+    """Return the session-wide theme, creating it on first use."""
+    global _theme
+    if _theme is None:
+        _theme = Theme(**config)
+    return _theme
@@ -0,0 +1,296 @@
+"""Tiling layouts that only reconfigure windows that moved.
+
+Every focus move or shuffle makes the group lay out all of its windows
+again, and ``Window.place()`` sends each of them a ConfigureWindow, a border
+repaint and a synthetic ConfigureNotify even when nothing about it changed.
+The layouts here split ``configure()`` in two: ``geometry()`` computes where
+the window goes, the same way the stock layout does, and ``configure()``
+compares that with where the window already is, so ``place()`` only goes
+through for windows whose rectangle changed. A window whose border colour
+changed (the old and new focus) only gets its border repainted.
+
+Comparing against the window's own geometry rather than a private cache
+keeps this correct when something else moved the window in between, such
+as another layout or the floating layer.
+"""
+
+import logging
+import math
+
+from libqtile import layout
+
+from standby import qtile_version
+
+logger = logging.getLogger("libqtile")
+
+# The geometry() methods mirror configure() of these qtile versions; with
+# any other, the layouts use the stock configure().
+GEOMETRY_VERSIONS = ("0.22",)
+
+try:
+    _supported
+except NameError:
+    _supported = None
+
+
+def geometry_supported():
+    """Whether the installed qtile is one the geometry() methods follow."""
+    global _supported
+    if _supported is None:
+        version = qtile_version()
+        _supported = version is not None and version.startswith(GEOMETRY_VERSIONS)
+        if not _supported:
+            logger.warning("tiling: qtile %s untested, using the stock layouts' configure()", version)
+    return _supported
+
+
+class _Counters:
+    def __init__(self):
+        self.configures = 0
+        self.placed = 0
+        self.borders = 0
+        self.skipped = 0
+
+
+def _unchanged(client, x, y, width, height, borderwidth, margin):
+    if margin is not None:
+        if isinstance(margin, int):
+            margin = [margin] * 4
+        x += margin[3]
+        y += margin[0]
+        width -= margin[1] + margin[3]
+        height -= margin[0] + margin[2]
+    return (
+        client.x == x
+        and client.y == y
+        and client.width == width
+        and client.height == height
+        and getattr(client, "borderwidth", None) == borderwidth
+    )
+
+
+class IncrementalLayout:
+    """Mixin for layouts; goes before the qtile layout class in the bases.
+
+    Subclasses implement ``geometry(client, screen_rect)``, returning what the
+    stock ``configure()`` passes to ``client.place()`` as ``(x, y, width,
+    height, borderwidth, bordercolor, margin)``, or None where it hides the
+    window.
+    """
+
+    def configure(self, client, screen_rect):
+        try:
+            counters = self._counters
+        except AttributeError:
+            counters = self._counters = _Counters()
+        counters.configures += 1
+        if not geometry_supported():
+            counters.placed += 1
+            super().configure(client, screen_rect)
+            return
+        geometry = self.geometry(client, screen_rect)
+        if geometry is None:
+            client.hide()
+            return
+        x, y, width, height, borderwidth, bordercolor, margin = geometry
+        if not _unchanged(client, x, y, width, height, borderwidth, margin):
+            counters.placed += 1
+            client.place(x, y, width, height, borderwidth, bordercolor, margin=margin)
+        elif getattr(client, "bordercolor", None) != bordercolor:
+            counters.borders += 1
+            client.paint_borders(bordercolor, borderwidth)
+        else:
+            counters.skipped += 1
+        client.unhide()
+
+    def cmd_geometry_stats(self):
+        """Configure calls, and how many of them placed, repainted or skipped a window."""
+        counters = getattr(self, "_counters", None) or _Counters()
+        return {
+            "configures": counters.configures,
+            "placed": counters.placed,
+            "border_only": counters.borders,
+            "skipped": counters.skipped,
+        }
+
+
+# The geometry() methods below follow configure() of the qtile 0.22 layouts.
+
+
+class Columns(IncrementalLayout, layout.Columns):
+    def geometry(self, client, screen_rect):
+        pos = 0
+        for col in self.columns:
+            if client in col:
+                break
+            pos += col.width
+        else:
+            return None
+        if client.has_focus:
+            color = self.border_focus if col.split else self.border_focus_stack
+        else:
+            color = self.border_normal if col.split else self.border_normal_stack
+        border = self.border_width
+        margin_size = self.margin
+        if len(self.columns) == 1 and (len(col) == 1 or not col.split):
+            if not self.border_on_single:
+                border = 0
+            if self.margin_on_single is not None:
+                margin_size = self.margin_on_single
+        width = int(0.5 + col.width * screen_rect.width * 0.01 / len(self.columns))
+        x = screen_rect.x + int(0.5 + pos * screen_rect.width * 0.01 / len(self.columns))
+        if col.split:
+            pos = 0
+            for c in col:
+                if client == c:
+                    break
+                pos += col.heights[c]
+            height = int(0.5 + col.heights[client] * screen_rect.height * 0.01 / len(col))
+            y = screen_rect.y + int(0.5 + pos * screen_rect.height * 0.01 / len(col))
+            return x, y, width - 2 * border, height - 2 * border, border, color, margin_size
+        if client == col.cw:
+            return (
+                x, screen_rect.y, width - 2 * border, screen_rect.height - 2 * border, border,
+                color, margin_size,
+            )
+        return None
+
+
+class Max(IncrementalLayout, layout.Max):
+    def geometry(self, client, screen_rect):
+        if not self.clients or client is not self.clients.current_client:
+            return None
+        return (
+            screen_rect.x,
+            screen_rect.y,
+            screen_rect.width - self.border_width * 2,
+            screen_rect.height - self.border_width * 2,
+            self.border_width,
+            self.border_focus if client.has_focus else self.border_normal,
+            self.margin,
+        )
+
+
+class Matrix(IncrementalLayout, layout.Matrix):
+    def configure(self, client, screen_rect):
+        # Stock Matrix leaves windows it doesn't hold alone instead of hiding them.
+        if client in self.clients:
+            IncrementalLayout.configure(self, client, screen_rect)
+
+    def geometry(self, client, screen_rect):
+        idx = self.clients.index(client)
+        row = idx // self.columns
+        col = idx % self.columns
+        column_size = int(math.ceil(len(self.clients) / self.columns))
+        column_width = int(screen_rect.width / float(self.columns))
+        row_height = int(screen_rect.height / float(column_size))
+        return (
+            screen_rect.x + col * column_width,
+            screen_rect.y + row * row_height,
+            column_width - 2 * self.border_width,
+            row_height - 2 * self.border_width,
+            self.border_width,
+            self.border_focus if client.has_focus else self.border_normal,
+            self.margin,
+        )
+
+
+class MonadTall(IncrementalLayout, layout.MonadTall):
+    def geometry(self, client, screen_rect):
+        self.screen_rect = screen_rect
+        if not self.relative_sizes or self.do_normalize:
+            self.cmd_normalize(False)
+        if not self.clients or client not in self.clients:
+            return None
+        px = self.border_focus if client.has_focus else self.border_normal
+        if len(self.clients) == 1:
+            return (
+                screen_rect.x,
+                screen_rect.y,
+                screen_rect.width - 2 * self.single_border_width,
+                screen_rect.height - 2 * self.single_border_width,
+                self.single_border_width,
+                px,
+                self.single_margin,
+            )
+        return self._geometry_specific(screen_rect, px, self.clients.index(client))
+
+    def _geometry_specific(self, screen_rect, px, cidx):
+        width_main = int(screen_rect.width * self.ratio)
+        width_shared = screen_rect.width - width_main
+        if self.align == self._left:
+            xpos = screen_rect.x if cidx == 0 else screen_rect.x + width_main
+        else:
+            xpos = screen_rect.x + width_shared - self.margin if cidx == 0 else screen_rect.x
+        if cidx == 0:
+            margin = [self.margin, 2 * self.border_width, self.margin + 2 * self.border_width,
+                      self.margin]
+            return xpos, screen_rect.y, width_main, screen_rect.height, self.border_width, px, margin
+        ypos = screen_rect.y + self._get_absolute_size_from_relative(
+            sum(self.relative_sizes[: cidx - 1])
+        )
+        height = self._get_absolute_size_from_relative(self.relative_sizes[cidx - 1])
+        if cidx > 1:
+            # Neighbouring secondaries would both add a margin.
+            ypos -= self.margin
+            height += self.margin
+        return (
+            xpos, ypos, width_shared - 2 * self.border_width, height - 2 * self.border_width,
+            self.border_width, px, self.margin,
+        )
+
+
+class MonadWide(IncrementalLayout, layout.MonadWide):
+    geometry = MonadTall.geometry
+
+    def _geometry_specific(self, screen_rect, px, cidx):
+        height_main = int(screen_rect.height * self.ratio)
+        height_shared = screen_rect.height - height_main
+        if self.align == self._up:
+            ypos = screen_rect.y if cidx == 0 else screen_rect.y + height_main
+        else:
+            ypos = screen_rect.y + height_shared - self.margin if cidx == 0 else screen_rect.y
+        if cidx == 0:
+            margin = [self.margin, self.margin + 2 * self.border_width, 2 * self.border_width,
+                      self.margin]
+            return screen_rect.x, ypos, screen_rect.width, height_main, self.border_width, px, margin
+        xpos = screen_rect.x + self._get_absolute_size_from_relative(
+            sum(self.relative_sizes[: cidx - 1])
+        )
+        width = self._get_absolute_size_from_relative(self.relative_sizes[cidx - 1])
+        if cidx > 1:
+            xpos -= self.margin
+            width += self.margin
+        return (
+            xpos, ypos, width - 2 * self.border_width, height_shared - 2 * self.border_width,
+            self.border_width, px, self.margin,
+        )
+
+
+class Tile(IncrementalLayout, layout.Tile):
+    def geometry(self, client, screen_rect):
+        if not self.clients or client not in self.clients:
+            return None
+        screen_width = screen_rect.width
+        screen_height = screen_rect.height
+        pos = self.clients.index(client)
+        if client in self.master_windows:
+            if len(self.slave_windows) or not self.expand:
+                w = int(screen_width * self.ratio_size)
+            else:
+                w = screen_width
+            h = screen_height // self.master_length
+            x = screen_rect.x
+            y = screen_rect.y + pos * h
+        else:
+            w = screen_width - int(screen_width * self.ratio_size)
+            h = screen_height // (len(self.slave_windows))
+            x = screen_rect.x + int(screen_width * self.ratio_size)
+            y = screen_rect.y + self.clients[self.master_length :].index(client) * h
+        single = len(self.clients) == 1
+        border_width = 0 if not self.border_on_single and single else self.border_width
+        margin = 0 if not self.margin_on_single and single else self.margin
+        return (
+            x, y, w - border_width * 2, h - border_width * 2, border_width,
+            self.border_focus if client.has_focus else self.border_normal, margin,
+        )
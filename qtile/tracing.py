@@ -0,0 +1,212 @@
+"""Opt-in latency tracing for key presses, commands, hooks, layouts and draws.
+
+Nothing shows where the time goes between a key press such as ``mod+1`` and
+the redraw it causes. When enabled, :class:`Tracer` wraps the steps on that
+path:
+
+* ``key:<binding>``: key dispatch, covering everything the binding runs
+* ``cmd:<name>``: each command a key or mouse binding executes
+* ``hook:<event>``: one ``hook.fire()``, covering all its subscribers
+* ``configure:<group>/<layout>``: a layout placing one window
+* ``draw:<widget>``: one widget redraw
+
+Each label gets a histogram with power-of-two microsecond buckets, and
+every call also goes into a fixed-size ring of recent spans. That costs
+two clock reads and a deque append per call. The histograms can be read
+with ``qtile cmd-obj -o root -f trace_stats``, and ``trace_dump`` writes
+the spans of the last N seconds as a Chrome trace file that
+chrome://tracing or Perfetto can open.
+
+Commands sent over the command socket (``qtile cmd-obj``, ``qtile shell``)
+are not traced: qtile hands the IPC server a bound ``server.call`` before
+the config is loaded, so wrapping ``qtile.server.call`` only reaches the
+calls qtile makes itself for bindings.
+"""
+
+import collections
+import json
+import logging
+import os
+import time
+
+from libqtile import hook
+
+logger = logging.getLogger("libqtile")
+
+# Bucket i counts calls that took less than 2**i microseconds.
+_BUCKETS = 24
+_WRAPPED = "_traced"
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[min((ns // 1000).bit_length(), _BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound, in microseconds, of the bucket holding that fraction."""
+        wanted = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= wanted:
+                return 2 ** i
+        return 0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 1) if self.count else 0,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "max_us": round(self.max / 1000, 1),
+        }
+
+
+class Tracer:
+    """Times the hot paths of one qtile session.
+
+    ``enabled=False`` installs nothing at all, so a disabled tracer costs
+    nothing. ``spans`` is the size of the ring of recent calls kept for
+    trace dumps.
+    """
+
+    def __init__(self, enabled=False, spans=50000, dump_dir="~/.cache/qtile"):
+        self.enabled = enabled
+        self.dump_dir = os.path.expanduser(dump_dir)
+        self.histograms = collections.defaultdict(Histogram)
+        self.spans = collections.deque(maxlen=spans)
+        self._depth = 0
+        self._started = time.perf_counter_ns()
+
+    def _traced(self, label, func):
+        histograms = self.histograms
+        spans = self.spans
+        clock = time.perf_counter_ns
+
+        def traced(*args, **kwargs):
+            start = clock()
+            self._depth += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                took = clock() - start
+                name = label(*args) if callable(label) else label
+                histograms[name].add(took)
+                spans.append((name, start, took, self._depth))
+
+        setattr(traced, _WRAPPED, func)
+        return traced
+
+    def _wrap(self, owner, attr, label):
+        func = getattr(owner, attr)
+        if not hasattr(func, _WRAPPED):
+            setattr(owner, attr, self._traced(label, func))
+
+    def install(self, qtile):
+        """Hook for ``startup``: wrap this load's groups, layouts and widgets."""
+        if not self.enabled:
+            return
+        # The core, the hook module and the command server outlive a reload;
+        # _wrap() leaves them alone when they are already wrapped. Bindings
+        # look up server.call on every press; the IPC socket does not.
+        self._wrap(qtile, "process_key_event", lambda keysym, mask: _key_label(qtile, keysym, mask))
+        self._wrap(qtile.server, "call", lambda call: "cmd:" + call[1])
+        self._wrap(hook, "fire", lambda event, *args: "hook:" + event)
+
+        for group in qtile.groups:
+            for layout in group.layouts:
+                self._wrap(layout, "configure", "configure:{}/{}".format(group.name, layout.name))
+        for widget in qtile.widgets_map.values():
+            self._wrap(widget, "draw", "draw:" + widget.name)
+        for screen in qtile.screens:
+            for gap in (screen.top, screen.bottom, screen.left, screen.right):
+                if gap is not None and hasattr(gap, "_configure_widget"):
+                    self._watch_bar(gap)
+
+        qtile.cmd_trace_stats = self.cmd_trace_stats
+        qtile.cmd_trace_dump = self.cmd_trace_dump
+        qtile.cmd_trace_reset = self.cmd_trace_reset
+
+    def _watch_bar(self, bar):
+        # Widgets configured later (lazybar placeholders being replaced) get
+        # their draw wrapped as they are added.
+        configure_widget = bar._configure_widget
+        if hasattr(configure_widget, _WRAPPED):
+            return
+
+        def watched(widget):
+            configured = configure_widget(widget)
+            if configured:
+                self._wrap(widget, "draw", "draw:" + widget.name)
+            return configured
+
+        setattr(watched, _WRAPPED, configure_widget)
+        bar._configure_widget = watched
+
+    def cmd_trace_stats(self):
+        """Latency histogram summaries per traced label, slowest p99 first."""
+        ordered = sorted(self.histograms.items(), key=lambda item: -item[1].percentile(0.99))
+        return {label: histogram.summary() for label, histogram in ordered}
+
+    def cmd_trace_dump(self, seconds=10, path=None):
+        """Write the spans of the last ``seconds`` as a Chrome trace; return its path."""
+        since = time.perf_counter_ns() - int(seconds * 1e9)
+        events = [
+            {
+                "name": name,
+                "cat": name.split(":", 1)[0],
+                "ph": "X",
+                "ts": (start - self._started) / 1000,
+                "dur": took / 1000,
+                "pid": os.getpid(),
+                "tid": 1,
+                "args": {"depth": depth},
+            }
+            for name, start, took, depth in self.spans
+            if start >= since
+        ]
+        if path is None:
+            path = os.path.join(self.dump_dir, "qtile-trace-{}.json".format(int(time.time())))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        logger.info("tracing: wrote %d spans to %s", len(events), path)
+        return path
+
+    def cmd_trace_reset(self):
+        """Forget all histograms and spans."""
+        self.histograms.clear()
+        self.spans.clear()
+
+
+def _key_label(qtile, keysym, mask):
+    key = qtile.keys_map.get((keysym, mask))
+    if key is None:
+        return "key:unbound"
+    return "key:" + "+".join(list(key.modifiers) + [key.key])
+
+
+# Kept across importlib.reload() of this module on config reloads.
+try:
+    _tracer
+except NameError:
+    _tracer = None
+
+
+def get_tracer(**config):
+    """Return the session-wide tracer, creating it on first use."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(**config)
+    return _tracer
@@ -0,0 +1,388 @@
+"""Bar widgets fed by the shared services instead of their own timers."""
+
+import logging
+import os
+import time
+
+from libqtile import widget
+from libqtile.widget import base
+
+import damagebar
+
+logger = logging.getLogger("libqtile")
+
+
+class _DamageText(base._TextBox):
+    """``_TextBox`` whose width changes only repaint what moved on a DamageBar."""
+
+    def update(self, text):
+        if self.text == text:
+            return
+        if text is None:
+            text = ""
+        old_width = self.layout.width
+        self.text = text
+        if self.layout.width == old_width:
+            self.draw()
+        else:
+            damagebar.redraw(self)
+
+
+class BatteryText(_DamageText):
+    """Battery percentage pushed from a :class:`battery.BatteryMonitor`."""
+
+    defaults = [
+        ("monitor", None, "The shared battery.BatteryMonitor."),
+        ("format", "{percent:2.0%}", "Format string, gets the BatteryState fields."),
+        ("charge_char", "", "Prefix shown while charging."),
+        ("discharge_char", "", "Prefix shown while discharging."),
+    ]
+
+    def __init__(self, **config):
+        _DamageText.__init__(self, "", **config)
+        self.add_defaults(BatteryText.defaults)
+
+    def timer_setup(self):
+        if self.monitor is not None:
+            self.monitor.subscribe(self.on_state)
+
+    def on_state(self, state):
+        char = self.charge_char if state.status == "Charging" else self.discharge_char
+        self.update(char + self.format.format(**state._asdict()))
+
+    def finalize(self):
+        if self.monitor is not None:
+            self.monitor.unsubscribe(self.on_state)
+        _DamageText.finalize(self)
+
+
+class HubText(_DamageText):
+    """Text widget sampled by a :class:`sampler.SamplingHub`.
+
+    The source is ``file`` (re-read on every sample) or ``func`` (called on
+    every sample), optionally run through ``parse``. Subclasses may
+    override ``watch()`` to register another source, and ``format_value()``
+    to turn the sampled value into text.
+    """
+
+    defaults = [
+        ("hub", None, "The shared sampler.SamplingHub."),
+        ("update_interval", 1, "Seconds between samples, rounded up to the hub tick."),
+        ("file", None, "File whose contents are shown"),
+        ("func", None, "Function whose return value is shown"),
+        ("parse", None, "Function applied to each sampled value"),
+    ]
+
+    def __init__(self, **config):
+        _DamageText.__init__(self, "", **config)
+        self.add_defaults(HubText.defaults)
+        self._handle = None
+
+    def timer_setup(self):
+        self._handle = self.watch()
+
+    def watch(self):
+        if self.file is not None:
+            return self.hub.watch_file(self.file, self.update_interval, self.on_value, self.parse)
+        if self.func is not None:
+            return self.hub.watch(self.func, self.update_interval, self.on_value, self.parse)
+        logger.warning("%s: no file or func to sample", self.name)
+        self.update("N/A")
+        return None
+
+    def format_value(self, value):
+        return str(value)
+
+    def on_value(self, value):
+        self.update(self.format_value(value))
+
+    def pause(self):
+        """Stop sampling while the widget can't be seen."""
+        if self._handle is not None:
+            self.hub.pause(self._handle)
+
+    def resume(self):
+        if self._handle is not None:
+            self.hub.resume(self._handle)
+
+    def finalize(self):
+        if self._handle is not None:
+            self.hub.unwatch(self._handle)
+            self._handle = None
+        _DamageText.finalize(self)
+
+    def cmd_hub_stats(self):
+        """Wakeup, read and change counters of the shared hub."""
+        return self.hub.stats()
+
+
+class HubBacklight(HubText):
+    """Backlight percentage read from sysfs through the hub."""
+
+    defaults = [
+        (
+            "brightness_file",
+            "/sys/class/backlight/intel_backlight/actual_brightness",
+            "File with the current brightness",
+        ),
+        (
+            "max_brightness_file",
+            "/sys/class/backlight/intel_backlight/max_brightness",
+            "File with the maximum brightness",
+        ),
+        ("format", "{percent:2.0%}", "Display format"),
+        ("controller", None, "brightness.BrightnessController whose writes are shown at once"),
+    ]
+
+    def __init__(self, **config):
+        HubText.__init__(self, **config)
+        self.add_defaults(HubBacklight.defaults)
+        self.max_brightness = None
+
+    def watch(self):
+        try:
+            with open(self.max_brightness_file) as f:
+                self.max_brightness = int(f.read())
+        except (OSError, ValueError):
+            self.update("N/A")
+            return None
+        if self.controller is not None:
+            self.controller.subscribe(self.on_written)
+        return self.hub.watch_file(self.brightness_file, self.update_interval, self.on_value, int)
+
+    def on_written(self, value, max_brightness):
+        # Update the hub's cached value so the next sample isn't a "change".
+        self.hub.poke(self.brightness_file, str(value))
+
+    def finalize(self):
+        if self.controller is not None:
+            self.controller.unsubscribe(self.on_written)
+        HubText.finalize(self)
+
+    def format_value(self, value):
+        return self.format.format(percent=value / self.max_brightness)
+
+
+class VolumeText(_DamageText):
+    """Volume level pushed from an :class:`audio.VolumeController`."""
+
+    defaults = [
+        ("controller", None, "The shared audio.VolumeController."),
+        ("format", "{volume}%", "Display format"),
+        ("mute_format", "M", "Text shown while muted"),
+        ("step", 5, "Percent changed by each scroll step"),
+    ]
+
+    def __init__(self, **config):
+        _DamageText.__init__(self, "", **config)
+        self.add_defaults(VolumeText.defaults)
+        self.add_callbacks(
+            {
+                "Button1": self.cmd_mute,
+                "Button4": self.cmd_increase_vol,
+                "Button5": self.cmd_decrease_vol,
+            }
+        )
+
+    def timer_setup(self):
+        self.controller.subscribe(self.on_volume)
+
+    def on_volume(self, volume, mute):
+        if mute:
+            self.update(self.mute_format)
+        else:
+            self.update(self.format.format(volume=volume))
+
+    def finalize(self):
+        self.controller.unsubscribe(self.on_volume)
+        _DamageText.finalize(self)
+
+    def cmd_increase_vol(self):
+        self.controller.change(self.step)
+
+    def cmd_decrease_vol(self):
+        self.controller.change(-self.step)
+
+    def cmd_mute(self):
+        self.controller.toggle_mute()
+
+
+class HubClock(HubText):
+    """Clock that only wakes up when its text can change."""
+
+    defaults = [
+        ("format", "%H:%M", "A time.strftime format string"),
+    ]
+
+    def __init__(self, **config):
+        HubText.__init__(self, **config)
+        self.add_defaults(HubClock.defaults)
+        # A clock without seconds only needs to be sampled on the minute.
+        if "update_interval" not in config and "%S" not in self.format:
+            self.update_interval = 60
+
+    def watch(self):
+        # A stretched clock would show the wrong time.
+        return self.hub.watch(self.now, self.update_interval, self.on_value, stretch=False)
+
+    def now(self):
+        return time.strftime(self.format)
+
+
+class TopGroups(HubText):
+    """The groups using the most memory or CPU, from :class:`accounting.Accounting`."""
+
+    defaults = [
+        ("accounting", None, "The shared accounting.Accounting."),
+        ("count", 2, "Number of groups shown"),
+        ("sort", "memory", "'memory' or 'cpu'"),
+        ("format", "{group}: {memory}M {cpu}%", "Format of one group"),
+        ("separator", "  ", "Text between groups"),
+        ("startup_delay", 2, "Seconds after bar setup before the first sample"),
+    ]
+
+    def __init__(self, **config):
+        HubText.__init__(self, **config)
+        self.add_defaults(TopGroups.defaults)
+        if "update_interval" not in config:
+            self.update_interval = 5
+        self.add_callbacks({"Button1": self.cmd_toggle_sort})
+
+    def timer_setup(self):
+        # hub.watch() samples at once, and the first sample walks the process
+        # tree and opens a descriptor per process: keep it out of bar setup.
+        self.timeout_add(self.startup_delay, HubText.timer_setup, (self,))
+
+    def watch(self):
+        return self.hub.watch(self.accounting.sample, self.update_interval, self.on_value)
+
+    def format_value(self, totals):
+        index = 2 if self.sort == "memory" else 1
+        groups = sorted(totals, key=lambda total: total[index], reverse=True)[: self.count]
+        return self.separator.join(
+            self.format.format(group=group, cpu=cpu, memory=memory) for group, cpu, memory in groups
+        )
+
+    def cmd_toggle_sort(self):
+        """Switch between sorting by memory and by CPU."""
+        self.sort = "cpu" if self.sort == "memory" else "memory"
+        self.on_value(self.accounting.totals)
+
+    def cmd_top_groups(self, count=3):
+        return self.accounting.top(count, self.sort)
+
+
+class DamageGroupBox(widget.GroupBox):
+    """``GroupBox`` that only has itself repainted on group changes."""
+
+    def _hook_response(self, *args, **kwargs):
+        damagebar.redraw(self)
+
+
+class _CachedImg:
+    """What ``widget.Image`` needs of an ``Img``, around a cached surface."""
+
+    def __init__(self, surface, theta):
+        from libqtile import images
+
+        self.width = surface.get_width()
+        self.height = surface.get_height()
+        self.pattern = images.get_cairo_pattern(surface, theta=theta)
+
+
+class CachedImage(widget.Image):
+    """``widget.Image`` that takes its pixels from a :class:`surfaces.SurfaceCache`."""
+
+    defaults = [
+        ("cache", None, "The shared surfaces.SurfaceCache."),
+    ]
+
+    def __init__(self, **config):
+        widget.Image.__init__(self, **config)
+        self.add_defaults(CachedImage.defaults)
+
+    def _update_image(self):
+        if self.cache is None:
+            widget.Image._update_image(self)
+            return
+        self.img = None
+        if not self.filename:
+            logger.warning("Image filename not set!")
+            return
+        self.filename = os.path.expanduser(self.filename)
+
+        width = height = None
+        if self.scale:
+            if self.bar.horizontal:
+                height = self.bar.height - (self.margin_y * 2)
+            else:
+                width = self.bar.width - (self.margin_x * 2)
+        try:
+            surface = self.cache.surface(self.filename, width, height)
+        except OSError:
+            logger.warning("Image does not exist: %s", self.filename)
+            return
+        self.img = _CachedImg(surface, self.rotate)
+
+    def cmd_cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
+
+
+class CachedLayoutIcon(widget.CurrentLayoutIcon):
+    """``CurrentLayoutIcon`` that decodes its icons through a :class:`surfaces.SurfaceCache`."""
+
+    defaults = [
+        ("cache", None, "The shared surfaces.SurfaceCache."),
+    ]
+
+    def __init__(self, **config):
+        widget.CurrentLayoutIcon.__init__(self, **config)
+        self.add_defaults(CachedLayoutIcon.defaults)
+
+    def hook_response(self, layout, group):
+        if group.screen is not None and group.screen == self.bar.screen:
+            self.current_layout = layout.name
+            damagebar.redraw(self)
+
+    def _setup_images(self):
+        if self.cache is None:
+            widget.CurrentLayoutIcon._setup_images(self)
+            return
+        import cairocffi
+
+        for names in self._get_layout_names():
+            layout_name = names[0]
+            for layout in dict.fromkeys(names):
+                icon_file_path = self.find_icon_file_path(layout)
+                if icon_file_path:
+                    break
+            else:
+                logger.warning('No icon found for layout "%s"', layout_name)
+                icon_file_path = self.find_icon_file_path("unknown")
+
+            try:
+                img = self.cache.surface(icon_file_path)
+            except (cairocffi.Error, OSError) as e:
+                self.icons_loaded = False
+                logger.exception('Failed to load icon from file "%s", error was: %s', icon_file_path, e)
+                return
+
+            # Same scaling as CurrentLayoutIcon: to the bar height, then by
+            # ``scale`` around the centre.
+            sp = img.get_height() / (self.bar.height - 1)
+            width = img.get_width() / sp
+            if width > self.length:
+                self.length = int(width) + self.actual_padding * 2
+
+            imgpat = cairocffi.SurfacePattern(img)
+            scaler = cairocffi.Matrix()
+            scaler.scale(sp, sp)
+            scaler.scale(self.scale, self.scale)
+            factor = (1 - 1 / self.scale) / 2
+            scaler.translate(-width * factor, -width * factor)
+            scaler.translate(self.actual_padding * -1, 0)
+            imgpat.set_matrix(scaler)
+            imgpat.set_filter(cairocffi.FILTER_BEST)
+            self.surfaces[layout_name] = imgpat
+
+        self.icons_loaded = True
@@ -0,0 +1,59 @@
+#!/usr/bin/env bash
+
+# Time `colorscript` the way a new terminal runs it, with and without the
+# index and render cache.
+#
+#   ./bench.sh [RUNS] [OLD_COLORSCRIPT]
+#
+# Runs every script once per round through ./colorscript.sh (DEV mode, so the
+# scripts in ./colorscripts are used) with COLORSCRIPT_CACHE=0 and with a warm
+# cache, and `bash -i -c exit` with both, which is what opening a terminal
+# costs given .bashrc's `colorscript random`. OLD_COLORSCRIPT, e.g. the
+# previous colorscript.sh from git, is timed the same way for comparison.
+
+runs="${1:-5}"
+old="$2"
+cd "$(dirname "$0")" || exit 1
+
+export DEV=1 COLUMNS="${COLUMNS:-120}"
+export XDG_CACHE_HOME="$(mktemp -d)"
+trap 'rm -rf "$XDG_CACHE_HOME"' EXIT
+
+mapfile -t scripts < <(cd colorscripts && for f in *; do [[ -f "$f" ]] && echo "$f"; done)
+
+# Average milliseconds of one `CMD... exec NAME` over every script and round.
+function per_script() {
+    local start end round name
+    start=$(date +%s%N)
+    for ((round = 0; round < runs; round++)); do
+        for name in "${scripts[@]}"; do
+            "$@" exec "$name" &> /dev/null
+        done
+    done
+    end=$(date +%s%N)
+    echo $(((end - start) / 1000000 / runs / ${#scripts[@]}))
+}
+
+# Average milliseconds of an interactive shell that runs `colorscript random`.
+function terminal() {
+    local start end round
+    start=$(date +%s%N)
+    for ((round = 0; round < runs * 10; round++)); do
+        bash --norc -i -c "$* random > /dev/null; exit" 2> /dev/null
+    done
+    end=$(date +%s%N)
+    echo $(((end - start) / 1000000 / (runs * 10)))
+}
+
+printf "%-28s %10s %12s\n" "" "per script" "new terminal"
+if [[ -n "$old" ]]; then
+    printf "%-28s %8s ms %10s ms\n" "before (${old##*/})" \
+        "$(per_script bash "$old")" "$(terminal bash "$old")"
+fi
+printf "%-28s %8s ms %10s ms\n" "COLORSCRIPT_CACHE=0" \
+    "$(COLORSCRIPT_CACHE=0 per_script bash ./colorscript.sh)" \
+    "$(COLORSCRIPT_CACHE=0 terminal bash ./colorscript.sh)"
+# One pass to fill the render cache.
+runs=1 per_script bash ./colorscript.sh > /dev/null
+printf "%-28s %8s ms %10s ms\n" "cached" \
+    "$(per_script bash ./colorscript.sh)" "$(terminal bash ./colorscript.sh)"
@@ -4,22 +4,104 @@
 
 if [[ "$DEV" -gt 0 ]]; then
     DIR_COLORSCRIPTS="./colorscripts"
+    CACHE_DIR="${XDG_CACHE_HOME:-$HOME/.cache}/colorscript-dev"
 else
     DIR_COLORSCRIPTS="/opt/shell-color-scripts/colorscripts"
+    CACHE_DIR="${XDG_CACHE_HOME:-$HOME/.cache}/colorscript"
 fi
 
 if command -v find &>/dev/null; then
-    LS_CMD="$(command -v find) ${DIR_COLORSCRIPTS} -maxdepth 1 -type f"
     LS_CMD_B="$(command -v find) ${DIR_COLORSCRIPTS}/blacklisted -maxdepth 1 -type f"
 else
-    LS_CMD="$(command -v ls) ${DIR_COLORSCRIPTS}"
     LS_CMD_B="$(command -v ls) ${DIR_COLORSCRIPTS}/blacklisted"
 fi
 
-list_colorscripts="$($LS_CMD | xargs -I $ basename $ | cut -d ' ' -f 1 | nl)"
-length_colorscripts="$($LS_CMD | wc -l)"
-list_blacklist="$($LS_CMD_B 2>/dev/null | xargs -I $ basename $ | cut -d ' ' -f 1 | nl || "")" 
-length_blacklist="$($LS_CMD_B 2>/dev/null | wc -l || 0)"
+# The script list is kept in an index ("name checksum" per line) that is only
+# rebuilt when the directory changes, and each script's output is cached per
+# checksum, $TERM and terminal width, so `random` usually just prints a file.
+# COLORSCRIPT_CACHE=0 runs the scripts every time.
+INDEX="${CACHE_DIR}/index"
+RENDER_DIR="${CACHE_DIR}/render"
+# Scripts whose output depends on more than the script itself.
+UNCACHED=" hex " # reads ~/.Xresources
+
+function _build_index() {
+    local files=() path sum size name
+    for path in "${DIR_COLORSCRIPTS}"/*; do
+        [[ -f "$path" ]] && files+=("$path")
+    done
+    mkdir -p "${RENDER_DIR}"
+    # cksum with no files would read stdin.
+    if [[ "${#files[@]}" -gt 0 ]]; then
+        cksum -- "${files[@]}" | while read -r sum size path; do
+            echo "${path##*/} ${sum}"
+        done
+    fi > "${INDEX}.$$"
+    mv -f "${INDEX}.$$" "${INDEX}"
+
+    # Drop renders of scripts that changed or went away.
+    declare -A current=()
+    while read -r name sum; do
+        current["${name}.${sum}"]=1
+    done < "${INDEX}"
+    for path in "${RENDER_DIR}"/*; do
+        name="${path##*/}"
+        [[ -f "$path" && -z "${current[${name%.*.*}]}" ]] && rm -f "$path"
+    done
+}
+
+function _load_index() {
+    if [[ ! -f "${INDEX}" || "${DIR_COLORSCRIPTS}" -nt "${INDEX}" ]]; then
+        _build_index
+    fi
+    names=()
+    sums=()
+    local name sum
+    while read -r name sum; do
+        names+=("$name")
+        sums+=("$sum")
+    done < "${INDEX}"
+    length_colorscripts="${#names[@]}"
+}
+
+function _list_colorscripts() {
+    local i
+    for i in "${!names[@]}"; do
+        printf "%6d\t%s\n" "$((i + 1))" "${names[$i]}"
+    done
+}
+
+function _render() { # by position in the index
+    local name="${names[$1]}" sum="${sums[$1]}" term cols cached current
+    if [[ "${DIR_COLORSCRIPTS}/${name}" -nt "${INDEX}" ]]; then
+        # Maybe edited in place, which doesn't touch the directory. The
+        # checksum decides: a script dated in the future stays newer than
+        # the index without having changed.
+        read -r current _ < <(cksum < "${DIR_COLORSCRIPTS}/${name}")
+        if [[ "$current" != "$sum" ]]; then
+            _build_index
+            _load_index
+            sum="${sums[$1]}"
+        fi
+    fi
+    if [[ "${COLORSCRIPT_CACHE:-1}" -eq 0 || "${UNCACHED}" == *" ${name} "* ]]; then
+        exec "${DIR_COLORSCRIPTS}/${name}"
+    fi
+    cols="${COLUMNS:-$(tput cols 2>/dev/null || echo 80)}"
+    term="${TERM:-dumb}"
+    cached="${RENDER_DIR}/${name}.${sum}.${term//[.\/]/_}.${cols}"
+    if [[ -f "$cached" ]]; then
+        exec cat "$cached"
+    fi
+    mkdir -p "${RENDER_DIR}"
+    if (set -o pipefail; COLUMNS="$cols" "${DIR_COLORSCRIPTS}/${name}" | tee "${cached}.$$"); then
+        mv -f "${cached}.$$" "$cached"
+    else
+        rm -f "${cached}.$$"
+    fi
+}
+
+_load_index
 
 fmt_help="  %-20s\t%-54s\n"
 function _help() {
@@ -37,23 +119,23 @@ function _help() {
 }
 
 function _list() {
-    echo "There are "$($LS_CMD | wc -l)" installed color scripts:"
-    echo "${list_colorscripts}"
+    echo "There are ${length_colorscripts} installed color scripts:"
+    _list_colorscripts
 }
 
 function _list_blacklist() {
+    list_blacklist="$($LS_CMD_B 2>/dev/null | xargs -I $ basename $ | cut -d ' ' -f 1 | nl || "")"
+    length_blacklist="$($LS_CMD_B 2>/dev/null | wc -l || 0)"
     echo "There are $length_blacklist blacklisted color scripts:"
     echo "${list_blacklist}"
 }
 
 function _random() {
-    declare -i random_index=$RANDOM%$length_colorscripts
-    [[ $random_index -eq 0 ]] && random_index=1
-
-    random_colorscript="$(echo  "${list_colorscripts}" | sed -n ${random_index}p \
-        | tr -d ' ' | tr '\t' ' ' | cut -d ' ' -f 2)"
-    # echo "${random_colorscript}"
-    exec "${DIR_COLORSCRIPTS}/${random_colorscript}"
+    if [[ "${length_colorscripts}" -eq 0 ]]; then
+        echo "Input error, no color scripts in ${DIR_COLORSCRIPTS}."
+        exit 1
+    fi
+    _render "$((RANDOM % length_colorscripts))"
 }
 
 function ifhascolorscipt() {
@@ -64,6 +146,10 @@ function _run_by_name() {
     if [[ "$1" == "random" ]]; then
         _random
     elif [[ -n "$(ifhascolorscipt "$1")" ]]; then
+        local i
+        for i in "${!names[@]}"; do
+            [[ "${names[$i]}" == "$1" ]] && _render "$i" && return
+        done
         exec "${DIR_COLORSCRIPTS}/$1"
     else
         echo "Input error, Don't have color script named $1."
@@ -74,9 +160,7 @@ function _run_by_name() {
 function _run_by_index() {
     if [[ "$1" -gt 0 && "$1" -le "${length_colorscripts}" ]]; then
 
-        colorscript="$(echo  "${list_colorscripts}" | sed -n ${1}p \
-            | tr -d ' ' | tr '\t' ' ' | cut -d ' ' -f 2)"
-        exec "${DIR_COLORSCRIPTS}/${colorscript}"
+        _render "$(($1 - 1))"
     else
         echo "Input error, Don't have color script indexed $1."
         exit 1